@@ -1,118 +1,507 @@
 """
 Handling the AI moves.
 """
+import os
 import random
+import time
 
-piece_score = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
-
-
-knight_scores = [[0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0],
-                 [0.1, 0.3, 0.5, 0.5, 0.5, 0.5, 0.3, 0.1],
-                 [0.2, 0.5, 0.6, 0.65, 0.65, 0.6, 0.5, 0.2],
-                 [0.2, 0.55, 0.65, 0.7, 0.7, 0.65, 0.55, 0.2],
-                 [0.2, 0.5, 0.65, 0.7, 0.7, 0.65, 0.5, 0.2],
-                 [0.2, 0.55, 0.6, 0.65, 0.65, 0.6, 0.55, 0.2],
-                 [0.1, 0.3, 0.5, 0.55, 0.55, 0.5, 0.3, 0.1],
-                 [0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0]]
-
-
-bishop_scores = [[0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0],
-                 [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                 [0.2, 0.4, 0.5, 0.6, 0.6, 0.5, 0.4, 0.2],
-                 [0.2, 0.5, 0.5, 0.6, 0.6, 0.5, 0.5, 0.2],
-                 [0.2, 0.4, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2],
-                 [0.2, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6, 0.2],
-                 [0.2, 0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.2],
-                 [0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0]]
-
-rook_scores = [[0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25],
-               [0.5, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.5],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.25, 0.25, 0.25, 0.5, 0.5, 0.25, 0.25, 0.25]]
-
-queen_scores = [[0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0],
-                [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.3, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.4, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.2, 0.5, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0]]
-
-pawn_scores = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
-               [0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7],
-               [0.3, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3, 0.3],
-               [0.25, 0.25, 0.3, 0.45, 0.45, 0.3, 0.25, 0.25],
-               [0.2, 0.2, 0.2, 0.4, 0.4, 0.2, 0.2, 0.2],
-               [0.25, 0.15, 0.1, 0.2, 0.2, 0.1, 0.15, 0.25],
-               [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
-               [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
-
-piece_position_scores = {"wN": knight_scores,
-                         "bN": knight_scores[::-1],
-                         "wB": bishop_scores,
-                         "bB": bishop_scores[::-1],
-                         "wQ": queen_scores,
-                         "bQ": queen_scores[::-1],
-                         "wR": rook_scores,
-                         "bR": rook_scores[::-1],
-                         "wp": pawn_scores,
-                         "bp": pawn_scores[::-1]}
+import ChessBook
+import ChessTablebase
+from ChessWeights import piece_score, knight_scores, bishop_scores, rook_scores, queen_scores, pawn_scores, \
+    piece_position_scores
 
 CHECKMATE = 1000
 STALEMATE = 0
+TABLEBASE_WIN = CHECKMATE // 2#thắng theo bảng tàn cuộc: TABLEBASE_WIN - số ply tới chiếu hết
 DEPTH = 3
+MAX_DEPTH = 30#độ sâu tối đa khi tìm kiếm theo thời gian
+TIME_CHECK_INTERVAL = 1024#số node giữa 2 lần kiểm tra đồng hồ
+HASH_SIZE_MB = 16#bộ nhớ tối đa cho bảng chuyển vị
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")#tạo bằng ChessBook.py build
+DELTA_MARGIN = 2#delta pruning: bỏ nước ăn quân không thể nâng điểm lên gần alpha dù cộng thêm chừng này
 
+# loại giá trị lưu trong bảng chuyển vị
+EXACT = 0#giá trị chính xác
+LOWER_BOUND = 1#bị cắt beta: giá trị thật >= score
+UPPER_BOUND = 2#không vượt alpha: giá trị thật <= score
 
-def findBestMove(game_state, valid_moves, return_queue):#tìm nước đi tốt nhất
-    global next_move
-    next_move = None
-    random.shuffle(valid_moves)#xáo trộn để đảm bảo có nhiều nước đi tốt nhất thì chọn ngẫu nhiên 1 trong số đó
+
+class TranspositionTable:
+    """
+    Fixed-size hash table of searched positions, indexed by GameState.zobrist_key.
+    Each entry is a tuple (key, depth, score, flag, best_move_id, generation).
+    """
+    ENTRY_BYTES = 160#ước lượng bộ nhớ cho 1 entry (tuple + các số nguyên/số thực trong Python)
+
+    def __init__(self, size_mb=HASH_SIZE_MB):
+        #số entry là lũy thừa của 2 để lấy chỉ số bằng phép AND
+        entry_count = 1
+        while entry_count * 2 * self.ENTRY_BYTES <= size_mb * 1024 * 1024:
+            entry_count *= 2
+        self.mask = entry_count - 1
+        self.entries = [None] * entry_count
+        self.generation = 0#tăng mỗi lần tìm kiếm mới, entry cũ sẽ bị ghi đè trước
+
+    def newSearch(self):
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * len(self.entries)
+        self.generation = 0
+
+    def probe(self, key):
+        """
+        Return the entry stored for this position or None.
+        """
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, flag, best_move_id):
+        """
+        Replacement policy: always replace an empty slot, the same position, or an entry
+        left over from an earlier search; otherwise keep the deeper of the two results.
+        """
+        index = key & self.mask
+        old = self.entries[index]
+        if old is None or old[0] == key or old[5] != self.generation or depth >= old[1]:
+            self.entries[index] = (key, depth, score, flag, best_move_id, self.generation)
+
+
+class SearchStats:
+    """
+    Counters of one search, filled in only when ChessAI.collect_stats is True
+    (the search and GameState check for None, so switched off they cost a global lookup).
+    """
+    __slots__ = ("nodes", "quiescence_nodes", "interior_nodes", "beta_cutoffs", "first_move_cutoffs", "tt_probes",
+                 "tt_hits", "tt_cutoffs", "tablebase_hits", "evaluations", "quiescence_cutoffs", "make_moves",
+                 "generate_calls", "generated_moves", "iteration_nodes")
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, 0)
+        self.iteration_nodes = []#nodes_searched sau mỗi vòng lặp sâu dần (cộng dồn)
+
+    def countCutoff(self, move_number):
+        self.beta_cutoffs += 1
+        if move_number == 1:#nước đầu tiên đã đủ cắt: thứ tự nước đi tốt
+            self.first_move_cutoffs += 1
+
+    def toDict(self):
+        """
+        The counters plus the derived rates, for the info dict of findBestMove.
+        """
+        stats = {name: getattr(self, name) for name in self.__slots__}
+        stats["beta_cutoff_rate"] = self.beta_cutoffs / self.interior_nodes if self.interior_nodes else 0
+        stats["first_move_cutoff_rate"] = self.first_move_cutoffs / self.beta_cutoffs if self.beta_cutoffs else 0
+        stats["tt_hit_rate"] = self.tt_hits / self.tt_probes if self.tt_probes else 0
+        stats["moves_per_generation"] = self.generated_moves / self.generate_calls if self.generate_calls else 0
+        #hệ số phân nhánh hiệu dụng: số node vòng cuối / số node vòng trước
+        iteration_nodes = [nodes - previous for nodes, previous in
+                           zip(self.iteration_nodes, [0] + self.iteration_nodes[:-1])]
+        stats["iteration_nodes"] = iteration_nodes
+        if len(iteration_nodes) >= 2 and iteration_nodes[-2]:
+            stats["effective_branching_factor"] = iteration_nodes[-1] / iteration_nodes[-2]
+        else:
+            stats["effective_branching_factor"] = None
+        return stats
+
+
+transposition_table = TranspositionTable()
+root_depth = DEPTH#độ sâu của vòng lặp hiện tại, dùng để nhận biết nút gốc
+nodes_searched = 0
+quiescence_nodes = 0#số node của tìm kiếm tĩnh, đếm riêng với nodes_searched
+deadline = None#thời điểm phải dừng tìm kiếm, None nếu không giới hạn
+stop_event = None#đối tượng có is_set(), dùng để hủy tìm kiếm từ tiến trình/luồng khác
+use_opening_book = True#False để luôn tìm kiếm (benchmark)
+opening_book = None#ChessBook.OpeningBook, mở ở lần dùng đầu tiên; False nếu không có file sách
+use_tablebase = True
+shuffle_root_moves = True#False: kết quả tìm kiếm lặp lại được (benchmark)
+collect_stats = False#True: findBestMove trả thêm info["stats"] (SearchStats.toDict)
+search_stats = None#SearchStats của lần tìm kiếm đang chạy, None nếu không thu thập
+tablebase = ChessTablebase.Tablebase()#chỉ mở file bảng khi thế cờ còn ít quân
+
+
+# Sắp xếp nước đi: nước đi tốt được thử trước thì cắt alpha-beta xảy ra sớm hơn.
+# Mỗi nước được chấm điểm, điểm cao thử trước:
+#   nước tốt nhất trong bảng chuyển vị > ăn quân (MVV-LVA) > phong cấp > killer > history
+HASH_MOVE_ORDER = 10 ** 9
+CAPTURE_ORDER = 10 ** 8
+PROMOTION_ORDER = 9 * 10 ** 7
+KILLER_ORDER = 10 ** 7
+killer_moves = [[None, None] for _ in range(MAX_DEPTH + 1)]#2 nước đi yên lặng gây cắt beta gần nhất ở mỗi ply
+history_scores = {}#moveID -> tổng depth * depth các lần nước đi yên lặng gây cắt beta
+
+
+def orderMovesNone(moves, ply, hash_move_id):
+    """
+    Keep the generated order (baseline for benchmarks).
+    """
+    return moves
+
+
+def _mvvLvaScore(move):
+    #quân bị ăn càng giá trị càng tốt, quân đi ăn càng rẻ càng tốt
+    return CAPTURE_ORDER + piece_score[move.piece_captured[1]] * 10 - piece_score[move.piece_moved[1]]
+
+
+def orderMovesMvvLva(moves, ply, hash_move_id):
+    """
+    Hash move first, then captures by most valuable victim / least valuable attacker.
+    """
+    def orderScore(move):
+        if move.moveID == hash_move_id:
+            return HASH_MOVE_ORDER
+        if move.is_capture:
+            return _mvvLvaScore(move)
+        if move.is_pawn_promotion:
+            return PROMOTION_ORDER + piece_score[move.promotion_piece]
+        return 0
+    return sorted(moves, key=orderScore, reverse=True)
+
+
+def orderMovesFull(moves, ply, hash_move_id):
+    """
+    Hash move, MVV-LVA captures, promotions, killer moves of this ply, then quiet moves by history score.
+    """
+    killers = killer_moves[ply]
+
+    def orderScore(move):
+        move_id = move.moveID
+        if move_id == hash_move_id:
+            return HASH_MOVE_ORDER
+        if move.is_capture:
+            return _mvvLvaScore(move)
+        if move.is_pawn_promotion:
+            return PROMOTION_ORDER + piece_score[move.promotion_piece]
+        if move_id == killers[0]:
+            return KILLER_ORDER + 1
+        if move_id == killers[1]:
+            return KILLER_ORDER
+        return history_scores.get(move_id, 0)
+    return sorted(moves, key=orderScore, reverse=True)
+
+
+MOVE_ORDERINGS = {"none": orderMovesNone, "mvv_lva": orderMovesMvvLva, "full": orderMovesFull}
+move_ordering = orderMovesFull#hàm sắp xếp đang dùng, có thể thay bằng hàm khác trong MOVE_ORDERINGS
+
+
+def clearMoveOrderingTables():
+    global killer_moves, history_scores
+    killer_moves = [[None, None] for _ in range(MAX_DEPTH + 1)]
+    history_scores = {}
+
+
+def updateMoveOrderingTables(move, ply, depth):
+    """
+    Remember a quiet move that caused a beta cutoff.
+    """
+    if move.is_capture:#nước ăn quân đã được xếp bằng MVV-LVA
+        return
+    killers = killer_moves[ply]
+    if killers[0] != move.moveID:
+        killers[1] = killers[0]
+        killers[0] = move.moveID
+    history_scores[move.moveID] = history_scores.get(move.moveID, 0) + depth * depth
+
+
+class SearchTimeout(Exception):
+    """
+    Raised inside the search when the deadline has passed or the search was stopped.
+    """
+    pass
+
+
+def searchShouldStop():
+    if stop_event is not None and stop_event.is_set():
+        return True
+    return deadline is not None and time.time() > deadline
+
+
+def probeOpeningBook(game_state, valid_moves):
+    """
+    A book move for this position, or None when out of book or no book file exists.
+    """
+    global opening_book
+    if not use_opening_book:
+        return None
+    if opening_book is None:
+        opening_book = ChessBook.OpeningBook(BOOK_PATH) if os.path.exists(BOOK_PATH) else False
+    if opening_book is False:
+        return None
+    return opening_book.chooseMove(game_state, valid_moves)
+
+
+def probeTablebase(game_state):
+    """
+    Exact score of a position with few pieces from the endgame tablebase, or None.
+    """
+    if not use_tablebase or game_state.piece_count > ChessTablebase.MAX_PIECES:
+        return None
+    result = tablebase.probe(game_state)
+    if result is None:
+        return None
+    outcome, plies = result
+    if outcome == ChessTablebase.DRAW:
+        return STALEMATE
+    if outcome == ChessTablebase.LOSS:
+        return -CHECKMATE if plies == 0 else -(TABLEBASE_WIN - plies)
+    return TABLEBASE_WIN - plies#chiếu hết càng nhanh điểm càng cao
+
+
+def findBestMove(game_state, valid_moves, return_queue, time_limit=None, max_depth=None,
+                 stop=None, on_iteration=None):#tìm nước đi tốt nhất
+    """
+    Iterative deepening: search depth 1, 2, ... and keep the move of the last completed depth.
+    Without time_limit the search stops at max_depth (DEPTH by default).
+    With time_limit (seconds) it deepens until the deadline or max_depth (MAX_DEPTH by default).
+    max_depth is never more than MAX_DEPTH (the size of the killer move table).
+    stop is an optional object with is_set() (e.g. multiprocessing.Event); once set, the search
+    returns the best completed result as if the deadline had passed.
+    on_iteration(iteration) is called after each completed depth with the entry of info["iterations"]
+    plus "move" and "score" (e.g. to print UCI info lines while searching).
+    Puts (move, info) on return_queue, info has "depth", "nodes", "quiescence_nodes", "score", "time",
+    "iterations" (depth, nodes, quiescence nodes and time after each completed depth)
+    and "stats" (see SearchStats.toDict) when collect_stats is True.
+    A move from the opening book is returned at once with depth 0 and info["book"] set.
+    """
+    global next_move, root_depth, nodes_searched, quiescence_nodes, deadline, stop_event, search_stats
+    start_time = time.time()
+    book_move = probeOpeningBook(game_state, valid_moves)
+    if book_move is not None:
+        return_queue.put((book_move, {"depth": 0, "nodes": 0, "quiescence_nodes": 0, "score": 0,
+                                      "time": time.time() - start_time, "book": True}))
+        return
+    stop_event = stop
+    if max_depth is None:
+        max_depth = DEPTH if time_limit is None else MAX_DEPTH
+    max_depth = min(max_depth, MAX_DEPTH)#killer_moves chỉ có MAX_DEPTH + 1 ply
+    transposition_table.newSearch()
+    clearMoveOrderingTables()
+    nodes_searched = 0
+    quiescence_nodes = 0
+    search_stats = SearchStats() if collect_stats else None
+    game_state.stats = search_stats
+    if shuffle_root_moves:
+        random.shuffle(valid_moves)#xáo trộn để đảm bảo có nhiều nước đi tốt nhất thì chọn ngẫu nhiên 1 trong số đó
     # Thuật toán tìm kiếm này sẽ sử dụng Negamax với cắt alpha-beta 
     #DEPTH: độ sâu tối đa thuật toán tìm kiếm
     #-CHECKMATE: Giá trị tượng trưng cho tình huống checkmate (thua cuộc). Đây là một giá trị số âm lớn, đại diện cho việc một bên đã bị checkmate và thua.
 
     #CHECKMATE: Giá trị tượng trưng cho tình huống checkmate (thua cuộc). Đây là một giá trị số dương lớn, đại diện cho việc một bên đã checkmate đối phương và thắng.
-    findMoveNegaMaxAlphaBeta(game_state, valid_moves, DEPTH, -CHECKMATE, CHECKMATE,
-                             1 if game_state.white_to_move else -1)
-    return_queue.put(next_move)
+    best_move = None
+    best_score = 0
+    completed_depth = 0
+    iterations = []
+    root_ply = len(game_state.move_log)
+    deadline = start_time + time_limit if time_limit is not None else None
+    for depth in range(1, max_depth + 1):
+        if depth > 1 and stop_event is not None and stop_event.is_set():
+            break
+        root_depth = depth
+        next_move = None
+        if best_move is not None:#nước tốt nhất của vòng trước được thử đầu tiên
+            valid_moves.remove(best_move)
+            valid_moves.insert(0, best_move)
+        try:
+            score = findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, -CHECKMATE, CHECKMATE,
+                                             1 if game_state.white_to_move else -1)
+        except SearchTimeout:
+            #trả bàn cờ về thế cờ gốc, bỏ kết quả của vòng chưa xong
+            while len(game_state.move_log) > root_ply:
+                game_state.undoMove()
+            break
+        if next_move is not None:
+            best_move = next_move
+        best_score = score
+        completed_depth = depth
+        iterations.append({"depth": depth, "nodes": nodes_searched, "quiescence_nodes": quiescence_nodes,
+                           "time": time.time() - start_time})
+        if on_iteration is not None:
+            on_iteration(dict(iterations[-1], move=best_move, score=score))
+        if search_stats is not None:
+            search_stats.iteration_nodes.append(nodes_searched)
+        if abs(score) >= CHECKMATE:#đã tìm thấy chiếu hết, tìm sâu hơn không thay đổi kết quả
+            break
+        if time_limit is not None and time.time() - start_time > time_limit / 2:
+            break#vòng sau thường tốn nhiều hơn tất cả các vòng trước cộng lại
+    deadline = None
+    stop_event = None
+    info = {"depth": completed_depth, "nodes": nodes_searched, "quiescence_nodes": quiescence_nodes,
+            "score": best_score, "time": time.time() - start_time, "iterations": iterations}
+    if search_stats is not None:
+        search_stats.nodes = nodes_searched
+        search_stats.quiescence_nodes = quiescence_nodes
+        info["stats"] = search_stats.toDict()
+        game_state.stats = None
+        search_stats = None
+    return_queue.put((best_move, info))
+
+
+def getPrincipalVariation(game_state, max_length=MAX_DEPTH):
+    """
+    The expected line from this position: the hash moves of the transposition table, as long as they are legal.
+    """
+    moves = []
+    seen = set()#tránh vòng lặp khi thế cờ lặp lại
+    while len(moves) < max_length and game_state.zobrist_key not in seen:
+        entry = transposition_table.probe(game_state.zobrist_key)
+        if entry is None or entry[4] is None:
+            break
+        move = game_state.getMoveById(entry[4])
+        if move is None:
+            break
+        seen.add(game_state.zobrist_key)
+        moves.append(move)
+        game_state.makeMove(move)
+    for _ in moves:
+        game_state.undoMove()
+    return moves
 
 
 def findMoveNegaMaxAlphaBeta(game_state, valid_moves, depth, alpha, beta, turn_multiplier):
+    #valid_moves: danh sách nước đi của thế cờ, hoặc None để sinh dần bằng game_state.iterMoves
     #turn_multiplier: 1 nếu đang tìm kiếm cho người chơi Max, -1 nếu đang tìm kiếm cho người chơi Min.
     #'alpha': Giá trị tốt nhất cho người chơi hiện tại (người chơi Max).
     #'beta': Giá trị tốt nhất cho đối phương (người chơi Min).
     #Ý tưởng chính của thuật toán là tìm kiếm theo đệ quy thông qua cây trò chơi, mô phỏng tất cả các nước đi có thể 
     #từ trạng thái hiện tại của trò chơi. Khi đạt độ sâu cố định hoặc trạng thái cờ chấm dứt (ví dụ: chiếu hết), thuật 
     # toán tính toán giá trị của trạng thái hiện tại thông qua hàm scoreBoard
-    global next_move
+    global next_move, nodes_searched
+    nodes_searched += 1
+    if nodes_searched % TIME_CHECK_INTERVAL == 0 and root_depth > 1 and searchShouldStop():#độ sâu 1 luôn tìm xong
+        raise SearchTimeout()
+    if depth != root_depth and game_state.piece_count <= ChessTablebase.MAX_PIECES:
+        #tàn cuộc ít quân: tra bảng cho kết quả chính xác, không cần tìm tiếp
+        tablebase_score = probeTablebase(game_state)
+        if tablebase_score is not None:
+            if search_stats is not None:
+                search_stats.tablebase_hits += 1
+            return tablebase_score
     if depth == 0:
-        return turn_multiplier * scoreBoard(game_state)
-    # move ordering - implement later //TODO
+        #chỉ cần biết còn nước đi hợp lệ hay không, không cần sinh hết danh sách nước đi
+        if search_stats is not None:
+            search_stats.evaluations += 1
+        if game_state.updateGameOver():
+            return turn_multiplier * scoreBoard(game_state)
+        #không dừng giữa chuỗi ăn quân: tìm tiếp các nước ăn quân cho tới khi thế cờ yên tĩnh
+        return quiescenceSearch(game_state, alpha, beta, turn_multiplier)
+    #tra bảng chuyển vị: thế cờ này có thể đã được tìm trước đó qua thứ tự nước đi khác
+    key = game_state.zobrist_key
+    alpha_original = alpha
+    hash_move_id = None
+    entry = transposition_table.probe(key)
+    if search_stats is not None:
+        search_stats.tt_probes += 1
+        search_stats.tt_hits += entry is not None
+    if entry is not None:
+        _, entry_depth, entry_score, entry_flag, hash_move_id, _ = entry
+        if depth != root_depth and entry_depth >= depth:#ở gốc vẫn phải tìm để có next_move
+            if entry_flag == EXACT:
+                alpha = beta = entry_score
+            elif entry_flag == LOWER_BOUND:
+                alpha = max(alpha, entry_score)
+            else:
+                beta = min(beta, entry_score)
+            if alpha >= beta:
+                if search_stats is not None:
+                    search_stats.tt_cutoffs += 1
+                return entry_score
+    ply = root_depth - depth
     max_score = -CHECKMATE
-    for move in valid_moves:
+    best_move_id = None
+    if valid_moves is None:
+        #sinh nước đi theo từng nhóm: bị cắt beta sớm thì các nhóm sau không phải sinh
+        moves = game_state.iterMoves(hash_move_id, lambda stage_moves: move_ordering(stage_moves, ply, None))
+    else:
+        moves = move_ordering(valid_moves, ply, hash_move_id)
+    move_count = 0
+    for move in moves:
+        move_count += 1
         game_state.makeMove(move)
-        next_moves = game_state.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(game_state, next_moves, depth - 1, -beta, -alpha, -turn_multiplier)
+        score = -findMoveNegaMaxAlphaBeta(game_state, None, depth - 1, -beta, -alpha, -turn_multiplier)
         if score > max_score:
             max_score = score
-            if depth == DEPTH:
+            best_move_id = move.moveID
+            if depth == root_depth:
                 next_move = move
         game_state.undoMove()
         if max_score > alpha:
             alpha = max_score
         if alpha >= beta:
+            updateMoveOrderingTables(move, ply, depth)
+            if search_stats is not None:
+                search_stats.countCutoff(move_count)
             break
+    if not move_count:#hết nước đi: bị chiếu hết hoặc hòa pat
+        return -CHECKMATE if game_state.inCheck() else STALEMATE
+    if search_stats is not None:
+        search_stats.interior_nodes += 1
+    #lưu kết quả cùng loại giá trị (chính xác / cận dưới / cận trên)
+    if max_score <= alpha_original:
+        flag = UPPER_BOUND
+    elif max_score >= beta:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    transposition_table.store(key, depth, max_score, flag, best_move_id)
+    return max_score
+
+
+def quiescenceSearch(game_state, alpha, beta, turn_multiplier):
+    """
+    Search only captures and promotions (all moves when in check) until the position is quiet,
+    so the evaluation is never taken in the middle of an exchange.
+    """
+    global quiescence_nodes
+    quiescence_nodes += 1
+    if quiescence_nodes % TIME_CHECK_INTERVAL == 0 and root_depth > 1 and searchShouldStop():
+        raise SearchTimeout()
+    if game_state.inCheck():
+        #bị chiếu thì không được đứng yên: thử mọi nước thoát chiếu
+        moves = game_state.getValidMoves()
+        if not moves:
+            return -CHECKMATE
+        stand_pat = None
+        max_score = -CHECKMATE
+    else:
+        #stand pat: bên đi có thể không ăn quân, điểm tĩnh là cận dưới của điểm thế cờ
+        stand_pat = turn_multiplier * game_state.board_score / 100
+        if search_stats is not None:
+            search_stats.evaluations += 1
+        if stand_pat >= beta:
+            if search_stats is not None:
+                search_stats.quiescence_cutoffs += 1
+            return stand_pat
+        if stand_pat + piece_score["Q"] + DELTA_MARGIN < alpha:#ăn hậu cũng không đủ
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        moves = game_state.getCaptureMoves()
+        max_score = stand_pat
+    for move in orderMovesMvvLva(moves, 0, None):
+        if stand_pat is not None and not move.is_pawn_promotion and \
+                stand_pat + piece_score[move.piece_captured[1]] + DELTA_MARGIN < alpha:
+            continue#delta pruning
+        game_state.makeMove(move)
+        score = -quiescenceSearch(game_state, -beta, -alpha, -turn_multiplier)
+        game_state.undoMove()
+        if score > max_score:
+            max_score = score
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    if search_stats is not None:
+                        search_stats.quiescence_cutoffs += 1
+                    break
     return max_score
 
 
 def scoreBoard(game_state):
     """
     Score the board. A positive score is good for white, a negative score is good for black.
+    The checkmate/stalemate flags must describe this position (set by getValidMoves or updateGameOver).
     """
     if game_state.checkmate:#kiểm tra chiếu tướng
         if game_state.white_to_move:
@@ -121,6 +510,18 @@ def scoreBoard(game_state):
             return CHECKMATE  # white wins
     elif game_state.stalemate:
         return STALEMATE
+    #điểm vật chất + vị trí được GameState cập nhật theo từng nước đi (centipawn), không cần duyệt bàn cờ
+    return game_state.board_score / 100
+
+
+def scoreBoardFull(game_state):
+    """
+    Score the board by scanning all 64 squares (reference for the incremental score).
+    """
+    if game_state.checkmate:
+        return -CHECKMATE if game_state.white_to_move else CHECKMATE
+    elif game_state.stalemate:
+        return STALEMATE
     #Điểm của mỗi quân cờ được tính dựa trên hai yếu tố: giá trị cơ bản của quân cờ và giá trị vị trí của quân cờ.
     #Dưới đây là giá trị cơ bản của từng loại quân cờ trong trò chơi cờ vua:
     #Vua (King): 0 điểm (không có giá trị cơ bản, vua là quân quan trọng nhất, không thể thay thế).
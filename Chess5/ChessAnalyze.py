@@ -0,0 +1,154 @@
+"""
+Headless batch analysis: read FEN or EPD lines, search every position in a pool of worker processes
+and write one JSON line per position as soon as it is finished (so in completion order, not input order).
+At most --in-flight positions are read ahead of the results, so any size of input runs in bounded memory.
+
+    python ChessAnalyze.py positions.epd --depth 4
+    cat positions.fen | python ChessAnalyze.py --time 1.5 --workers 8 > results.jsonl
+
+EPD operations "id" and "bm"/"am" are copied to the output, and "solved" tells if the best move matches.
+"""
+import argparse
+import json
+import multiprocessing
+import queue
+import sys
+import time
+
+import ChessAI
+import ChessBitboard
+
+
+def parseLine(text):
+    """
+    FEN or EPD line -> (fen, operations). The operations of an EPD line are returned as
+    {opcode: [operands]}, e.g. 'bm Nf3 e4; id "test 1";' -> {"bm": ["Nf3", "e4"], "id": ["test 1"]}.
+    """
+    fields = text.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("not a FEN/EPD line: " + text)
+    rest = fields[4] if len(fields) > 4 else ""
+    counters = rest.split(None, 2)
+    if len(counters) >= 2 and counters[0].isdigit() and counters[1].isdigit():#FEN đủ 6 trường
+        fen = " ".join(fields[:4] + counters[:2])
+        rest = counters[2] if len(counters) > 2 else ""
+    else:
+        fen = " ".join(fields[:4])
+    operations = {}
+    for operation in rest.split(";"):
+        operation = operation.strip()
+        if not operation:
+            continue
+        opcode, _, operands = operation.partition(" ")
+        if operands.strip().startswith('"'):
+            operations[opcode] = [operands.strip().strip('"')]
+        else:
+            operations[opcode] = operands.split()
+    return fen, operations
+
+
+def analyzePosition(task):
+    """
+    Search one position in a worker process. Returns the JSON-ready result.
+    """
+    line_number, fen, operations, depth, time_limit, use_book = task
+    result = {"line": line_number, "fen": fen}
+    if "id" in operations:
+        result["id"] = operations["id"][0]
+    start_time = time.time()
+    try:
+        ChessAI.use_opening_book = use_book
+        game_state = ChessBitboard.BitboardGameState(fen)
+        valid_moves = game_state.getValidMoves()
+        if not valid_moves:
+            result["result"] = "checkmate" if game_state.checkmate else "stalemate"
+            return result
+        return_queue = queue.Queue()
+        ChessAI.findBestMove(game_state, valid_moves, return_queue, time_limit, depth)
+        move, info = return_queue.get()
+        result.update(bestmove=game_state.getSAN(move), uci=move.getCoordinateNotation(), score=info["score"],
+                      depth=info["depth"], nodes=info["nodes"], quiescence_nodes=info["quiescence_nodes"],
+                      time=round(time.time() - start_time, 3))
+        #bài test EPD: bm là các nước đúng, am là các nước phải tránh
+        if "bm" in operations or "am" in operations:
+            best_moves = [game_state.parseSAN(san).moveID for san in operations.get("bm", [])]
+            avoid_moves = [game_state.parseSAN(san).moveID for san in operations.get("am", [])]
+            result["solved"] = (not best_moves or move.moveID in best_moves) and move.moveID not in avoid_moves
+    except Exception as error:#lỗi của một thế cờ không được làm dừng cả lần chạy
+        result["error"] = "%s: %s" % (type(error).__name__, error)
+    return result
+
+
+def readTasks(lines, depth, time_limit, use_book):
+    """
+    Yield one task per non-empty, non-comment input line. Bad lines become tasks with the error,
+    so the output still has one line per input position.
+    """
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            fen, operations = parseLine(line)
+        except ValueError as error:
+            yield line_number, None, str(error)
+            continue
+        yield line_number, (line_number, fen, operations, depth, time_limit, use_book), None
+
+
+def runAnalysis(lines, output, workers, in_flight, depth=None, time_limit=None, use_book=False):
+    """
+    Analyze every line and write the results to output. Returns (positions, errors, solved).
+    """
+    results = queue.Queue()#kết quả từ callback của Pool, theo thứ tự xong trước
+    pending = 0
+    counts = {"positions": 0, "errors": 0, "solved": 0}
+
+    def writeResult(result):
+        counts["positions"] += 1
+        counts["errors"] += "error" in result
+        counts["solved"] += bool(result.get("solved"))
+        output.write(json.dumps(result) + "\n")
+        output.flush()
+
+    def onError(error):#lỗi ngoài analyzePosition (vd. không pickle được)
+        results.put({"error": "%s: %s" % (type(error).__name__, error)})
+
+    with multiprocessing.Pool(workers) as pool:
+        for line_number, task, error in readTasks(lines, depth, time_limit, use_book):
+            if error is not None:
+                writeResult({"line": line_number, "error": error})
+                continue
+            while pending >= in_flight:#đủ số thế cờ đang chờ: đọc thêm input sau khi có kết quả
+                writeResult(results.get())
+                pending -= 1
+            pool.apply_async(analyzePosition, (task,), callback=results.put, error_callback=onError)
+            pending += 1
+        while pending:
+            writeResult(results.get())
+            pending -= 1
+    return counts["positions"], counts["errors"], counts["solved"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze FEN/EPD positions with ChessAI.")
+    parser.add_argument("input", nargs="?", help="file with one FEN or EPD per line (default: stdin)")
+    parser.add_argument("--depth", type=int, help="search depth (default ChessAI.DEPTH)")
+    parser.add_argument("--time", type=float, help="seconds per position")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--in-flight", type=int, default=0,
+                        help="positions read ahead of the results (default 4 per worker)")
+    parser.add_argument("--book", action="store_true", help="allow moves from the opening book")
+    args = parser.parse_args()
+    in_flight = args.in_flight or 4 * args.workers
+    start_time = time.time()
+    lines = open(args.input) if args.input else sys.stdin
+    with lines:
+        positions, errors, solved = runAnalysis(lines, sys.stdout, args.workers, in_flight, args.depth, args.time,
+                                                args.book)
+    print("positions=%d errors=%d solved=%d time=%.1fs" % (positions, errors, solved, time.time() - start_time),
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
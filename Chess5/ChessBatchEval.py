@@ -0,0 +1,160 @@
+"""
+Evaluate many positions at once with NumPy.
+Positions are encoded as an N x 64 array of piece codes (0 empty, 1-12 the pieces of PIECES),
+and the material + piece-square score of the whole batch is one table lookup and one sum.
+The scores are exactly those of ChessAI.scoreBoard (the same centipawn table as GameState.board_score).
+
+    python ChessBatchEval.py positions.fen > scores.txt
+    python ChessBatchEval.py positions.epd --check        compare every score with ChessAI.scoreBoard
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import ChessAI
+import ChessEngine
+
+PIECES = tuple(ChessEngine.ZOBRIST_PIECES)#("wp", "wN", ..., "bK"): quân có mã i + 1
+PIECE_CODES = {"--": 0}
+PIECE_CODES.update((piece, code) for code, piece in enumerate(PIECES, 1))
+FEN_LETTERS = {piece: piece[1].upper() if piece[0] == "w" else piece[1].lower() for piece in PIECES}
+#dịch phần bàn cờ của FEN thành 64 ký tự mã quân: "rnbq..." -> "\x0a\x08...", "8" -> 8 ký tự "\x00"
+_FEN_TRANSLATION = str.maketrans({**{str(count): "\0" * count for count in range(1, 9)}, "/": "",
+                                  **{FEN_LETTERS[piece]: chr(code) for piece, code in PIECE_CODES.items()
+                                     if piece != "--"}})
+BATCH_SIZE = 65536#số thế cờ mỗi lô khi đọc file
+
+
+def buildValueTable(piece_square_values=ChessEngine.PIECE_SQUARE_VALUES):
+    """
+    13 x 64 int32 array: the centipawn value of every piece code on every square (row 0 is the empty square).
+    """
+    value_table = np.zeros((len(PIECES) + 1, 64), dtype=np.int32)
+    for piece, code in PIECE_CODES.items():
+        if piece != "--":
+            value_table[code] = piece_square_values[piece]
+    return value_table
+
+
+VALUE_TABLE = buildValueTable()
+
+
+def encodeGameStates(game_states):
+    """
+    N x 64 uint8 piece codes of a list of GameState, square index row * 8 + col.
+    """
+    codes = np.zeros((len(game_states), 64), dtype=np.uint8)
+    for index, game_state in enumerate(game_states):
+        codes[index] = [PIECE_CODES[piece] for rank in game_state.board for piece in rank]
+    return codes
+
+
+def encodeFENs(fens):
+    """
+    N x 64 uint8 piece codes of a list of FEN (or EPD) strings, without building a GameState.
+    """
+    boards = []
+    for fen in fens:
+        board = fen.split(None, 1)[0].translate(_FEN_TRANSLATION)
+        if len(board) != 64:
+            raise ValueError("bad board in FEN: " + fen)
+        boards.append(board)
+    codes = np.frombuffer("".join(boards).encode("latin-1"), dtype=np.uint8)
+    if codes.max(initial=0) > len(PIECES):#ký tự lạ không được dịch
+        raise ValueError("bad piece in FEN batch")
+    return codes.reshape(len(fens), 64)
+
+
+def toPlanes(codes):
+    """
+    N x 12 x 64 bool planes (one plane per piece in PIECES order) from N x 64 piece codes.
+    """
+    return codes[:, None, :] == np.arange(1, len(PIECES) + 1, dtype=np.uint8)[None, :, None]
+
+
+def evaluateCodes(codes, value_table=VALUE_TABLE):
+    """
+    Material + piece-square score in centipawns (int64, positive is good for white) of every position.
+    """
+    return value_table[codes, np.arange(64)].sum(axis=1, dtype=np.int64)
+
+
+def evaluatePlanes(planes, value_table=VALUE_TABLE):
+    """
+    Same as evaluateCodes for positions encoded with toPlanes.
+    """
+    return np.einsum("npk,pk->n", planes.astype(np.int64), value_table[1:].astype(np.int64))
+
+
+def scoreBoards(game_states):
+    """
+    ChessAI.scoreBoard of every game state, as a float64 array. Like scoreBoard it trusts the
+    checkmate/stalemate flags of each game state.
+    """
+    scores = evaluateCodes(encodeGameStates(game_states)) / 100
+    checkmate = np.array([game_state.checkmate for game_state in game_states], dtype=bool)
+    stalemate = np.array([game_state.stalemate for game_state in game_states], dtype=bool)
+    white_to_move = np.array([game_state.white_to_move for game_state in game_states], dtype=bool)
+    scores = np.where(stalemate, float(ChessAI.STALEMATE), scores)
+    return np.where(checkmate, np.where(white_to_move, -ChessAI.CHECKMATE, ChessAI.CHECKMATE).astype(np.float64),
+                    scores)
+
+
+def readBatches(lines, batch_size=BATCH_SIZE):
+    """
+    Yield lists of at most batch_size FEN/EPD strings, skipping empty and comment lines.
+    """
+    batch = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        batch.append(line)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score FEN/EPD positions in batches with NumPy.")
+    parser.add_argument("input", nargs="?", help="file with one FEN or EPD per line (default: stdin)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--check", action="store_true",
+                        help="compare every score with ChessAI.scoreBoard instead of printing the scores")
+    args = parser.parse_args()
+    positions = mismatches = 0
+    eval_time = 0
+    lines = open(args.input) if args.input else sys.stdin
+    with lines:
+        for batch in readBatches(lines, args.batch_size):
+            start_time = time.perf_counter()
+            scores = evaluateCodes(encodeFENs(batch)) / 100
+            eval_time += time.perf_counter() - start_time
+            positions += len(batch)
+            if not args.check:
+                sys.stdout.write("".join("%g\n" % score for score in scores))
+                continue
+            #scoreBoard cho điểm chiếu hết / hòa pat, lô điểm thì không biết nước đi: so sánh bằng scoreBoards
+            game_states = [ChessEngine.GameState(" ".join(fen.split()[:4])) for fen in batch]
+            for game_state in game_states:
+                game_state.updateGameOver()
+            expected = [ChessAI.scoreBoard(game_state) for game_state in game_states]
+            for fen, fen_score, score, reference, game_state in zip(batch, scores, scoreBoards(game_states), expected,
+                                                                    game_states):
+                game_over = game_state.checkmate or game_state.stalemate
+                if score != reference or (not game_over and fen_score != reference):
+                    mismatches += 1
+                    print("mismatch %s: %r != %r" % (fen, score, reference))
+    print("positions=%d time=%.3fs positions/s=%.0f%s" %
+          (positions, eval_time, positions / eval_time if eval_time else 0,
+           " mismatches=%d" % mismatches if args.check else ""), file=sys.stderr)
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Search benchmark: run ChessAI.findBestMove on a fixed set of positions at fixed depths and record
+nodes, time to each depth, nodes per second, peak memory and the chosen move.
+The search is made deterministic (no root move shuffle, empty hash and move ordering tables,
+no opening book or tablebase), so the node counts only change when the search itself changes.
+
+    python ChessBench.py                              run the suite
+    python ChessBench.py --save-baseline              write bench_baseline.json next to this file
+    python ChessBench.py --baseline bench_baseline.json --time-threshold 0.1
+    python ChessBench.py --category endgame --depth 5 --repeat 3 --json results.json
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import time
+import tracemalloc
+
+import ChessAI
+import ChessBitboard
+
+# Đổi BENCH_VERSION mỗi khi sửa danh sách thế cờ: baseline của phiên bản khác không so sánh được
+BENCH_VERSION = 1
+# (tên, loại, FEN, độ sâu)
+BENCH_POSITIONS = [
+    ("start", "opening", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 4),
+    ("italian", "middlegame", "r1bqk2r/ppp2ppp/2np1n2/2b1p3/2B1P3/2PP1N2/PP3PPP/RNBQK2R w KQkq - 0 6", 4),
+    ("queens_gambit", "middlegame", "rnbq1rk1/ppp1bppp/4pn2/3p2B1/2PP4/2N1P3/PP3PPP/R2QKBNR w KQ - 1 6", 4),
+    ("sicilian", "middlegame", "rnbqkb1r/1p2pppp/p2p1n2/8/3NP3/2N5/PPP2PPP/R1BQKB1R w KQkq - 0 6", 4),
+    ("kings_indian", "middlegame", "rnbq1rk1/ppp1ppbp/3p1np1/8/2PPP3/2N2N2/PP3PPP/R1BQKB1R w KQ - 2 6", 4),
+    ("position6", "middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10", 3),
+    ("kiwipete", "tactical", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", 3),
+    ("position4", "tactical", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", 3),
+    ("position5", "tactical", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", 3),
+    ("wac001", "tactical", "2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1", 3),
+    ("wac002", "tactical", "8/7p/5k2/5p2/p1p2P2/Pr1pPK2/1P1R3P/8 b - - 0 1", 4),
+    ("wac004", "tactical", "r1b2rk1/2q1b1pp/p2ppn2/1p6/3QP3/1BN1B3/PPP3PP/R4RK1 w - - 0 1", 3),
+    ("position3", "endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", 5),
+    ("king_pawn", "endgame", "8/8/8/4k3/8/8/4P3/4K3 w - - 0 1", 6),
+    ("lucena", "endgame", "1K1k4/1P6/8/8/8/8/r7/2R5 w - - 0 1", 5),
+    ("pawn_race", "endgame", "8/5pk1/6p1/8/8/6P1/5PK1/8 w - - 0 1", 6),
+]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def benchPosition(fen, depth, measure_memory=False):
+    """
+    One deterministic search. Returns the result dict (memory only when measure_memory,
+    tracemalloc slows the search down so the time of that run is not used).
+    """
+    game_state = ChessBitboard.BitboardGameState(fen)
+    ChessAI.transposition_table.clear()
+    ChessAI.clearMoveOrderingTables()
+    if measure_memory:
+        tracemalloc.start()
+    return_queue = queue.Queue()
+    start_time = time.perf_counter()
+    ChessAI.findBestMove(game_state, game_state.getValidMoves(), return_queue, max_depth=depth)
+    elapsed = time.perf_counter() - start_time
+    move, info = return_queue.get()
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return {"peak_memory": peak}
+    nodes = info["nodes"] + info["quiescence_nodes"]
+    return {"move": move.getCoordinateNotation() if move is not None else None, "score": info["score"],
+            "depth": info["depth"], "nodes": info["nodes"], "quiescence_nodes": info["quiescence_nodes"],
+            "time": elapsed, "nps": nodes / elapsed if elapsed else 0,
+            "time_to_depth": [round(iteration["time"], 4) for iteration in info["iterations"]]}
+
+
+def runBench(positions, depth_override=None, repeat=1, measure_memory=True):
+    """
+    Run the benchmark. Returns {"version", "positions": {name: result}, "total": {...}}.
+    The time of each position is the fastest of repeat runs.
+    """
+    saved_settings = (ChessAI.use_opening_book, ChessAI.use_tablebase, ChessAI.shuffle_root_moves)
+    ChessAI.use_opening_book = False
+    ChessAI.use_tablebase = False#kết quả không phụ thuộc file bảng tàn cuộc có trên máy hay không
+    ChessAI.shuffle_root_moves = False
+    results = {}
+    try:
+        for name, category, fen, depth in positions:
+            depth = depth_override or depth
+            runs = [benchPosition(fen, depth) for _ in range(repeat)]
+            result = min(runs, key=lambda run: run["time"])
+            if any(run["nodes"] != result["nodes"] for run in runs):
+                print("warning: %s is not deterministic" % name, file=sys.stderr)
+            if measure_memory:
+                result.update(benchPosition(fen, depth, measure_memory=True))
+            result["category"] = category
+            results[name] = result
+            print("%-14s %-10s depth=%d move=%-6s nodes=%-8d qnodes=%-8d time=%7.3fs nps=%6.0f%s" %
+                  (name, category, result["depth"], result["move"], result["nodes"], result["quiescence_nodes"],
+                   result["time"], result["nps"],
+                   " peak=%.0fKB" % (result["peak_memory"] / 1024) if measure_memory else ""))
+    finally:
+        ChessAI.use_opening_book, ChessAI.use_tablebase, ChessAI.shuffle_root_moves = saved_settings
+    total_nodes = sum(result["nodes"] + result["quiescence_nodes"] for result in results.values())
+    total_time = sum(result["time"] for result in results.values())
+    total = {"nodes": total_nodes, "time": total_time, "nps": total_nodes / total_time if total_time else 0}
+    print("total nodes=%d time=%.3fs nps=%.0f" % (total_nodes, total_time, total["nps"]))
+    return {"version": BENCH_VERSION, "positions": results, "total": total}
+
+
+def compareBaseline(results, baseline, time_threshold, node_threshold, memory_threshold):
+    """
+    Print the differences with a baseline and return the number of regressions:
+    a position that got slower, searched more nodes or used more memory than the thresholds allow
+    (relative, e.g. 0.1 = 10%). A different move is reported but is not a regression.
+    """
+    if baseline.get("version") != results["version"]:
+        raise ValueError("baseline is for position set version %s, this is version %s" %
+                         (baseline.get("version"), results["version"]))
+    regressions = 0
+    for name, result in results["positions"].items():
+        old = baseline["positions"].get(name)
+        if old is None:
+            print("%-14s not in baseline" % name)
+            continue
+        notes = []
+        if old["depth"] != result["depth"]:
+            notes.append("depth %d -> %d" % (old["depth"], result["depth"]))
+        checks = [("time", result["time"] / old["time"] - 1 if old["time"] else 0, time_threshold),
+                  ("nodes", (result["nodes"] + result["quiescence_nodes"]) /
+                   max(old["nodes"] + old["quiescence_nodes"], 1) - 1, node_threshold)]
+        if "peak_memory" in result and "peak_memory" in old:
+            checks.append(("memory", result["peak_memory"] / max(old["peak_memory"], 1) - 1, memory_threshold))
+        for label, change, threshold in checks:
+            if change > threshold:
+                regressions += 1
+                notes.append("REGRESSION %s %+.1f%%" % (label, 100 * change))
+            elif abs(change) > 0.005:
+                notes.append("%s %+.1f%%" % (label, 100 * change))
+        if old["move"] != result["move"]:
+            notes.append("move %s -> %s" % (old["move"], result["move"]))
+        print("%-14s %s" % (name, ", ".join(notes) if notes else "same"))
+    old_total = baseline["total"]
+    print("total time %+.1f%% nps %+.1f%%, regressions=%d" %
+          (100 * (results["total"]["time"] / old_total["time"] - 1) if old_total["time"] else 0,
+           100 * (results["total"]["nps"] / old_total["nps"] - 1) if old_total["nps"] else 0, regressions))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search benchmark on a fixed position set.")
+    parser.add_argument("--category", choices=sorted({position[1] for position in BENCH_POSITIONS}))
+    parser.add_argument("--depth", type=int, help="search every position at this depth instead of its own")
+    parser.add_argument("--repeat", type=int, default=1, help="run every search this many times, keep the fastest")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory run")
+    parser.add_argument("--baseline", help="compare with this baseline file (default %s if it exists)" %
+                        DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", metavar="PATH", nargs="?", const=DEFAULT_BASELINE,
+                        help="write the results as the new baseline (default %s)" % DEFAULT_BASELINE)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--time-threshold", type=float, default=0.10, help="allowed slowdown (0.10 = 10%%)")
+    parser.add_argument("--node-threshold", type=float, default=0.02, help="allowed increase of the node count")
+    parser.add_argument("--memory-threshold", type=float, default=0.20, help="allowed increase of peak memory")
+    args = parser.parse_args()
+    positions = [position for position in BENCH_POSITIONS if args.category in (None, position[1])]
+    results = runBench(positions, args.depth, args.repeat, not args.no_memory)
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w") as output:
+                json.dump(results, output, indent=1)
+    baseline_path = args.baseline
+    if baseline_path is None and args.save_baseline is None:
+        try:
+            open(DEFAULT_BASELINE).close()
+            baseline_path = DEFAULT_BASELINE
+        except OSError:
+            pass
+    if baseline_path:
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        if compareBaseline(results, baseline, args.time_threshold, args.node_threshold, args.memory_threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
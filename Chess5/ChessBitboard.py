@@ -0,0 +1,391 @@
+"""
+Bitboard backend for the game state.
+Every piece type of every color is stored as a 64-bit integer, one bit per square.
+Move generation uses precomputed attack tables instead of scanning the 8x8 board.
+"""
+import ChessEngine
+
+# Ô được đánh số sq = row * 8 + col, hàng 0 là hàng 8 trên bàn cờ (giống GameState.board)
+ALL_SQUARES = (1 << 64) - 1
+
+# 8 hướng đi: 4 hướng ngang/dọc cho xe, 4 hướng chéo cho tượng
+ROOK_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+def squareBit(row, col):
+    return 1 << (row * 8 + col)
+
+
+def iterBits(bitboard):
+    """
+    Yield the square index of every set bit, lowest first.
+    """
+    while bitboard:
+        lowest = bitboard & -bitboard
+        yield lowest.bit_length() - 1
+        bitboard ^= lowest
+
+
+def _stepAttacks(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        attacks = 0
+        for d_row, d_col in offsets:
+            end_row, end_col = row + d_row, col + d_col
+            if 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                attacks |= squareBit(end_row, end_col)
+        table.append(attacks)
+    return table
+
+
+def _rays(direction):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        ray = 0
+        for i in range(1, 8):
+            end_row, end_col = row + direction[0] * i, col + direction[1] * i
+            if not (0 <= end_row <= 7 and 0 <= end_col <= 7):
+                break
+            ray |= squareBit(end_row, end_col)
+        table.append(ray)
+    return table
+
+
+KNIGHT_ATTACKS = _stepAttacks(((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2)))
+KING_ATTACKS = _stepAttacks(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+# ô mà một quân tốt đứng ở sq tấn công được
+PAWN_ATTACKS = {"w": _stepAttacks(((-1, -1), (-1, 1))), "b": _stepAttacks(((1, -1), (1, 1)))}
+
+# mỗi tia lưu kèm cờ "positive": tia đi theo chiều tăng của sq thì quân chặn gần nhất là bit thấp nhất
+ROOK_RAYS = [(_rays(direction), direction[0] * 8 + direction[1] > 0) for direction in ROOK_DIRECTIONS]
+BISHOP_RAYS = [(_rays(direction), direction[0] * 8 + direction[1] > 0) for direction in BISHOP_DIRECTIONS]
+
+
+def _slidingAttacks(sq, occupied, rays):
+    attacks = 0
+    for ray_table, positive in rays:
+        ray = ray_table[sq]
+        blockers = ray & occupied
+        if blockers:
+            if positive:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= ray_table[first]  # cắt phần tia phía sau quân chặn
+        attacks |= ray
+    return attacks
+
+
+def rookAttacks(sq, occupied):
+    return _slidingAttacks(sq, occupied, ROOK_RAYS)
+
+
+def bishopAttacks(sq, occupied):
+    return _slidingAttacks(sq, occupied, BISHOP_RAYS)
+
+
+def _between():
+    between = [[0] * 64 for _ in range(64)]
+    for rays in (ROOK_RAYS, BISHOP_RAYS):
+        for ray_table, positive in rays:
+            for sq in range(64):
+                for target in iterBits(ray_table[sq]):
+                    # các ô nằm giữa sq và target (không tính 2 đầu)
+                    between[sq][target] = ray_table[sq] & ~ray_table[target] & ~(1 << target)
+    return between
+
+
+BETWEEN = _between()
+
+PIECES = ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")
+
+
+class BitboardGameState(ChessEngine.GameState):
+    """
+    Drop-in replacement for ChessEngine.GameState.
+    The 8x8 board is still kept up to date (the UI draws it and Move reads pieces from it),
+    but getValidMoves works on bitboards only.
+    """
+
+    def __init__(self, fen=None):
+        super().__init__(fen)
+        self._syncBitboards()
+
+    def loadFEN(self, fen):
+        super().loadFEN(fen)
+        self._syncBitboards()
+
+    def _syncBitboards(self):
+        """
+        Rebuild every bitboard from self.board.
+        """
+        self.bitboards = {piece: 0 for piece in PIECES}
+        self.occupied = {"w": 0, "b": 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.bitboards[piece] |= squareBit(row, col)
+                    self.occupied[piece[0]] |= squareBit(row, col)
+
+    def _toggleMove(self, move):
+        """
+        Xor the move into the bitboards. Xor is its own inverse so undo uses the same function.
+        """
+        bitboards = self.bitboards
+        occupied = self.occupied
+        color = move.piece_moved[0]
+        start_bit = squareBit(move.start_row, move.start_col)
+        end_bit = squareBit(move.end_row, move.end_col)
+        bitboards[move.piece_moved] ^= start_bit
+        bitboards[color + move.promotion_piece if move.is_pawn_promotion else move.piece_moved] ^= end_bit
+        occupied[color] ^= start_bit | end_bit
+        if move.piece_captured != "--":
+            if move.is_enpassant_move:
+                captured_bit = squareBit(move.start_row, move.end_col)
+            else:
+                captured_bit = end_bit
+            bitboards[move.piece_captured] ^= captured_bit
+            occupied[move.piece_captured[0]] ^= captured_bit
+        if move.is_castle_move:
+            if move.end_col - move.start_col == 2:  # nhập thành cánh vua
+                rook_bits = squareBit(move.end_row, move.end_col + 1) | squareBit(move.end_row, move.end_col - 1)
+            else:  # nhập thành cánh hậu
+                rook_bits = squareBit(move.end_row, move.end_col - 2) | squareBit(move.end_row, move.end_col + 1)
+            bitboards[color + "R"] ^= rook_bits
+            occupied[color] ^= rook_bits
+
+    def makeMove(self, move):
+        super().makeMove(move)
+        self._toggleMove(move)
+
+    def undoMove(self):
+        if len(self.move_log) != 0:
+            move = self.move_log[-1]
+            super().undoMove()
+            self._toggleMove(move)
+
+    def attackersTo(self, sq, occupied, color):
+        """
+        Bitboard of the pieces of the given color that attack square sq.
+        """
+        bitboards = self.bitboards
+        enemy = "b" if color == "w" else "w"
+        queens = bitboards[color + "Q"]
+        return ((KNIGHT_ATTACKS[sq] & bitboards[color + "N"])
+                | (KING_ATTACKS[sq] & bitboards[color + "K"])
+                | (PAWN_ATTACKS[enemy][sq] & bitboards[color + "p"])
+                | (bishopAttacks(sq, occupied) & (bitboards[color + "B"] | queens))
+                | (rookAttacks(sq, occupied) & (bitboards[color + "R"] | queens)))
+
+    def squareUnderAttack(self, row, col):
+        enemy_color = "b" if self.white_to_move else "w"
+        occupied = self.occupied["w"] | self.occupied["b"]
+        return self.attackersTo(row * 8 + col, occupied, enemy_color) != 0
+
+    def inCheck(self):
+        ally_color = "w" if self.white_to_move else "b"
+        king_sq = self.bitboards[ally_color + "K"].bit_length() - 1
+        return self.squareUnderAttack(king_sq // 8, king_sq % 8)
+
+    def getValidMoves(self):
+        """
+        All moves considering checks, generated from the bitboards.
+        """
+        moves = self._generateMoves()
+        if self.stats is not None:
+            self.stats.generate_calls += 1
+            self.stats.generated_moves += len(moves)
+        # kiểm tra tình trạng kết thúc trò chơi
+        if len(moves) == 0:
+            if self.in_check:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        else:
+            self.checkmate = False
+            self.stalemate = False
+        return moves
+
+    def getCaptureMoves(self):
+        """
+        Legal captures and promotions only, for the quiescence search.
+        Unlike getValidMoves it does not update checkmate/stalemate.
+        """
+        moves = self._generateMoves(quiets=False)
+        if self.stats is not None:
+            self.stats.generate_calls += 1
+            self.stats.generated_moves += len(moves)
+        return moves
+
+    def getQuietMoves(self):
+        """
+        Legal moves that are neither captures nor promotions (castling included).
+        """
+        moves = self._generateMoves(captures=False)
+        if self.stats is not None:
+            self.stats.generate_calls += 1
+            self.stats.generated_moves += len(moves)
+        return moves
+
+    def hasLegalMove(self):
+        """
+        True if the side to move has a legal move. Stops at the first piece that has one. Sets in_check.
+        """
+        return len(self._generateMoves(first_only=True)) != 0
+
+    def getMoveById(self, move_id):
+        """
+        The legal move with this moveID, or None. Only the moves of the piece on the start square are generated.
+        """
+        start_sq = move_id % 10000 // 1000 * 8 + move_id % 1000 // 100
+        for move in self._generateMoves(from_mask=1 << start_sq):
+            if move.moveID == move_id:
+                return move
+        return None
+
+    def _generateMoves(self, captures=True, quiets=True, from_mask=ALL_SQUARES, first_only=False):
+        """
+        Legal moves of the pieces on from_mask.
+        captures: include captures and promotions, quiets: include every other move.
+        first_only: return as soon as one piece has a legal move (the list is then incomplete).
+        """
+        moves = []
+        board = self.board
+        bitboards = self.bitboards
+        if self.white_to_move:
+            ally_color, enemy_color, pawn_step = "w", "b", -8
+        else:
+            ally_color, enemy_color, pawn_step = "b", "w", 8
+        allies = self.occupied[ally_color]
+        enemies = self.occupied[enemy_color]
+        occupied = allies | enemies
+        king_bit = bitboards[ally_color + "K"]
+        king_sq = king_bit.bit_length() - 1
+        Move = ChessEngine.Move
+
+        checkers = self.attackersTo(king_sq, occupied, enemy_color)
+        self.in_check = checkers != 0
+        if captures and quiets:
+            capture_mask = ALL_SQUARES
+        elif captures:
+            capture_mask = enemies
+        else:
+            capture_mask = ~occupied  # chỉ đi vào ô trống
+
+        # nước đi của vua: bỏ vua khỏi bàn để vua không tự che tia tấn công của quân địch
+        if king_bit & from_mask:
+            occupied_without_king = occupied ^ king_bit
+            king_row, king_col = divmod(king_sq, 8)
+            for end_sq in iterBits(KING_ATTACKS[king_sq] & ~allies & capture_mask):
+                if not self.attackersTo(end_sq, occupied_without_king, enemy_color):
+                    moves.append(Move((king_row, king_col), divmod(end_sq, 8), board))
+                    if first_only:
+                        return moves
+
+        if checkers & (checkers - 1) == 0:  # bị chiếu đôi thì chỉ vua được đi
+            if checkers:
+                # chỉ được ăn quân đang chiếu hoặc chặn giữa quân đó và vua
+                checker_sq = checkers.bit_length() - 1
+                target_mask = checkers | BETWEEN[king_sq][checker_sq]
+            else:
+                target_mask = ALL_SQUARES
+
+            # tìm các quân bị ghim: quân của mình nằm một mình giữa vua và một quân trượt của địch
+            pinned = 0
+            pin_lines = {}
+            enemy_queens = bitboards[enemy_color + "Q"]
+            snipers = ((rookAttacks(king_sq, enemies) & (bitboards[enemy_color + "R"] | enemy_queens))
+                       | (bishopAttacks(king_sq, enemies) & (bitboards[enemy_color + "B"] | enemy_queens)))
+            for sniper_sq in iterBits(snipers):
+                blockers = BETWEEN[king_sq][sniper_sq] & occupied
+                if blockers and blockers & (blockers - 1) == 0 and blockers & allies:
+                    pinned |= blockers
+                    # quân bị ghim chỉ được đi giữa vua và quân ghim, hoặc ăn quân ghim
+                    pin_lines[blockers.bit_length() - 1] = BETWEEN[king_sq][sniper_sq] | (1 << sniper_sq)
+
+            not_allies = ~allies
+            piece_attacks = ((ally_color + "N", None), (ally_color + "B", bishopAttacks),
+                             (ally_color + "R", rookAttacks), (ally_color + "Q", None))
+            for piece, attack_function in piece_attacks:
+                for start_sq in iterBits(bitboards[piece] & from_mask):
+                    if piece[1] == "N":
+                        if pinned >> start_sq & 1:  # mã bị ghim không đi được
+                            continue
+                        targets = KNIGHT_ATTACKS[start_sq]
+                    elif attack_function is None:  # hậu
+                        targets = rookAttacks(start_sq, occupied) | bishopAttacks(start_sq, occupied)
+                    else:
+                        targets = attack_function(start_sq, occupied)
+                    targets &= not_allies & target_mask & capture_mask
+                    if pinned >> start_sq & 1:
+                        targets &= pin_lines[start_sq]
+                    start_square = divmod(start_sq, 8)
+                    for end_sq in iterBits(targets):
+                        moves.append(Move(start_square, divmod(end_sq, 8), board))
+                    if first_only and moves:
+                        return moves
+
+            self._getPawnMoves(moves, ally_color, enemy_color, pawn_step, king_sq, occupied, enemies,
+                               target_mask, pinned, pin_lines, captures, quiets, from_mask)
+
+            if not checkers and quiets and king_bit & from_mask:
+                self._getCastleMoves(moves, ally_color, enemy_color, king_sq, occupied)
+        return moves
+
+    def _getPawnMoves(self, moves, ally_color, enemy_color, pawn_step, king_sq, occupied, enemies,
+                      target_mask, pinned, pin_lines, captures=True, quiets=True, from_mask=ALL_SQUARES):
+        board = self.board
+        Move = ChessEngine.Move
+        start_row = 6 if ally_color == "w" else 1
+        pawn_attacks = PAWN_ATTACKS[ally_color]
+        enpassant_bit = 0
+        if self.enpassant_possible != ():
+            enpassant_sq = self.enpassant_possible[0] * 8 + self.enpassant_possible[1]
+            enpassant_bit = 1 << enpassant_sq
+        for start_sq in iterBits(self.bitboards[ally_color + "p"] & from_mask):
+            allowed = target_mask
+            if pinned >> start_sq & 1:
+                allowed &= pin_lines[start_sq]
+            start_square = divmod(start_sq, 8)
+            # đi thẳng 1 ô, 2 ô từ hàng xuất phát
+            one_step = start_sq + pawn_step
+            if not occupied >> one_step & 1:
+                # đi thẳng tới hàng cuối là nước phong cấp, được tính cùng nhóm với nước ăn quân
+                if allowed >> one_step & 1 and (captures if one_step < 8 or one_step >= 56 else quiets):
+                    ChessEngine.appendPawnMoves(moves, start_square, divmod(one_step, 8), board)
+                two_step = one_step + pawn_step
+                if quiets and start_square[0] == start_row and not occupied >> two_step & 1 and allowed >> two_step & 1:
+                    moves.append(Move(start_square, divmod(two_step, 8), board))
+            # ăn quân
+            if not captures:
+                continue
+            attacks = pawn_attacks[start_sq]
+            for end_sq in iterBits(attacks & enemies & allowed):
+                ChessEngine.appendPawnMoves(moves, start_square, divmod(end_sq, 8), board)
+            if attacks & enpassant_bit:
+                # thử bắt tốt qua đường trên bitboard rồi kiểm tra vua có bị chiếu không
+                captured_sq = enpassant_sq - pawn_step
+                removed = (1 << start_sq) | (1 << captured_sq)
+                occupied_after = (occupied ^ removed) | (1 << enpassant_sq)
+                if not self.attackersTo(king_sq, occupied_after, enemy_color) & ~(1 << captured_sq):
+                    moves.append(Move(start_square, divmod(enpassant_sq, 8), board, is_enpassant_move=True))
+
+    def _getCastleMoves(self, moves, ally_color, enemy_color, king_sq, occupied):
+        rights = self.current_castling_rights
+        if ally_color == "w":
+            kingside, queenside = rights.wks, rights.wqs
+        else:
+            kingside, queenside = rights.bks, rights.bqs
+        king_square = divmod(king_sq, 8)
+        if kingside and not occupied & ((1 << (king_sq + 1)) | (1 << (king_sq + 2))):
+            if (not self.attackersTo(king_sq + 1, occupied, enemy_color)
+                    and not self.attackersTo(king_sq + 2, occupied, enemy_color)):
+                moves.append(ChessEngine.Move(king_square, divmod(king_sq + 2, 8), self.board, is_castle_move=True))
+        if queenside and not occupied & ((1 << (king_sq - 1)) | (1 << (king_sq - 2)) | (1 << (king_sq - 3))):
+            if (not self.attackersTo(king_sq - 1, occupied, enemy_color)
+                    and not self.attackersTo(king_sq - 2, occupied, enemy_color)):
+                moves.append(ChessEngine.Move(king_square, divmod(king_sq - 2, 8), self.board, is_castle_move=True))
@@ -0,0 +1,150 @@
+"""
+Opening book.
+The book file is a sorted array of fixed-size records (zobrist key, move id, weight), read through
+mmap with a binary search, so opening it costs almost nothing and only the touched pages are loaded.
+Keys are GameState.zobrist_key values, so a book must be rebuilt if the Zobrist keys change.
+
+    python ChessBook.py build games.pgn [more.pgn ...] -o book.bin --max-ply 20
+    python ChessBook.py probe --moves "e2e4 e7e5"
+"""
+import argparse
+import mmap
+import random
+import struct
+
+import ChessBitboard
+import ChessPGN
+
+BOOK_MAGIC = b"CHESSBK1"#8 byte đầu file, đổi khi định dạng file thay đổi
+HEADER = struct.Struct(">8sI")#magic, số bản ghi
+ENTRY = struct.Struct(">QHH")#zobrist key, moveID, trọng số (số ván đã đi nước đó)
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    """
+    Read-only view of a book file. getMoves(key) returns [(move_id, weight), ...] for a position.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != BOOK_MAGIC:
+            self.close()
+            raise ValueError("%s is not an opening book file" % path)
+        if HEADER.size + self.count * ENTRY.size > len(self.data):
+            self.close()
+            raise ValueError("%s is truncated" % path)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def _keyAt(self, index):
+        return ENTRY.unpack_from(self.data, HEADER.size + index * ENTRY.size)[0]
+
+    def getMoves(self, key):
+        """
+        All book moves of the position with this zobrist key, heaviest first.
+        """
+        #tìm nhị phân bản ghi đầu tiên có key >= key cần tìm
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._keyAt(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        offset = HEADER.size + low * ENTRY.size
+        for _ in range(low, self.count):
+            entry_key, move_id, weight = ENTRY.unpack_from(self.data, offset)
+            if entry_key != key:
+                break
+            moves.append((move_id, weight))
+            offset += ENTRY.size
+        return moves
+
+    def chooseMove(self, game_state, valid_moves):
+        """
+        Pick one of the legal book moves at random, in proportion to its weight. None if out of book.
+        """
+        candidates = []
+        weights = []
+        for move_id, weight in self.getMoves(game_state.zobrist_key):
+            for move in valid_moves:#bỏ qua nước không hợp lệ (trùng key của thế cờ khác)
+                if move.moveID == move_id:
+                    candidates.append(move)
+                    weights.append(weight)
+                    break
+        if not candidates:
+            return None
+        return random.choices(candidates, weights)[0]
+
+
+def writeBook(path, counts):
+    """
+    Write a book file from {(key, move_id): weight}.
+    """
+    entries = sorted(counts.items(), key=lambda item: (item[0][0], -item[1], item[0][1]))
+    with open(path, "wb") as book_file:
+        book_file.write(HEADER.pack(BOOK_MAGIC, len(entries)))
+        for (key, move_id), weight in entries:
+            book_file.write(ENTRY.pack(key, move_id, min(weight, MAX_WEIGHT)))
+
+
+def buildBook(pgn_paths, max_ply=20, min_count=1):
+    """
+    Count how often each move was played in each position of the first max_ply plies.
+    Returns {(key, move_id): count} for the moves played at least min_count times.
+    """
+    counts = {}
+    games = 0
+    for path in pgn_paths:
+        for headers, sans in ChessPGN.readGames(path):
+            if "FEN" in headers:#ván không bắt đầu từ thế cờ ban đầu
+                continue
+            try:
+                for game_state, move in ChessPGN.iterPositions(headers, sans[:max_ply]):
+                    entry = (game_state.zobrist_key, move.moveID)
+                    counts[entry] = counts.get(entry, 0) + 1
+            except ValueError:#nước đi không đọc được: bỏ phần còn lại của ván
+                pass
+            games += 1
+    print("games=%d positions=%d moves=%d" % (games, len({key for key, move_id in counts}), len(counts)))
+    return {entry: count for entry, count in counts.items() if count >= min_count}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query an opening book.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile PGN files into a book")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("-o", "--output", default="book.bin")
+    build.add_argument("--max-ply", type=int, default=20, help="only use this many plies of every game")
+    build.add_argument("--min-count", type=int, default=1, help="drop moves played fewer times than this")
+    probe = commands.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("--book", default="book.bin")
+    probe.add_argument("--fen")
+    probe.add_argument("--moves", default="", help="coordinate moves from the start, e.g. \"e2e4 e7e5\"")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        writeBook(args.output, buildBook(args.pgn, args.max_ply, args.min_count))
+        return
+    game_state = ChessBitboard.BitboardGameState(args.fen)
+    for text in args.moves.split():
+        move = next((move for move in game_state.getValidMoves() if move.getCoordinateNotation() == text), None)
+        if move is None:
+            raise SystemExit("illegal move " + text)
+        game_state.makeMove(move)
+    book = OpeningBook(args.book)
+    for move_id, weight in book.getMoves(game_state.zobrist_key):
+        move = game_state.getMoveById(move_id)
+        print("%s %d" % (move.getCoordinateNotation() if move is not None else move_id, weight))
+    book.close()
+
+
+if __name__ == "__main__":
+    main()
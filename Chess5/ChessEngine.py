@@ -3,15 +3,52 @@ Storing all the information about the current state of chess game.
 Determining valid moves at current state.
 It will keep move log.
 """
+import random
+
+import ChessWeights
+
+# Khóa Zobrist: mỗi (quân, ô) có một số ngẫu nhiên 64 bit, hash của thế cờ là XOR các khóa.
+# Dùng seed cố định để hash giống nhau giữa các lần chạy và giữa các tiến trình.
+_zobrist_random = random.Random(20240601)
+ZOBRIST_PIECES = {piece: [_zobrist_random.getrandbits(64) for _ in range(64)]
+                  for piece in ("wp", "wN", "wB", "wR", "wQ", "wK", "bp", "bN", "bB", "bR", "bQ", "bK")}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = [_zobrist_random.getrandbits(64) for _ in range(16)]
+ZOBRIST_ENPASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)]
+
+
+def buildPieceSquareValues(weights):
+    """
+    Material + piece-square value of every piece on every square (index row * 8 + col),
+    in centipawns, positive for white and negative for black.
+    Integers keep the incremental score exact: adding and removing values never drifts.
+    """
+    values = {}
+    for piece in ZOBRIST_PIECES:
+        sign = 1 if piece[0] == "w" else -1
+        position_scores = weights.piece_position_scores.get(piece)#vua không có bảng vị trí
+        values[piece] = [sign * round(100 * (weights.piece_score[piece[1]] +
+                                             (position_scores[row][col] if position_scores else 0)))
+                         for row in range(8) for col in range(8)]
+    return values
+
+
+PIECE_SQUARE_VALUES = buildPieceSquareValues(ChessWeights)
+RAY_DIRECTIONS = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))#4 hướng xe rồi 4 hướng tượng
+KNIGHT_OFFSETS = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+PROMOTION_PIECES = ("Q", "R", "B", "N")#hậu đứng đầu để nước phong hậu được thử trước
+DEBUG_INCREMENTAL_EVAL = False#True: so sánh điểm cập nhật từng nước với điểm tính lại toàn bộ bàn cờ
 
 
 class GameState:
-    def __init__(self):
+    def __init__(self, fen=None):
         """
         Board is an 8x8 2d list, each element in list has 2 characters.
         The first character represents the color of the piece: 'b' or 'w'.
         The second character represents the type of the piece: 'R', 'N', 'B', 'Q', 'K' or 'p'.
         "--" represents an empty space with no piece.
+        If fen is given the game starts from that position instead of the initial one.
         """
         self.board = [
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
@@ -38,12 +75,159 @@ class GameState:
         self.current_castling_rights = CastleRights(True, True, True, True)#quyền đổi xe và vua
         self.castle_rights_log = [CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                self.current_castling_rights.wqs, self.current_castling_rights.bqs)]
+        self.zobrist_key = self.computeZobristKey()#hash của thế cờ hiện tại
+        self.zobrist_key_log = []
+        self.board_score = self.computeBoardScore()#điểm vật chất + vị trí (centipawn), dương là trắng lợi
+        self.board_score_log = []
+        self.piece_count = 32#số quân trên bàn cờ, để biết khi nào tra bảng tàn cuộc
+        self.start_halfmove_clock = 0#2 trường cuối của FEN lúc bắt đầu, getFEN tính tiếp từ move_log
+        self.start_ply = 0
+        self.stats = None#ChessAI.SearchStats trong lúc tìm kiếm có thu thập thống kê
+        if fen is not None:
+            self.loadFEN(fen)
+
+    def loadFEN(self, fen):
+        """
+        Set up the position described by a FEN string and clear the move log.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError("FEN needs at least 4 fields: " + fen)
+        board = []
+        for rank in fields[0].split("/"):
+            row = []
+            for char in rank:
+                if char.isdigit():#số ô trống liên tiếp
+                    row.extend(["--"] * int(char))
+                elif char.upper() in "PNBRQK":
+                    row.append(("w" if char.isupper() else "b") + (char.upper() if char.upper() != "P" else "p"))
+                else:
+                    raise ValueError("bad piece %r in FEN: %s" % (char, fen))
+            if len(row) != 8:
+                raise ValueError("bad rank %r in FEN: %s" % (rank, fen))
+            board.append(row)
+        if len(board) != 8:
+            raise ValueError("FEN must have 8 ranks: " + fen)
+        self.board = board
+        for row in range(8):
+            for col in range(8):
+                if board[row][col] == "wK":
+                    self.white_king_location = (row, col)
+                elif board[row][col] == "bK":
+                    self.black_king_location = (row, col)
+        self.white_to_move = fields[1] == "w"
+        castling = fields[2]
+        self.current_castling_rights = CastleRights("K" in castling, "k" in castling, "Q" in castling, "q" in castling)
+        self.castle_rights_log = [CastleRights("K" in castling, "k" in castling, "Q" in castling, "q" in castling)]
+        if fields[3] != "-":
+            self.enpassant_possible = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+        else:
+            self.enpassant_possible = ()
+        self.enpassant_possible_log = [self.enpassant_possible]
+        self.move_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.in_check = False
+        self.pins = []
+        self.checks = []
+        self.zobrist_key = self.computeZobristKey()
+        self.zobrist_key_log = []
+        self.board_score = self.computeBoardScore()
+        self.board_score_log = []
+        self.piece_count = sum(piece != "--" for rank in board for piece in rank)
+        self.start_halfmove_clock = int(fields[4]) if len(fields) > 4 else 0
+        fullmove_number = int(fields[5]) if len(fields) > 5 else 1
+        self.start_ply = 2 * (fullmove_number - 1) + (0 if self.white_to_move else 1)
+
+    def getFEN(self):
+        """
+        FEN string of the current position (the inverse of loadFEN).
+        """
+        ranks = []
+        for row in self.board:
+            rank = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1].upper() if piece[0] == "w" else piece[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        rights = self.current_castling_rights
+        castling = ("K" if rights.wks else "") + ("Q" if rights.wqs else "") + \
+                   ("k" if rights.bks else "") + ("q" if rights.bqs else "")
+        if self.enpassant_possible != ():
+            enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]]
+        else:
+            enpassant = "-"
+        #đồng hồ 50 nước: số ply từ lần ăn quân hoặc đi tốt gần nhất
+        halfmove_clock = 0
+        for move in reversed(self.move_log):
+            if move.is_capture or move.piece_moved[1] == "p":
+                break
+            halfmove_clock += 1
+        else:
+            halfmove_clock += self.start_halfmove_clock
+        fullmove_number = (self.start_ply + len(self.move_log)) // 2 + 1
+        return "%s %s %s %s %d %d" % ("/".join(ranks), "w" if self.white_to_move else "b", castling or "-",
+                                      enpassant, halfmove_clock, fullmove_number)
+
+    def computeBoardScore(self):
+        """
+        Material + piece-square score of the whole board in centipawns.
+        makeMove/undoMove keep self.board_score up to date incrementally.
+        """
+        score = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    score += PIECE_SQUARE_VALUES[piece][row * 8 + col]
+        return score
+
+    def checkBoardScore(self):
+        """
+        Debug check: the incremental score must equal a full recomputation.
+        """
+        full_score = self.computeBoardScore()
+        if self.board_score != full_score:
+            raise AssertionError("incremental board score %d != full board score %d after %s" %
+                                 (self.board_score, full_score, self.move_log[-1] if self.move_log else "start"))
+
+    def computeZobristKey(self):
+        """
+        Compute the Zobrist hash of the current position from scratch.
+        makeMove/undoMove keep self.zobrist_key up to date incrementally.
+        """
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][row * 8 + col]
+        if not self.white_to_move:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.current_castling_rights.zobristIndex()]
+        if self.enpassant_possible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_possible[1]]
+        return key
 
     def makeMove(self, move):
         """
         Takes a Move as a parameter and executes it.
         (this will not work for castling, pawn promotion and en-passant)
         """
+        #lưu lại hash và trạng thái cũ để cập nhật hash theo nước đi
+        self.zobrist_key_log.append(self.zobrist_key)
+        if self.stats is not None:
+            self.stats.make_moves += 1
+        previous_enpassant = self.enpassant_possible
+        previous_castling_index = self.current_castling_rights.zobristIndex()
         #xóa quân cờ vị trí ban đầu và cập nhật vào vị trí đích
         self.board[move.start_row][move.start_col] = "--"
         self.board[move.end_row][move.end_col] = move.piece_moved
@@ -58,11 +242,7 @@ class GameState:
 
         # xử lí trường hợp khi quân tốt xuống cuối bàn cờ
         if move.is_pawn_promotion:
-            # if not is_AI:
-            #    promoted_piece = input("Promote to Q, R, B, or N:") #take this to UI later
-            #    self.board[move.end_row][move.end_col] = move.piece_moved[0] + promoted_piece
-            # else:
-            self.board[move.end_row][move.end_col] = move.piece_moved[0] + "Q"
+            self.board[move.end_row][move.end_col] = move.piece_moved[0] + move.promotion_piece
 
         # Nước đi enpassant
         if move.is_enpassant_move:
@@ -92,14 +272,55 @@ class GameState:
         self.castle_rights_log.append(CastleRights(self.current_castling_rights.wks, self.current_castling_rights.bks,
                                                    self.current_castling_rights.wqs, self.current_castling_rights.bqs))
 
+        # cập nhật hash: chỉ XOR những gì nước đi thay đổi
+        key = self.zobrist_key ^ ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_PIECES[move.piece_moved][move.start_row * 8 + move.start_col]
+        key ^= ZOBRIST_PIECES[self.board[move.end_row][move.end_col]][move.end_row * 8 + move.end_col]
+        if move.piece_captured != "--":
+            self.piece_count -= 1
+            captured_row = move.start_row if move.is_enpassant_move else move.end_row
+            key ^= ZOBRIST_PIECES[move.piece_captured][captured_row * 8 + move.end_col]
+        if move.is_castle_move:
+            rook = move.piece_moved[0] + "R"
+            if move.end_col - move.start_col == 2:
+                rook_from, rook_to = move.end_col + 1, move.end_col - 1
+            else:
+                rook_from, rook_to = move.end_col - 2, move.end_col + 1
+            key ^= ZOBRIST_PIECES[rook][move.end_row * 8 + rook_from] ^ ZOBRIST_PIECES[rook][move.end_row * 8 + rook_to]
+        if previous_enpassant != ():
+            key ^= ZOBRIST_ENPASSANT[previous_enpassant[1]]
+        if self.enpassant_possible != ():
+            key ^= ZOBRIST_ENPASSANT[self.enpassant_possible[1]]
+        key ^= ZOBRIST_CASTLING[previous_castling_index]
+        key ^= ZOBRIST_CASTLING[self.current_castling_rights.zobristIndex()]
+        self.zobrist_key = key
+
+        # cập nhật điểm bàn cờ: trừ giá trị quân ở ô cũ, cộng giá trị ở ô mới (kể cả phong cấp, enpassant, xe khi nhập thành)
+        self.board_score_log.append(self.board_score)
+        score = self.board_score
+        score -= PIECE_SQUARE_VALUES[move.piece_moved][move.start_row * 8 + move.start_col]
+        score += PIECE_SQUARE_VALUES[self.board[move.end_row][move.end_col]][move.end_row * 8 + move.end_col]
+        if move.piece_captured != "--":
+            score -= PIECE_SQUARE_VALUES[move.piece_captured][captured_row * 8 + move.end_col]
+        if move.is_castle_move:
+            score += (PIECE_SQUARE_VALUES[rook][move.end_row * 8 + rook_to] -
+                      PIECE_SQUARE_VALUES[rook][move.end_row * 8 + rook_from])
+        self.board_score = score
+        if DEBUG_INCREMENTAL_EVAL:
+            self.checkBoardScore()
+
     def undoMove(self):
         """
         Undo the last move
         """
         if len(self.move_log) != 0:  # kiểm tra xem có nước đi undo ko
             move = self.move_log.pop()#lấy nước đi cuối cùng
+            self.zobrist_key = self.zobrist_key_log.pop()#khôi phục hash trước nước đi
+            self.board_score = self.board_score_log.pop()#khôi phục điểm bàn cờ
             self.board[move.start_row][move.start_col] = move.piece_moved#đặt lại quân vừa đánh vào vị trí start
             self.board[move.end_row][move.end_col] = move.piece_captured#đặt lại quân bị ăn vào vị trí đích
+            if move.piece_captured != "--":
+                self.piece_count += 1
             self.white_to_move = not self.white_to_move  # đảo lượt chơi
             # cập nhật lại vị trí quân vua
             if move.piece_moved == "wK":
@@ -116,7 +337,10 @@ class GameState:
 
             # undo danh sách quyền castle
             self.castle_rights_log.pop()  # get rid of the new castle rights from the move we are undoing
-            self.current_castling_rights = self.castle_rights_log[-1]  # set the current castle rights to the last one in the list
+            # set the current castle rights to a copy of the last one in the list
+            # (updateCastleRights sửa trực tiếp object này nên không được dùng chung với log)
+            last_rights = self.castle_rights_log[-1]
+            self.current_castling_rights = CastleRights(last_rights.wks, last_rights.bks, last_rights.wqs, last_rights.bqs)
             # undo nước đi nhập thành
             if move.is_castle_move:
                 if move.end_col - move.start_col == 2:  # king-side
@@ -128,6 +352,8 @@ class GameState:
             #đánh dấu trò chơi chưa kết thúc
             self.checkmate = False
             self.stalemate = False
+            if DEBUG_INCREMENTAL_EVAL:
+                self.checkBoardScore()
 
 #cập nhật quyền thực hiện castle
     def updateCastleRights(self, move):
@@ -207,11 +433,15 @@ class GameState:
                         valid_squares.append(valid_square)
                         if valid_square[0] == check_row and valid_square[1] == check_col:  # once you get to piece and check
                             break
-                # loại bỏ nước đi mà không giúp hết bị chiếu
-                for i in range(len(moves) - 1, -1, -1):  # duyệt ds
-                    if moves[i].piece_moved[1] != "K":  # vua di chuyển hoặc được che để hết chiếu
-                        if not (moves[i].end_row, moves[i].end_col) in valid_squares: 
-                            moves.remove(moves[i])
+                # chỉ giữ nước đi giúp hết bị chiếu (lọc 1 lượt, không xóa từng phần tử khỏi list)
+                evasions = []
+                for move in moves:
+                    if move.piece_moved[1] == "K" or (move.end_row, move.end_col) in valid_squares:  # vua di chuyển hoặc được che để hết chiếu
+                        evasions.append(move)
+                    # bắt tốt qua đường vẫn hợp lệ nếu quân tốt bị bắt chính là quân đang chiếu
+                    elif move.is_enpassant_move and (move.start_row, move.end_col) == (check_row, check_col):
+                        evasions.append(move)
+                moves = evasions
             #nếu có 2 quân chiếu trở lên thì vua phải di chuyển
             else:  
                 self.getKingMoves(king_row, king_col, moves)
@@ -235,8 +465,273 @@ class GameState:
             self.stalemate = False
 
         self.current_castling_rights = temp_castle_rights
+        if self.stats is not None:
+            self.stats.generate_calls += 1
+            self.stats.generated_moves += len(moves)
+        return moves
+
+#lấy nước đi hợp lệ theo từng nhóm
+    def iterMoves(self, hash_move_id=None, order=None):
+        """
+        Yield the legal moves in stages: the hash move, then captures and promotions, then quiet moves.
+        A stage is only generated when the previous one is used up, so a beta cutoff skips the rest.
+        order(moves) may sort each stage; the position must be the same every time the generator resumes.
+        """
+        hash_move = None
+        if hash_move_id is not None:
+            hash_move = self.getMoveById(hash_move_id)
+            if hash_move is not None:
+                yield hash_move
+        for getStageMoves in (self.getCaptureMoves, self.getQuietMoves):
+            moves = getStageMoves()
+            if order is not None:
+                moves = order(moves)
+            for move in moves:
+                if hash_move is None or move.moveID != hash_move.moveID:
+                    yield move
+
+    def getQuietMoves(self):
+        """
+        Legal moves that are neither captures nor promotions (castling included).
+        """
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.in_check:#ít gặp: lọc từ danh sách nước thoát chiếu
+            return [move for move in self.getValidMoves() if not move.is_capture and not move.is_pawn_promotion]
+        moves = self.getAllPossibleMoves()#các hàm sinh nước đã tính quân bị ghim, vua không tự đi vào ô bị chiếu
+        king_row, king_col = self.white_king_location if self.white_to_move else self.black_king_location
+        self.getCastleMoves(king_row, king_col, moves)
+        moves = [move for move in moves if not move.is_capture and not move.is_pawn_promotion]
+        if self.stats is not None:
+            self.stats.generate_calls += 1
+            self.stats.generated_moves += len(moves)
         return moves
 
+    def getMoveById(self, move_id):
+        """
+        The legal move with this moveID, or None (e.g. a hash move from another position).
+        Only the moves of the piece on the start square are generated.
+        """
+        start_row = move_id % 10000 // 1000
+        start_col = move_id % 1000 // 100
+        piece = self.board[start_row][start_col]
+        if piece[0] != ("w" if self.white_to_move else "b"):
+            return None
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        moves = []
+        self.moveFunctions[piece[1]](start_row, start_col, moves)#đã tính quân bị ghim
+        if piece[1] == "K" and not self.in_check:
+            self.getCastleMoves(start_row, start_col, moves)
+        for move in moves:
+            if move.moveID == move_id:
+                #đang bị chiếu: nước của quân khác vua phải chặn hoặc ăn quân chiếu
+                if self.in_check and piece[1] != "K" and not self.leavesKingSafe(move):
+                    return None
+                return move
+        return None
+
+#lấy các nước ăn quân hợp lệ
+    def getCaptureMoves(self):
+        """
+        Legal captures and promotions only, for the quiescence search.
+        Unlike getValidMoves it does not update checkmate/stalemate.
+        """
+        board = self.board
+        if self.white_to_move:
+            ally_color, enemy_color, move_amount = "w", "b", -1
+        else:
+            ally_color, enemy_color, move_amount = "b", "w", 1
+        moves = []
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece[0] != ally_color:
+                    continue
+                piece_type = piece[1]
+                if piece_type == "p":
+                    end_row = row + move_amount
+                    if (end_row == 0 or end_row == 7) and board[end_row][col] == "--":#đi thẳng phong cấp
+                        appendPawnMoves(moves, (row, col), (end_row, col), board)
+                    for end_col in (col - 1, col + 1):
+                        if 0 <= end_col <= 7:
+                            if board[end_row][end_col][0] == enemy_color:
+                                appendPawnMoves(moves, (row, col), (end_row, end_col), board)
+                            elif (end_row, end_col) == self.enpassant_possible:
+                                moves.append(Move((row, col), (end_row, end_col), board, is_enpassant_move=True))
+                elif piece_type == "N" or piece_type == "K":
+                    offsets = KNIGHT_OFFSETS if piece_type == "N" else RAY_DIRECTIONS
+                    for d_row, d_col in offsets:
+                        end_row = row + d_row
+                        end_col = col + d_col
+                        if 0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col][0] == enemy_color:
+                            moves.append(Move((row, col), (end_row, end_col), board))
+                else:
+                    if piece_type == "R":
+                        directions = RAY_DIRECTIONS[:4]
+                    elif piece_type == "B":
+                        directions = RAY_DIRECTIONS[4:]
+                    else:
+                        directions = RAY_DIRECTIONS
+                    for d_row, d_col in directions:
+                        end_row = row + d_row
+                        end_col = col + d_col
+                        while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                            end_piece = board[end_row][end_col]
+                            if end_piece != "--":
+                                if end_piece[0] == enemy_color:
+                                    moves.append(Move((row, col), (end_row, end_col), board))
+                                break
+                            end_row += d_row
+                            end_col += d_col
+        #chỉ giữ lại các nước không để vua mình bị chiếu; khi không bị chiếu chỉ cần thử nước của vua,
+        #quân bị ghim và bắt tốt qua đường, các nước còn lại luôn hợp lệ
+        in_check, pins, checks = self.checkForPinsAndChecks()
+        if in_check:
+            moves = [move for move in moves if self.leavesKingSafe(move)]
+        else:
+            unsafe_squares = {(pin[0], pin[1]) for pin in pins}
+            unsafe_squares.add(self.white_king_location if self.white_to_move else self.black_king_location)
+            moves = [move for move in moves if ((move.start_row, move.start_col) not in unsafe_squares and
+                                                not move.is_enpassant_move) or self.leavesKingSafe(move)]
+        if self.stats is not None:
+            self.stats.generate_calls += 1
+            self.stats.generated_moves += len(moves)
+        return moves
+
+    def leavesKingSafe(self, move):
+        """
+        Play the move and check that it does not leave the mover's king in check.
+        """
+        if self.stats is not None:#nước đi thử để kiểm tra hợp lệ không tính là nước đi của tìm kiếm
+            self.stats.make_moves -= 1
+        self.makeMove(move)
+        self.white_to_move = not self.white_to_move#inCheck kiểm tra vua của bên vừa đi
+        safe = not self.inCheck()
+        self.white_to_move = not self.white_to_move
+        self.undoMove()
+        return safe
+
+#kiểm tra còn nước đi hợp lệ không
+    def hasLegalMove(self):
+        """
+        True if the side to move has a legal move. Stops at the first one found instead of
+        building the whole list like getValidMoves. Sets in_check.
+        """
+        self.in_check, self.pins, self.checks = self.checkForPinsAndChecks()
+        if self.white_to_move:
+            ally_color = "w"
+            king_row, king_col = self.white_king_location
+        else:
+            ally_color = "b"
+            king_row, king_col = self.black_king_location
+        moves = []
+        self.getKingMoves(king_row, king_col, moves)
+        if moves:
+            return True
+        if len(self.checks) > 1:#chiếu đôi thì chỉ vua được đi
+            return False
+        #nhập thành không cần xét: nhập thành được thì vua cũng đi được 1 ô sang bên
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece[0] == ally_color and piece[1] != "K":
+                    moves = []
+                    self.moveFunctions[piece[1]](row, col, moves)#đã tính quân bị ghim
+                    for move in moves:
+                        if not self.in_check or self.leavesKingSafe(move):
+                            return True
+        return False
+
+    def updateGameOver(self):
+        """
+        Set checkmate/stalemate for the current position with hasLegalMove and return True if the game is over.
+        """
+        if self.hasLegalMove():
+            self.checkmate = False
+            self.stalemate = False
+        else:
+            self.checkmate = self.in_check
+            self.stalemate = not self.in_check
+        return self.checkmate or self.stalemate
+
+    def getSAN(self, move, valid_moves=None):
+        """
+        Standard algebraic notation of a legal move in the current position, e.g. "Nbd7", "exd6", "e8=Q+", "O-O-O#".
+        valid_moves (the legal moves of this position) can be passed to avoid generating them again.
+        """
+        if move.is_castle_move:
+            san = "O-O" if move.end_col == 6 else "O-O-O"
+        else:
+            end_square = move.getRankFile(move.end_row, move.end_col)
+            piece_type = move.piece_moved[1]
+            if piece_type == "p":
+                san = (Move.cols_to_files[move.start_col] + "x" if move.is_capture else "") + end_square
+                if move.is_pawn_promotion:
+                    san += "=" + move.promotion_piece
+            else:
+                #phân biệt các quân cùng loại cùng đi tới một ô: thêm cột, hàng hoặc cả hai của ô xuất phát
+                if valid_moves is None:
+                    valid_moves = self.getValidMoves()
+                others = [other for other in valid_moves if other.piece_moved == move.piece_moved and
+                          other.end_row == move.end_row and other.end_col == move.end_col and
+                          (other.start_row, other.start_col) != (move.start_row, move.start_col)]
+                disambiguation = ""
+                if others:
+                    if all(other.start_col != move.start_col for other in others):
+                        disambiguation = Move.cols_to_files[move.start_col]
+                    elif all(other.start_row != move.start_row for other in others):
+                        disambiguation = Move.rows_to_ranks[move.start_row]
+                    else:
+                        disambiguation = move.getRankFile(move.start_row, move.start_col)
+                san = piece_type + disambiguation + ("x" if move.is_capture else "") + end_square
+        #chiếu / chiếu hết: đi thử rồi trả lại trạng thái của thế cờ hiện tại
+        saved_state = (self.checkmate, self.stalemate, self.in_check, self.pins, self.checks)
+        self.makeMove(move)
+        if self.inCheck():
+            san += "+" if self.hasLegalMove() else "#"
+        self.undoMove()
+        self.checkmate, self.stalemate, self.in_check, self.pins, self.checks = saved_state
+        return san
+
+    def parseSAN(self, san, valid_moves=None):
+        """
+        The legal move written as san in the current position. Also accepts the usual variants
+        ("0-0", "e8Q", "exd6 e.p.", missing or extra "+", "#", "!", "?"). Raises ValueError if no legal move matches.
+        """
+        text = san.replace("e.p.", "").replace(" ", "").rstrip("+#!?").replace("0", "O")
+        if valid_moves is None:
+            valid_moves = self.getValidMoves()
+        if text in ("O-O", "O-O-O"):
+            for move in valid_moves:
+                if move.is_castle_move and (move.end_col == 6) == (text == "O-O"):
+                    return move
+            raise ValueError("illegal move %s in %s" % (san, self.getFEN()))
+        promotion = None
+        if text[-1:] in ("Q", "R", "B", "N") and len(text) > 2 and text[-2] in "=18":
+            promotion = text[-1]
+            text = text[:-1].rstrip("=")
+        piece_type = text[0] if text[:1] in ("K", "Q", "R", "B", "N") else "p"
+        squares = (text[1:] if piece_type != "p" else text).replace("x", "").replace("-", "")
+        if len(squares) < 2 or squares[-2] not in Move.files_to_cols or squares[-1] not in Move.ranks_to_rows:
+            raise ValueError("bad move %r" % san)
+        end_row = Move.ranks_to_rows[squares[-1]]
+        end_col = Move.files_to_cols[squares[-2]]
+        disambiguation = squares[:-2]
+        found = None
+        for move in valid_moves:
+            if move.piece_moved[1] != piece_type or move.end_row != end_row or move.end_col != end_col:
+                continue
+            if move.is_pawn_promotion and move.promotion_piece != (promotion or "Q"):
+                continue
+            start_square = move.getRankFile(move.start_row, move.start_col)
+            if any(char not in start_square for char in disambiguation):
+                continue
+            if found is not None:
+                raise ValueError("ambiguous move %s in %s" % (san, self.getFEN()))
+            found = move
+        if found is None:
+            raise ValueError("illegal move %s in %s" % (san, self.getFEN()))
+        return found
+
 #kiểm tra chiếu
     def inCheck(self):
         """
@@ -250,14 +745,46 @@ class GameState:
 #kiểm tra 1 ô có bị tấn công hay không
     def squareUnderAttack(self, row, col):
         """
-        Determine if enemy can attack the square row col
+        Determine if enemy can attack the square row col.
+        Looks outward from the square along rook/bishop rays and knight, pawn and king offsets,
+        without generating the opponent's moves.
         """
-        self.white_to_move = not self.white_to_move  # switch to opponent's point of view
-        opponents_moves = self.getAllPossibleMoves()
-        self.white_to_move = not self.white_to_move
-        for move in opponents_moves:
-            if move.end_row == row and move.end_col == col:  # square is under attack
+        board = self.board
+        if self.white_to_move:
+            enemy_color = "b"
+            pawn_row = row - 1  # tốt đen tấn công chéo xuống nên đứng ở hàng trên
+        else:
+            enemy_color = "w"
+            pawn_row = row + 1
+        # tốt
+        if 0 <= pawn_row <= 7:
+            enemy_pawn = enemy_color + "p"
+            if (col - 1 >= 0 and board[pawn_row][col - 1] == enemy_pawn) or \
+                    (col + 1 <= 7 and board[pawn_row][col + 1] == enemy_pawn):
                 return True
+        # mã
+        enemy_knight = enemy_color + "N"
+        for d_row, d_col in KNIGHT_OFFSETS:
+            end_row = row + d_row
+            end_col = col + d_col
+            if 0 <= end_row <= 7 and 0 <= end_col <= 7 and board[end_row][end_col] == enemy_knight:
+                return True
+        # xe/hậu theo hàng dọc, hàng ngang; tượng/hậu theo đường chéo; vua ở ô liền kề
+        for j in range(8):
+            d_row, d_col = RAY_DIRECTIONS[j]
+            sliders = "RQ" if j < 4 else "BQ"
+            end_row = row + d_row
+            end_col = col + d_col
+            distance = 1
+            while 0 <= end_row <= 7 and 0 <= end_col <= 7:
+                piece = board[end_row][end_col]
+                if piece != "--":
+                    if piece[0] == enemy_color and (piece[1] in sliders or (distance == 1 and piece[1] == "K")):
+                        return True
+                    break  # quân đầu tiên gặp trên tia chặn các ô phía sau
+                end_row += d_row
+                end_col += d_col
+                distance += 1
         return False
 
 #lấy các nước đi hợp lệ
@@ -371,7 +898,7 @@ class GameState:
         #di chuyển tốt
         if self.board[row + move_amount][col] == "--":  # nếu ko bị chặn
             if not piece_pinned or pin_direction == (move_amount, 0):
-                moves.append(Move((row, col), (row + move_amount, col), self.board))#di chuyển theo lên trc 1 ô
+                appendPawnMoves(moves, (row, col), (row + move_amount, col), self.board)#di chuyển theo lên trc 1 ô
                 if row == start_row and self.board[row + 2 * move_amount][col] == "--":  # di chuyển 2 ô
                     moves.append(Move((row, col), (row + 2 * move_amount, col), self.board))
 
@@ -379,7 +906,7 @@ class GameState:
         if col - 1 >= 0:  # kiểm tra ăn quân bên trái
             if not piece_pinned or pin_direction == (move_amount, -1):#kiểm tra có bị chặn ko
                 if self.board[row + move_amount][col - 1][0] == enemy_color:#nếu có quân thì có thể ăn
-                    moves.append(Move((row, col), (row + move_amount, col - 1), self.board))
+                    appendPawnMoves(moves, (row, col), (row + move_amount, col - 1), self.board)
                 if (row + move_amount, col - 1) == self.enpassant_possible:#kiểm tra nước enpassant
                     attacking_piece = blocking_piece = False
                     if king_row == row:#nếu vua nằm cùng hàng 
@@ -398,15 +925,17 @@ class GameState:
                             square = self.board[row][i]
                             if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
                                 attacking_piece = True
-                            elif square != "--":
+                                break
+                            elif square != "--":#chỉ quân đầu tiên ngoài 2 quân tốt mới quan trọng
                                 blocking_piece = True
+                                break
                     if not attacking_piece or blocking_piece:#nếu không bị chặn hay bị chiếu, enpassant hợp lệ
                         moves.append(Move((row, col), (row + move_amount, col - 1), self.board, is_enpassant_move=True))
         #tương tự cho bên phải
         if col + 1 <= 7:  
             if not piece_pinned or pin_direction == (move_amount, +1):
                 if self.board[row + move_amount][col + 1][0] == enemy_color:
-                    moves.append(Move((row, col), (row + move_amount, col + 1), self.board))
+                    appendPawnMoves(moves, (row, col), (row + move_amount, col + 1), self.board)
                 if (row + move_amount, col + 1) == self.enpassant_possible:
                     attacking_piece = blocking_piece = False
                     if king_row == row:
@@ -425,8 +954,10 @@ class GameState:
                             square = self.board[row][i]
                             if square[0] == enemy_color and (square[1] == "R" or square[1] == "Q"):
                                 attacking_piece = True
+                                break
                             elif square != "--":
                                 blocking_piece = True
+                                break
                     if not attacking_piece or blocking_piece:
                         moves.append(Move((row, col), (row + move_amount, col + 1), self.board, is_enpassant_move=True))
 
@@ -508,7 +1039,8 @@ class GameState:
             if self.pins[i][0] == row and self.pins[i][1] == col:
                 piece_pinned = True
                 pin_direction = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
+                if self.board[row][col][1] != "Q":  # hậu còn đi theo hướng xe nên giữ lại thông tin pin cho getRookMoves
+                    self.pins.remove(self.pins[i])
                 break
         
         #di chuyển
@@ -594,6 +1126,22 @@ class GameState:
                 moves.append(Move((row, col), (row, col - 2), self.board, is_castle_move=True))
 
 
+# moveID = start_row * 1000 + start_col * 100 + end_row * 10 + end_col, tính sẵn để mọi Move dùng chung object int
+MOVE_IDS = [[[[start_row * 1000 + start_col * 100 + end_row * 10 + end_col for end_col in range(8)]
+              for end_row in range(8)] for start_col in range(8)] for start_row in range(8)]
+
+
+def appendPawnMoves(moves, start_square, end_square, board):
+    """
+    Add a pawn move, or one move per promotion piece when the pawn reaches the last rank.
+    """
+    if end_square[0] == 0 or end_square[0] == 7:
+        for piece in PROMOTION_PIECES:
+            moves.append(Move(start_square, end_square, board, promotion_piece=piece))
+    else:
+        moves.append(Move(start_square, end_square, board))
+
+
 class CastleRights:
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
@@ -601,6 +1149,12 @@ class CastleRights:
         self.wqs = wqs
         self.bqs = bqs
 
+    def zobristIndex(self):
+        """
+        Index (0-15) of these rights in ZOBRIST_CASTLING.
+        """
+        return self.wks | self.wqs << 1 | self.bks << 2 | self.bqs << 3
+
 
 class Move:
     # in chess, fields on the board are described by two symbols, one of them being number between 1-8 (which is corresponding to rows)
@@ -612,8 +1166,13 @@ class Move:
     files_to_cols = {"a": 0, "b": 1, "c": 2, "d": 3,
                      "e": 4, "f": 5, "g": 6, "h": 7}#chuyển từ chữ sang cột
     cols_to_files = {v: k for k, v in files_to_cols.items()}#ngược lại
+    promotion_codes = {"Q": 0, "R": 1, "B": 2, "N": 3}#phong hậu có mã 0 để moveID giống nước đi bấm chuột
+    # __slots__: không có __dict__ cho mỗi object, mỗi nước đi tốn ít bộ nhớ hơn và tạo nhanh hơn
+    __slots__ = ("start_row", "start_col", "end_row", "end_col", "piece_moved", "piece_captured",
+                 "is_pawn_promotion", "promotion_piece", "is_enpassant_move", "is_castle_move", "is_capture", "moveID")
 
-    def __init__(self, start_square, end_square, board, is_enpassant_move=False, is_castle_move=False):
+    def __init__(self, start_square, end_square, board, is_enpassant_move=False, is_castle_move=False,
+                 promotion_piece="Q"):
         #khởi tạo các biến
         self.start_row = start_square[0]
         self.start_col = start_square[1]
@@ -624,6 +1183,7 @@ class Move:
         # pawn promotion
         self.is_pawn_promotion = (self.piece_moved == "wp" and self.end_row == 0) or (
                 self.piece_moved == "bp" and self.end_row == 7)
+        self.promotion_piece = promotion_piece#quân được phong: 'Q', 'R', 'B' hoặc 'N'
         # en passant
         self.is_enpassant_move = is_enpassant_move
         if self.is_enpassant_move:
@@ -632,22 +1192,27 @@ class Move:
         self.is_castle_move = is_castle_move
 
         self.is_capture = self.piece_captured != "--"
-        self.moveID = self.start_row * 1000 + self.start_col * 100 + self.end_row * 10 + self.end_col#mã số xác định mỗi nước đi
+        self.moveID = MOVE_IDS[self.start_row][self.start_col][self.end_row][self.end_col]#mã số xác định mỗi nước đi
+        if self.is_pawn_promotion:
+            self.moveID += self.promotion_codes[promotion_piece] * 10000
 
     def __eq__(self, other):
         """
         Overriding the equals method.
         """
-        if isinstance(other, Move):
+        if other.__class__ is Move:
             return self.moveID == other.moveID
         return False
 
+    def __hash__(self):
+        return self.moveID
+
 #update khi 1 thao tác xảy ra
     def getChessNotation(self):
         if self.is_pawn_promotion:#kiểm tra phong tốt
-            return self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col) + "Q"
+            return self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col) + self.promotion_piece
         if self.is_castle_move:#kiểm tra nhập thành
-            if self.end_col == 1:
+            if self.end_col == 2:
                 return "0-0-0"
             else:
                 return "0-0"
@@ -656,7 +1221,14 @@ class Move:
                                                                                                 self.end_col) + " e.p."
         return self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col)
 
-        # TODO Disambiguating moves
+    def getCoordinateNotation(self):
+        """
+        Start and end square plus promotion piece, e.g. "e2e4", "e1g1" or "e7e8q".
+        """
+        notation = self.getRankFile(self.start_row, self.start_col) + self.getRankFile(self.end_row, self.end_col)
+        if self.is_pawn_promotion:
+            notation += self.promotion_piece.lower()
+        return notation
 
     def getRankFile(self, row, col):
         return self.cols_to_files[col] + self.rows_to_ranks[row]
@@ -672,7 +1244,7 @@ class Move:
             if self.is_capture:
                 return start_square + end_square
             else:
-                return end_square + "Q" if self.is_pawn_promotion else start_square + end_square
+                return end_square + self.promotion_piece if self.is_pawn_promotion else start_square + end_square
 
        
         return  start_square + end_square
\ No newline at end of file
@@ -4,9 +4,8 @@ Handling user input.
 Displaying current GameStatus object.
 """
 import pygame as p
-import ChessEngine, ChessAI
+import ChessEngine, ChessAI, ChessBitboard, ChessWorker
 import sys
-from multiprocessing import Process, Queue
 
 BOARD_WIDTH = BOARD_HEIGHT = 550#Kích thước của của bàn cờ
 MOVE_LOG_PANEL_WIDTH = 250#Hiển thị kích thước của bảng lịch sử di chuyển
@@ -15,6 +14,12 @@ DIMENSION = 8#số ô cho mỗi hàng, mỗi mỗi cột
 SQUARE_SIZE = BOARD_HEIGHT // DIMENSION#kích thước mỗi ô
 MAX_FPS = 15#số khung hình tối đa
 IMAGES = {}#Lưu trữ hình ảnh
+SURFACES = {}#bàn cờ vẽ sẵn và các lớp tô màu ô, tạo một lần trong loadSurfaces
+BOARD_COLORS = [p.Color("white"), p.Color("plum")]#màu ô trắng, ô đen
+HIGHLIGHT_COLORS = ("green", "blue", "yellow")#nước đi cuối, ô đang chọn, ô có thể đi tới
+USE_BITBOARD = True#dùng ChessBitboard.BitboardGameState thay cho ChessEngine.GameState
+AI_TIME_LIMIT = None#số giây tối đa cho mỗi nước đi của máy, None để tìm theo độ sâu cố định ChessAI.DEPTH
+PONDER = True#máy tìm trước nước trả lời dự đoán trong lúc người chơi suy nghĩ
 
 
 def loadImages():
@@ -26,7 +31,35 @@ def loadImages():
 
     #Tải ảnh xuống
     for piece in pieces:
-        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"), (SQUARE_SIZE, SQUARE_SIZE))
+        IMAGES[piece] = p.transform.scale(p.image.load("images/" + piece + ".png"),
+                                          (SQUARE_SIZE, SQUARE_SIZE)).convert_alpha()#đổi sẵn định dạng để blit nhanh
+
+
+def loadSurfaces():
+    """
+    Pre-render the checkerboard and the highlight overlays.
+    This will be called exactly once in the main, after the display mode is set.
+    """
+    board = p.Surface((DIMENSION * SQUARE_SIZE, DIMENSION * SQUARE_SIZE)).convert()
+    for row in range(DIMENSION):
+        for column in range(DIMENSION):
+            p.draw.rect(board, BOARD_COLORS[(row + column) % 2],
+                        p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+    SURFACES["board"] = board
+    for color in HIGHLIGHT_COLORS:
+        s = p.Surface((SQUARE_SIZE, SQUARE_SIZE)).convert()
+        s.set_alpha(100)
+        s.fill(p.Color(color))
+        SURFACES[color] = s
+
+
+def newGameState():
+    """
+    Create a game state with the selected board backend.
+    """
+    if USE_BITBOARD:
+        return ChessBitboard.BitboardGameState()
+    return ChessEngine.GameState()
 
 
 def main():
@@ -38,19 +71,27 @@ def main():
     screen = p.display.set_mode((BOARD_WIDTH + MOVE_LOG_PANEL_WIDTH, BOARD_HEIGHT))#Tạo cửa sổ với kích thước thiết lập
     clock = p.time.Clock()#kiểm soát tốc độ trò chơi
     screen.fill(p.Color("white"))#Đổ màu trắng lên toàn bộ của sổ
+    p.display.flip()#các khung hình sau chỉ cập nhật những vùng thay đổi
     p.display.set_caption("CHESS GAME")#Tên trò chơi
-    game_state = ChessEngine.GameState()#Khởi tạo đối tượng game state
+    game_state = newGameState()#Khởi tạo đối tượng game state
     valid_moves = game_state.getValidMoves()#danh sách nước đi hợp lệ
     move_made = False  # theo dõi nước đi thực hiện chưa
     animate = False  #xác định xem nước đi được thực hiện chưa
     loadImages()#Tải ảnh  
+    loadSurfaces()
+    drawn_squares = [None] * (DIMENSION * DIMENSION)#nội dung đang hiển thị của từng ô, None để vẽ lại
+    drawn_move_log = None#lịch sử nước đi đang hiển thị
     running = True#Theo dõi trò chơi có chạy ko
     square_selected = ()  #Lưu trữ tuple(hàng, cột) theo dõi ô cuối cùng người chơi đi
     player_clicks = []  #Theo dõi những lần người chơi nhấn chuột, lưu dưới dạng tuple(hàng,cột)
     game_over = False#Xác định xem trò chơi kết thúc chưa
     ai_thinking = False#xác định xem máy tính có đang suy nghĩ về nước đi ko
     move_undone = False#xác định nước đi có undo ko
-    move_finder_process = None#ban đầu, ko có tiến trình tìm nước đi của máy tính
+    search_pool = ChessWorker.SearchWorkerPool()#tiến trình tìm nước đi của máy tính, dùng lại cho mọi nước đi
+    game_id = search_pool.newGame()#worker giữ bản sao ván cờ, chỉ cần gửi từng nước đi
+    search_request = None#lần tìm kiếm đang chạy
+    ponder_request = None#lần tìm trước trong lượt của người chơi
+    ponder_move_id = None#nước đi dự đoán của người chơi mà ponder_request đang tìm
     move_log_font = p.font.SysFont("Arial", 18, False, False)#khởi tạo 1 font chữ để hiện thị thông tin lịch sử nước đi
     player_one = True  # xác định quân cờ người chơi có là trắng ko
     player_two = False  
@@ -61,6 +102,7 @@ def main():
         #vòng lặp xử lí tất cả các sự kiện
         for e in p.event.get():
             if e.type == p.QUIT:#nếu event là quit
+                search_pool.shutdown()
                 p.quit()
                 sys.exit()
             # nếu event là nhấn chuột
@@ -81,6 +123,7 @@ def main():
                         for i in range(len(valid_moves)):
                             if move == valid_moves[i]:#nếu hợp lệ
                                 game_state.makeMove(valid_moves[i])#thực thực hiện nước đi
+                                search_pool.pushMove(game_id, valid_moves[i])#đồng bộ với worker
                                 move_made = True#đánh dấu nước đi dc thực hiện
                                 animate = True#Đánh dấu cần thực hiện hiệu ứng di chuyển
                                 square_selected = ()  
@@ -91,102 +134,150 @@ def main():
             # nếu event là bàn phím
             elif e.type == p.KEYDOWN:
                 if e.key == p.K_z:  # hoàn tác nước đi nếu nhấn z
+                    if ai_thinking:#nếu máy tính đang suy nghĩ thì hủy lần tìm đó (worker vẫn chạy)
+                        search_pool.cancel(search_request)
+                        ai_thinking = False
+                    if ponder_request is not None:
+                        search_pool.cancel(ponder_request)
+                        ponder_request = None
                     game_state.undoMove()
+                    search_pool.popMove(game_id)
                     move_made = True
                     animate = False
                     game_over = False
-                    if ai_thinking:#nếu máy tính đang suy nghĩ thì hủy tiến trình đó
-                        move_finder_process.terminate()
-                        ai_thinking = False
                     move_undone = True
+                    drawn_squares = [None] * (DIMENSION * DIMENSION)#xóa dòng thông báo kết thúc
                 if e.key == p.K_r:  # thiết lập lại game nếu nhấn r
-                    game_state = ChessEngine.GameState()
+                    if ai_thinking:
+                        search_pool.cancel(search_request)
+                        ai_thinking = False
+                    if ponder_request is not None:
+                        search_pool.cancel(ponder_request)
+                        ponder_request = None
+                    game_state = newGameState()
+                    search_pool.setPosition(game_id, game_state.move_log)
                     valid_moves = game_state.getValidMoves()
                     square_selected = ()
                     player_clicks = []
                     move_made = False
                     animate = False
                     game_over = False
-                    if ai_thinking:
-                        move_finder_process.terminate()
-                        ai_thinking = False
                     move_undone = True
+                    drawn_squares = [None] * (DIMENSION * DIMENSION)
 
         # AI tìm kiếm nước đi
         if not game_over and not human_turn and not move_undone:#nếu game ko kết thúc và đến lượt của AI
             if not ai_thinking:
                 ai_thinking = True
-                return_queue = Queue()  # lưu tiến trình nước đi
-                move_finder_process = Process(target=ChessAI.findBestMove, args=(game_state, valid_moves, return_queue))# tạo 1 tiến trình tốt nhất để tìm nước đi tốt nhất cho máy tính
-                move_finder_process.start()
+                if ponder_request is not None and game_state.move_log[-1].moveID == ponder_move_id:
+                    search_request = ponder_request#đoán đúng: dùng kết quả tìm trước (có thể đã xong)
+                else:
+                    if ponder_request is not None:#đoán sai: bỏ lần tìm trước, bảng băm vẫn giữ lại
+                        search_pool.cancel(ponder_request)
+                    search_request = search_pool.startSearch(game_id, AI_TIME_LIMIT)# yêu cầu worker tìm nước đi tốt nhất cho máy tính
+                ponder_request = None
 
-            if not move_finder_process.is_alive():#kiểm tra xem tiến trình kết thúc chưa
-                ai_move = return_queue.get()#lấy nước đi
+            search_result = search_pool.poll(search_request)
+            if search_result is not None:#kiểm tra xem worker tìm xong chưa
+                move_id, search_info = search_result#lấy nước đi và thông tin tìm kiếm (độ sâu, số node)
+                if "error" in search_info:#worker không tìm được: đồng bộ lại ván cờ, nước này đi ngẫu nhiên
+                    print("AI search failed: " + search_info["error"], file=sys.stderr)
+                    search_pool.setPosition(game_id, game_state.move_log)
+                ai_move = ChessWorker.findMoveById(valid_moves, move_id)
                 if ai_move is None:#nếu ko có nước đi tốt thì lấy ngẫu nhiên
                     ai_move = ChessAI.findRandomMove(valid_moves)
                 game_state.makeMove(ai_move)#thực hiện nước đi
+                search_pool.pushMove(game_id, ai_move)
                 move_made = True
                 animate = True
                 ai_thinking = False
+                human_next = (game_state.white_to_move and player_one) or (not game_state.white_to_move and player_two)
+                if PONDER and human_next and search_info.get("ponder_move") is not None:
+                    ponder_move_id = search_info["ponder_move"]
+                    ponder_request = search_pool.startPonder(game_id, ponder_move_id, AI_TIME_LIMIT)
 
         #kiểm tra xem có nước đi được thực hiện và thực hiện hiệu ứng di chuyển
         if move_made:
             if animate:#thực hiện hiệu ứng di chuyển
                 animateMove(game_state.move_log[-1], screen, game_state.board, clock)
+                drawn_squares = [None] * (DIMENSION * DIMENSION)#hiệu ứng đã vẽ đè lên cả bàn cờ
             valid_moves = game_state.getValidMoves()#cập nhật ds nc đi hợp lệ mới
             move_made = False
             animate = False
             move_undone = False
 
-        drawGameState(screen, game_state, valid_moves, square_selected)#vẽ bàn cờ
+        dirty_rects = drawGameState(screen, game_state, valid_moves, square_selected, drawn_squares)#vẽ các ô thay đổi
 
-        #nếu game ko kết thúc thì vẽ lịch sử nước đi lên màn hình
-        if not game_over:
-            drawMoveLog(screen, game_state, move_log_font)
+        #nếu game ko kết thúc thì vẽ lịch sử nước đi lên màn hình khi có nước đi mới
+        move_log_key = (len(game_state.move_log), game_state.move_log[-1:])
+        if not game_over and move_log_key != drawn_move_log:
+            drawn_move_log = move_log_key
+            dirty_rects.append(drawMoveLog(screen, game_state, move_log_font))
 
-        #kiểm tra chiếu tướng
+        #kiểm tra chiếu tướng, dòng thông báo chỉ vẽ lại khi bàn cờ được vẽ lại
+        end_text = None
         if game_state.checkmate:
             game_over = True
             if game_state.white_to_move:#đen thắng
-                drawEndGameText(screen, "Black wins by checkmate")
+                end_text = "Black wins by checkmate"
             else:#trắng thắng
-                drawEndGameText(screen, "White wins by checkmate")
+                end_text = "White wins by checkmate"
         
         #kiểm tra do bị bế tắc(hòa cờ)
         elif game_state.stalemate:
             game_over = True
-            drawEndGameText(screen, "Stalemate")
+            end_text = "Stalemate"
+        if end_text is not None and dirty_rects:
+            drawEndGameText(screen, end_text)
+            dirty_rects.append(p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT))
 
         clock.tick(MAX_FPS)#điều chỉnh tốc độ khung hình
-        p.display.flip()#cập nhật thay đổi
+        if dirty_rects:
+            p.display.update(dirty_rects)#chỉ cập nhật những vùng thay đổi
 
 #Vex bàn cờ hiện tại
-def drawGameState(screen, game_state, valid_moves, square_selected):
-    drawBoard(screen)  #vẽ ô vuông
-    highlightSquares(screen, game_state, valid_moves, square_selected)#vẽ màu cho các nước đi 
-    drawPieces(screen, game_state.board)  # vẽ quân cờ
+def drawGameState(screen, game_state, valid_moves, square_selected, drawn_squares):
+    """
+    Redraw only the squares whose piece or highlight changed since the last frame.
+    drawn_squares holds what is on screen for each square (None forces a redraw) and is updated in place.
+    Returns the list of redrawn rects for p.display.update.
+    """
+    highlights = highlightSquares(game_state, valid_moves, square_selected)#màu tô của các ô
+    board = game_state.board
+    dirty_rects = []
+    for row in range(DIMENSION):
+        for column in range(DIMENSION):
+            square = (board[row][column], highlights.get((row, column)))#quân cờ và màu tô của ô
+            if drawn_squares[row * DIMENSION + column] != square:
+                drawn_squares[row * DIMENSION + column] = square
+                dirty_rects.append(drawSquare(screen, row, column, *square))
+    return dirty_rects
+
+#vẽ 1 ô: nền lấy từ bàn cờ vẽ sẵn, sau đó màu tô và quân cờ
+def drawSquare(screen, row, column, piece, colors):
+    rect = p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
+    screen.blit(SURFACES["board"], rect, rect)
+    for color in colors or ():
+        screen.blit(SURFACES[color], rect)
+    if piece != "--":
+        screen.blit(IMAGES[piece], rect)
+    return rect
 
 #vẽ các ô vuông trên bàn cờ
 def drawBoard(screen):
-    global colors#lưu trữ màu ô cờ
-    colors = [p.Color("white"), p.Color("plum")]
-    for row in range(DIMENSION):
-        for column in range(DIMENSION):
-            color = colors[((row + column) % 2)]#xác định màu cho ô
-            p.draw.rect(screen, color, p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))#vẽ ô cờ
+    screen.blit(SURFACES["board"], (0, 0))#bàn cờ đã vẽ sẵn
 
 
-#vẽ màu cho các nước đi 1 quân cờ có thể đi đến
-def highlightSquares(screen, game_state, valid_moves, square_selected):
+#tìm màu cho các nước đi 1 quân cờ có thể đi đến
+def highlightSquares(game_state, valid_moves, square_selected):
     """
     Highlight square selected and moves for piece selected.
+    Returns {(row, col): tuple of HIGHLIGHT_COLORS drawn on that square, in drawing order}.
     """
+    highlights = {}
     if (len(game_state.move_log)) > 0:#Kiểm tra xem đã có ít nhất một nước đi trong lịch sử nước đi (move_log) của trò chơi hay chưa.
         last_move = game_state.move_log[-1]#lấy nước đi cuối cùng và tô màu green cho ô
-        s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
-        s.set_alpha(100)
-        s.fill(p.Color('green'))
-        screen.blit(s, (last_move.end_col * SQUARE_SIZE, last_move.end_row * SQUARE_SIZE))
+        highlights[(last_move.end_row, last_move.end_col)] = ("green",)
     
     
     if square_selected != ():#kiểm tra xem có ô nào đang dc chọn ko
@@ -194,15 +285,13 @@ def highlightSquares(screen, game_state, valid_moves, square_selected):
         if game_state.board[row][col][0] == (
                 'w' if game_state.white_to_move else 'b'):  #Kiểm tra xem ô đang chọn có khớp màu quân người chơi ko
             # Tô màu cho ô đang chọn
-            s = p.Surface((SQUARE_SIZE, SQUARE_SIZE))
-            s.set_alpha(100)  
-            s.fill(p.Color('blue'))
-            screen.blit(s, (col * SQUARE_SIZE, row * SQUARE_SIZE))
+            highlights[(row, col)] = highlights.get((row, col), ()) + ("blue",)
             # Tô màu cho đường đi của quân
-            s.fill(p.Color('yellow'))
             for move in valid_moves:
                 if move.start_row == row and move.start_col == col:
-                    screen.blit(s, (move.end_col * SQUARE_SIZE, move.end_row * SQUARE_SIZE))
+                    end = (move.end_row, move.end_col)
+                    highlights[end] = highlights.get(end, ()) + ("yellow",)
+    return highlights
 
 #vẽ quân cờ
 def drawPieces(screen, board):
@@ -213,7 +302,7 @@ def drawPieces(screen, board):
                 screen.blit(IMAGES[piece], p.Rect(column * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
 
 
-#vẽ bảng ghi chép các nước đi trong trò chơi cờ vua
+#vẽ bảng ghi chép các nước đi trong trò chơi cờ vua, trả về vùng đã vẽ
 def drawMoveLog(screen, game_state, font):
     move_log_rect = p.Rect(BOARD_WIDTH, 0, MOVE_LOG_PANEL_WIDTH, MOVE_LOG_PANEL_HEIGHT)#tạo bảng
     p.draw.rect(screen, p.Color('black'), move_log_rect)#vẽ bảng màu đen
@@ -241,6 +330,7 @@ def drawMoveLog(screen, game_state, font):
         text_location = move_log_rect.move(padding, text_y)
         screen.blit(text_object, text_location)
         text_y += text_object.get_height() + line_spacing
+    return move_log_rect
 
 #Hiển thị thông báo kết thúc
 def drawEndGameText(screen, text):
@@ -254,7 +344,6 @@ def drawEndGameText(screen, text):
 
 #Tạo hiệu ứng từ nước đâu đến nước kết thúc
 def animateMove(move, screen, board, clock):
-    global colors
     #tính toán sự thay đổi vị trí
     d_row = move.end_row - move.start_row
     d_col = move.end_col - move.start_col
@@ -268,9 +357,8 @@ def animateMove(move, screen, board, clock):
         drawBoard(screen)
         drawPieces(screen, board)
         # xóa quân cờ ở ô đích
-        color = colors[(move.end_row + move.end_col) % 2]
         end_square = p.Rect(move.end_col * SQUARE_SIZE, move.end_row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-        p.draw.rect(screen, color, end_square)
+        screen.blit(SURFACES["board"], end_square, end_square)
         # vẽ quân đã ăn
         if move.piece_captured != '--':
             if move.is_enpassant_move:
@@ -279,7 +367,7 @@ def animateMove(move, screen, board, clock):
             screen.blit(IMAGES[move.piece_captured], end_square)
         # vẽ nước di chuyển
         screen.blit(IMAGES[move.piece_moved], p.Rect(col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-        p.display.flip()
+        p.display.update(p.Rect(0, 0, BOARD_WIDTH, BOARD_HEIGHT))#bảng lịch sử không đổi trong lúc di chuyển
         clock.tick(60)
 
 
@@ -0,0 +1,174 @@
+"""
+Reading and writing PGN files.
+readGames streams a file one game at a time, so multi-gigabyte databases are read in constant memory.
+Moves are kept as SAN strings until iterPositions replays them on a GameState.
+
+    python ChessPGN.py games.pgn [more.pgn ...]          replay every game and report errors and speed
+    python ChessPGN.py games.pgn --fen                   print the FEN of the final position of every game
+"""
+import argparse
+import re
+import sys
+import time
+
+import ChessBitboard
+import ChessEngine
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+_HEADER = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN = re.compile(r"\{[^}]*\}?|;[^\n]*|\(|\)|\$\d+|[^\s(){};]+")
+_MOVE_NUMBER = re.compile(r"^\d+\.*")
+
+
+def _parseMovetext(lines):
+    """
+    SAN moves and result of the main line. Comments, NAGs, move numbers and variations are dropped.
+    """
+    sans = []
+    result = "*"
+    depth = 0#độ sâu nhánh biến đang đọc, 0 là nhánh chính
+    for token in _TOKEN.findall(" ".join(lines)):
+        first = token[0]
+        if first == "(":
+            depth += 1
+        elif first == ")":
+            depth = max(depth - 1, 0)
+        elif first in "{;$" or depth:
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            token = _MOVE_NUMBER.sub("", token)#"12." hoặc "12...e5" viết liền
+            if token and token.rstrip("+#!?") != "e.p.":#"exd6 e.p.": hậu tố bắt tốt qua đường tách thành token riêng
+                sans.append(token)
+    return sans, result
+
+
+def readGames(path):
+    """
+    Yield (headers, sans) for every game of a PGN file: headers is a dict of the tag pairs
+    (with "Result" from the movetext if the tag is missing), sans the SAN moves of the main line.
+    """
+    with open(path, encoding="utf-8", errors="replace") as pgn_file:
+        headers = {}
+        movetext = []
+        in_comment = False#đang ở trong chú thích {...} kéo dài nhiều dòng
+        for line in pgn_file:
+            line = line.strip()
+            if not in_comment:
+                if line.startswith("%"):#dòng escape của PGN
+                    continue
+                if line.startswith("["):
+                    if movetext:#tag đầu tiên của ván sau
+                        sans, result = _parseMovetext(movetext)
+                        headers.setdefault("Result", result)
+                        yield headers, sans
+                        headers = {}
+                        movetext = []
+                    match = _HEADER.match(line)
+                    if match:
+                        headers[match.group(1)] = match.group(2).replace('\\"', '"')
+                    continue
+            if line:
+                movetext.append(line)
+                if "{" in line or "}" in line:
+                    in_comment = line.rfind("{") > line.rfind("}")
+        if movetext or headers:
+            sans, result = _parseMovetext(movetext)
+            headers.setdefault("Result", result)
+            yield headers, sans
+
+
+def iterPositions(headers, sans, game_state_class=ChessBitboard.BitboardGameState):
+    """
+    Replay a game: yield (game_state, move) before each move is played, the move is made when the
+    generator resumes. Starts from the "FEN" tag if there is one. Raises ValueError on an illegal move.
+    """
+    game_state = game_state_class(headers.get("FEN"))
+    for san in sans:
+        move = game_state.parseSAN(san)
+        yield game_state, move
+        game_state.makeMove(move)
+
+
+def replayGame(headers, sans, game_state_class=ChessBitboard.BitboardGameState):
+    """
+    The GameState after all moves of the game.
+    """
+    game_state = game_state_class(headers.get("FEN"))
+    for san in sans:
+        game_state.makeMove(game_state.parseSAN(san))
+    return game_state
+
+
+def gameToPgn(game_state, headers=None):
+    """
+    PGN text of the moves played on game_state (its move_log), with the given tag pairs.
+    The game state is left unchanged.
+    """
+    moves = []
+    while game_state.move_log:#quay về thế cờ đầu để viết SAN từ đầu ván
+        moves.append(game_state.move_log[-1])
+        game_state.undoMove()
+    moves.reverse()
+    start_fen = game_state.getFEN()
+    first_ply = game_state.start_ply
+    sans = []
+    for move in moves:
+        sans.append(game_state.getSAN(move))
+        game_state.makeMove(move)
+    game_state.getValidMoves()#đặt lại checkmate/stalemate cho thế cờ cuối
+
+    tags = {"Event": "?", "Site": "?", "Date": "????.??.??", "Round": "?", "White": "?", "Black": "?", "Result": "*"}
+    tags.update(headers or {})
+    if start_fen != ChessEngine.START_FEN:
+        tags["SetUp"] = "1"
+        tags["FEN"] = start_fen
+    lines = ['[%s "%s"]' % (name, str(value).replace('"', '\\"')) for name, value in tags.items()]
+    lines.append("")
+    tokens = []
+    for index, san in enumerate(sans):
+        ply = first_ply + index
+        if ply % 2 == 0:
+            tokens.append("%d." % (ply // 2 + 1))
+        elif index == 0:
+            tokens.append("%d..." % (ply // 2 + 1))
+        tokens.append(san)
+    tokens.append(tags["Result"])
+    line = ""
+    for token in tokens:#mỗi dòng tối đa 80 ký tự như chuẩn PGN
+        if line and len(line) + 1 + len(token) > 80:
+            lines.append(line)
+            line = token
+        else:
+            line = line + " " + token if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the games of PGN files.")
+    parser.add_argument("pgn", nargs="+")
+    parser.add_argument("--fen", action="store_true", help="print the FEN of the final position of every game")
+    args = parser.parse_args()
+    games = plies = errors = 0
+    start_time = time.perf_counter()
+    for path in args.pgn:
+        for headers, sans in readGames(path):
+            games += 1
+            try:
+                game_state = replayGame(headers, sans)
+            except ValueError as error:
+                errors += 1
+                print("game %d: %s" % (games, error), file=sys.stderr)
+                continue
+            plies += len(sans)
+            if args.fen:
+                print(game_state.getFEN())
+    elapsed = time.perf_counter() - start_time
+    print("games=%d plies=%d errors=%d time=%.3fs plies/s=%.0f" %
+          (games, plies, errors, elapsed, plies / elapsed if elapsed else 0), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
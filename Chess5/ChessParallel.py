@@ -0,0 +1,229 @@
+"""
+Parallel root search.
+The first root move is searched in this process to get a good alpha, the remaining root moves
+are searched by a pool of worker processes that share the best score found so far.
+A stop object (e.g. threading.Event) can interrupt the search like ChessAI.findBestMove's stop.
+Run this file to benchmark the speedup at 1/2/4/8 workers.
+"""
+import argparse
+import multiprocessing
+import queue
+import random
+import time
+
+import ChessAI
+import ChessBitboard
+
+PARALLEL_WORKERS = max(1, multiprocessing.cpu_count())
+
+_pools = {}#số worker -> (Pool, Value alpha dùng chung, Event dừng tìm kiếm)
+_shared_alpha = None#trong tiến trình worker: điểm tốt nhất ở gốc, đã tìm xong
+_shared_stop = None#trong tiến trình worker: được set khi bên gọi muốn dừng
+
+
+def _initWorker(shared_alpha, shared_stop):
+    global _shared_alpha, _shared_stop
+    _shared_alpha = shared_alpha
+    _shared_stop = shared_stop
+
+
+def getPool(workers):
+    """
+    Return a process pool with this many workers, created on first use and kept for later searches.
+    """
+    if workers not in _pools:
+        shared_alpha = multiprocessing.Value("d", -ChessAI.CHECKMATE)
+        shared_stop = multiprocessing.Event()
+        pool = multiprocessing.Pool(workers, initializer=_initWorker, initargs=(shared_alpha, shared_stop))
+        _pools[workers] = (pool, shared_alpha, shared_stop)
+    return _pools[workers]
+
+
+def shutdownPools():
+    for pool, shared_alpha, shared_stop in _pools.values():
+        pool.terminate()
+        pool.join()
+    _pools.clear()
+
+
+def _searchRootMove(game_state, move, depth, alpha):
+    """
+    Score one root move with window (alpha, CHECKMATE). A result <= alpha is only an upper bound.
+    """
+    turn_multiplier = 1 if game_state.white_to_move else -1
+    ChessAI.root_depth = depth
+    game_state.makeMove(move)
+    score = -ChessAI.findMoveNegaMaxAlphaBeta(game_state, None, depth - 1, -ChessAI.CHECKMATE, -alpha,
+                                              -turn_multiplier)
+    game_state.undoMove()
+    return score
+
+
+def _searchRootMoveTask(task):
+    """
+    Run in a worker process: rebuild the position from its FEN, search one root move using the shared alpha,
+    then publish a better score. Returns the alpha that was used with the score: a score <= that alpha
+    is only an upper bound. The score is None when the search was stopped.
+    """
+    fen, move_id, depth = task
+    game_state = ChessBitboard.BitboardGameState(fen)
+    move = game_state.getMoveById(move_id)
+    ChessAI.nodes_searched = 0
+    ChessAI.quiescence_nodes = 0
+    ChessAI.stop_event = _shared_stop
+    alpha = _shared_alpha.value
+    try:
+        score = _searchRootMove(game_state, move, depth, alpha)
+    except ChessAI.SearchTimeout:
+        return move_id, None, alpha, ChessAI.nodes_searched, ChessAI.quiescence_nodes
+    with _shared_alpha.get_lock():
+        if score > _shared_alpha.value:
+            _shared_alpha.value = score
+    return move_id, score, alpha, ChessAI.nodes_searched, ChessAI.quiescence_nodes
+
+
+def findBestMoveParallel(game_state, valid_moves, return_queue, workers=PARALLEL_WORKERS, max_depth=None,
+                         stop=None):
+    """
+    Same result format as ChessAI.findBestMove: puts (move, info) on return_queue.
+    Depths below max_depth are searched here to order the root moves; the last depth is split
+    across the worker processes.
+    Once stop is set the workers abandon their moves and the best move whose last depth
+    was completed is returned (info["depth"] is then max_depth - 1).
+    """
+    start_time = time.time()
+    if max_depth is None:
+        max_depth = ChessAI.DEPTH
+    if max_depth < 2 or len(valid_moves) < 2 or ChessAI.probeOpeningBook(game_state, valid_moves) is not None:
+        ChessAI.findBestMove(game_state, valid_moves, return_queue, max_depth=max_depth, stop=stop)
+        return
+    #các độ sâu nhỏ tìm tuần tự để có thứ tự nước đi tốt
+    serial_queue = queue.Queue()
+    ChessAI.findBestMove(game_state, valid_moves, serial_queue, max_depth=max_depth - 1, stop=stop)
+    best_move, serial_info = serial_queue.get()
+    if stop is not None and stop.is_set():
+        return_queue.put((best_move, dict(serial_info, workers=workers)))
+        return
+    nodes = serial_info["nodes"]
+    quiescence_nodes = serial_info["quiescence_nodes"]
+    if best_move is None:
+        best_move = valid_moves[0]
+    root_moves = [best_move] + [move for move in valid_moves if move is not best_move]
+
+    #nước đầu tiên tìm đủ sâu ở đây để có alpha tốt trước khi chia việc
+    ChessAI.nodes_searched = 0
+    ChessAI.quiescence_nodes = 0
+    ChessAI.stop_event = stop
+    root_ply = len(game_state.move_log)
+    try:
+        best_score = _searchRootMove(game_state, best_move, max_depth, -ChessAI.CHECKMATE)
+    except ChessAI.SearchTimeout:
+        while len(game_state.move_log) > root_ply:
+            game_state.undoMove()
+        return_queue.put((best_move, dict(serial_info, time=time.time() - start_time, workers=workers)))
+        return
+    finally:
+        ChessAI.stop_event = None
+    nodes += ChessAI.nodes_searched
+    quiescence_nodes += ChessAI.quiescence_nodes
+
+    pool, shared_alpha, shared_stop = getPool(workers)
+    shared_alpha.value = best_score
+    shared_stop.clear()
+    fen = game_state.getFEN()#gửi FEN thay vì cả GameState, worker tự dựng lại thế cờ
+    tasks = [(fen, move.moveID, max_depth) for move in root_moves[1:]]
+    task_results = pool.imap_unordered(_searchRootMoveTask, tasks)
+    results = {}
+    stopped = False
+    while True:
+        try:
+            move_id, score, alpha, task_nodes, task_quiescence_nodes = task_results.next(timeout=0.05)
+        except multiprocessing.TimeoutError:#chờ kết quả nhưng vẫn kiểm tra stop thường xuyên
+            if stop is not None and stop.is_set() and not stopped:
+                stopped = True
+                shared_stop.set()
+            continue
+        except StopIteration:
+            break
+        #score <= alpha chỉ là cận trên; alpha luôn là điểm chính xác của 1 nước khác nên bỏ qua được nước này
+        #score None: bị dừng giữa chừng
+        if score is not None and score > alpha:
+            results[move_id] = score
+        nodes += task_nodes
+        quiescence_nodes += task_quiescence_nodes
+    for move in root_moves[1:]:#cùng điểm thì giữ nước đứng trước trong thứ tự
+        if move.moveID in results and results[move.moveID] > best_score:
+            best_score = results[move.moveID]
+            best_move = move
+    info = {"depth": max_depth - 1 if stopped else max_depth, "nodes": nodes, "quiescence_nodes": quiescence_nodes,
+            "score": best_score, "time": time.time() - start_time, "workers": workers}
+    return_queue.put((best_move, info))
+
+
+# Bộ thế cờ cố định cho benchmark, mỗi thế cờ là chuỗi nước đi từ thế cờ ban đầu
+BENCHMARK_POSITIONS = {
+    "start": "",
+    "italian": "e2e4 e7e5 g1f3 b8c6 f1c4 f8c5 c2c3 g8f6 d2d3 d7d6",
+    "queens_gambit": "d2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7 e2e3 e8g8",
+    "sicilian": "e2e4 c7c5 g1f3 d7d6 d2d4 c5d4 f3d4 g8f6 b1c3 a7a6",
+    "kings_indian": "d2d4 g8f6 c2c4 g7g6 b1c3 f8g7 e2e4 d7d6 g1f3 e8g8",
+}
+
+
+def positionFromMoves(moves):
+    """
+    Play a space separated list of coordinate moves (e.g. "e2e4 e7e5") from the starting position.
+    """
+    game_state = ChessBitboard.BitboardGameState()
+    for text in moves.split():
+        start = (8 - int(text[1]), "abcdefgh".index(text[0]))
+        end = (8 - int(text[3]), "abcdefgh".index(text[2]))
+        for move in game_state.getValidMoves():
+            if (move.start_row, move.start_col) == start and (move.end_row, move.end_col) == end:
+                game_state.makeMove(move)
+                break
+        else:
+            raise ValueError("illegal move " + text)
+    return game_state
+
+
+def runBenchmark(worker_counts, depth):
+    """
+    Search every benchmark position at the given depth for each worker count and print the speedup.
+    1 worker means the plain serial ChessAI.findBestMove.
+    """
+    ChessAI.use_opening_book = False#đo tốc độ tìm kiếm, không lấy nước từ sách
+    totals = {}
+    for workers in worker_counts:
+        if workers > 1:
+            getPool(workers)#khởi động pool trước, không tính vào thời gian
+        total_time = 0
+        for name, moves in BENCHMARK_POSITIONS.items():
+            game_state = positionFromMoves(moves)
+            ChessAI.transposition_table.clear()
+            random.seed(0)
+            return_queue = queue.Queue()
+            start_time = time.time()
+            if workers == 1:
+                ChessAI.findBestMove(game_state, game_state.getValidMoves(), return_queue, max_depth=depth)
+            else:
+                findBestMoveParallel(game_state, game_state.getValidMoves(), return_queue, workers, depth)
+            elapsed = time.time() - start_time
+            move, info = return_queue.get()
+            total_time += elapsed
+            print("workers=%d %-14s move=%s score=%.2f nodes=%d time=%.3fs" %
+                  (workers, name, move, info["score"], info["nodes"], elapsed))
+        totals[workers] = total_time
+        shutdownPools()
+    print()
+    baseline = totals[worker_counts[0]]
+    for workers in worker_counts:
+        print("workers=%d total=%.3fs speedup=%.2fx" % (workers, totals[workers], baseline / totals[workers]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Parallel root search scaling benchmark.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--depth", type=int, default=ChessAI.DEPTH + 1)
+    args = parser.parse_args()
+    runBenchmark(args.workers, args.depth)
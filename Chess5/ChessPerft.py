@@ -0,0 +1,183 @@
+"""
+Perft: count the leaf nodes of the legal move tree to a fixed depth.
+Checks move generation against known-correct counts and measures its speed.
+
+    python ChessPerft.py                      run the regression suite
+    python ChessPerft.py --fen FEN --depth 4 --divide
+    python ChessPerft.py --memory             memory and GC cost of Move objects
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+
+import ChessBitboard
+import ChessEngine
+
+BACKENDS = {"bitboard": ChessBitboard.BitboardGameState, "engine": ChessEngine.GameState}
+
+# (tên, FEN, {độ sâu: số node đúng})
+# 7 thế cờ đầu là các thế cờ chuẩn của chessprogramming wiki,
+# các thế cờ sau là bộ thế cờ khó (bắt tốt qua đường bị ghim, nhập thành qua ô bị chiếu, phong cấp...)
+PERFT_SUITE = [
+    ("start", ChessEngine.START_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position4_mirrored", "r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    ("illegal_ep_1", "3k4/3p4/8/K1P4r/8/8/8/8 b - - 0 1",
+     {1: 18, 2: 92, 3: 1670, 4: 10138, 5: 185429, 6: 1134888}),
+    ("illegal_ep_2", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1",
+     {1: 13, 2: 102, 3: 1266, 4: 10276, 5: 135655, 6: 1015133}),
+    ("ep_capture_checks", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1",
+     {1: 15, 2: 126, 3: 1928, 4: 13931, 5: 206379, 6: 1440467}),
+    ("short_castle_check", "5k2/8/8/8/8/8/8/4K2R w K - 0 1",
+     {1: 15, 2: 66, 3: 1198, 4: 6399, 5: 120330, 6: 661072}),
+    ("long_castle_check", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1",
+     {1: 16, 2: 71, 3: 1286, 4: 7418, 5: 141077, 6: 803711}),
+    ("castle_rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1",
+     {1: 26, 2: 1141, 3: 27826, 4: 1274206}),
+    ("castle_prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1",
+     {1: 44, 2: 1494, 3: 50509, 4: 1720476}),
+    ("promote_out_of_check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1",
+     {1: 11, 2: 133, 3: 1442, 4: 19174, 5: 266199, 6: 3821001}),
+    ("discovered_check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1",
+     {1: 29, 2: 165, 3: 5160, 4: 31961, 5: 1004658}),
+    ("promote_to_check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1",
+     {1: 9, 2: 40, 3: 472, 4: 2661, 5: 38983, 6: 217342}),
+    ("underpromote_to_check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1",
+     {1: 6, 2: 27, 3: 273, 4: 1329, 5: 18135, 6: 92683}),
+    ("self_stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1",
+     {1: 2, 2: 6, 3: 13, 4: 63, 5: 382, 6: 2217}),
+    ("stalemate_checkmate_1", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1",
+     {1: 10, 2: 25, 3: 268, 4: 926, 5: 10857, 6: 43261, 7: 567584}),
+    ("stalemate_checkmate_2", "8/8/2k5/5q2/5n2/8/5K2/8 b - - 0 1",
+     {1: 37, 2: 183, 3: 6559, 4: 23527}),
+]
+
+
+def perft(game_state, depth):
+    """
+    Number of leaf nodes of the legal move tree of the given depth.
+    """
+    moves = game_state.getValidMoves()
+    if depth == 1:#ở độ sâu cuối chỉ cần đếm, không cần đi thử từng nước
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game_state.makeMove(move)
+        nodes += perft(game_state, depth - 1)
+        game_state.undoMove()
+    return nodes
+
+
+def divide(game_state, depth):
+    """
+    Perft split by root move: list of (move, nodes). Used to find which move a wrong count comes from.
+    """
+    results = []
+    for move in game_state.getValidMoves():
+        game_state.makeMove(move)
+        results.append((move, perft(game_state, depth - 1) if depth > 1 else 1))
+        game_state.undoMove()
+    return results
+
+
+def runSuite(game_state_class, max_nodes):
+    """
+    Run every suite entry whose expected count is at most max_nodes. Returns the number of failures.
+    """
+    failures = 0
+    total_nodes = 0
+    total_time = 0
+    for name, fen, expected_counts in PERFT_SUITE:
+        for depth, expected in sorted(expected_counts.items()):
+            if expected > max_nodes:
+                break
+            game_state = game_state_class(fen)
+            start_time = time.perf_counter()
+            nodes = perft(game_state, depth)
+            elapsed = time.perf_counter() - start_time
+            total_nodes += nodes
+            total_time += elapsed
+            status = "ok" if nodes == expected else "FAIL"
+            if nodes != expected:
+                failures += 1
+            print("%-4s %-22s depth=%d nodes=%-9d expected=%-9d time=%.3fs nps=%.0f" %
+                  (status, name, depth, nodes, expected, elapsed, nodes / elapsed if elapsed else 0))
+    print("total nodes=%d time=%.3fs nps=%.0f failures=%d" %
+          (total_nodes, total_time, total_nodes / total_time if total_time else 0, failures))
+    return failures
+
+
+def benchmarkMoveMemory(game_state_class, depth=3):
+    """
+    Measure the memory held per Move object and the garbage collections triggered by a perft run.
+    """
+    #giữ lại mọi nước đi của các thế cờ để đo bộ nhớ trung bình mỗi Move
+    positions = [game_state_class(fen) for name, fen, expected_counts in PERFT_SUITE]
+    tracemalloc.start()
+    moves = []
+    for game_state in positions:
+        for _ in range(100):
+            moves.extend(game_state.getValidMoves())
+    memory, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("moves=%d memory=%d bytes bytes/move=%.1f" % (len(moves), memory, memory / len(moves)))
+    del moves
+
+    #số lần GC chạy trong lúc perft: mỗi Move tạo ra đều được GC thế hệ 0 theo dõi
+    game_state = game_state_class(PERFT_SUITE[1][1])
+    collections_before = [stats["collections"] for stats in gc.get_stats()]
+    start_time = time.perf_counter()
+    nodes = perft(game_state, depth)
+    elapsed = time.perf_counter() - start_time
+    collections = [stats["collections"] - before for stats, before in zip(gc.get_stats(), collections_before)]
+    print("perft depth=%d nodes=%d time=%.3fs gc collections (gen0, gen1, gen2)=%s" %
+          (depth, nodes, elapsed, tuple(collections)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft move generation test and benchmark.")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="bitboard")
+    parser.add_argument("--fen", help="run one position instead of the suite")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true", help="print node counts per root move")
+    parser.add_argument("--max-nodes", type=int, default=200000,
+                        help="skip suite entries whose expected count is larger than this")
+    parser.add_argument("--memory", action="store_true", help="measure memory and GC cost of Move objects")
+    args = parser.parse_args()
+    game_state_class = BACKENDS[args.backend]
+
+    if args.memory:
+        benchmarkMoveMemory(game_state_class)
+        return
+
+    if args.fen is None:
+        sys.exit(1 if runSuite(game_state_class, args.max_nodes) else 0)
+
+    game_state = game_state_class(args.fen)
+    start_time = time.perf_counter()
+    if args.divide:
+        nodes = 0
+        for move, move_nodes in divide(game_state, args.depth):
+            print("%s: %d" % (move.getCoordinateNotation(), move_nodes))
+            nodes += move_nodes
+    else:
+        nodes = perft(game_state, args.depth)
+    elapsed = time.perf_counter() - start_time
+    print("nodes=%d time=%.3fs nps=%.0f" % (nodes, elapsed, nodes / elapsed if elapsed else 0))
+
+
+if __name__ == "__main__":
+    main()
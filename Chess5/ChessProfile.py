@@ -0,0 +1,177 @@
+"""
+Search statistics and profiling.
+Searches the benchmark positions with ChessAI.collect_stats on and prints the SearchStats of each search.
+With --profile the hot functions of the search and of GameState are wrapped with timers while the searches
+run, and the time is attributed to each call path: as JSON (calls, total and self time per function) and as
+collapsed stacks ("findBestMove;findMoveNegaMaxAlphaBeta;makeMove 1234", microseconds) for flamegraph.pl
+or speedscope. The wrappers add about a microsecond per call, so compare shares rather than absolute times.
+
+    python ChessProfile.py --depth 4
+    python ChessProfile.py --depth 3 --profile --json profile.json --collapsed profile.folded
+    python ChessProfile.py --backend engine --profile --fen "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq -"
+"""
+import argparse
+import json
+import queue
+import random
+import time
+
+import ChessAI
+import ChessBitboard
+import ChessEngine
+import ChessParallel
+
+BACKENDS = {"bitboard": ChessBitboard.BitboardGameState, "engine": ChessEngine.GameState}
+PROFILED_METHODS = ("getValidMoves", "getCaptureMoves", "getQuietMoves", "getMoveById", "hasLegalMove",
+                    "checkForPinsAndChecks", "inCheck", "makeMove", "undoMove")
+PROFILED_FUNCTIONS = ("findBestMove", "findMoveNegaMaxAlphaBeta", "quiescenceSearch", "scoreBoard",
+                      "move_ordering", "orderMovesMvvLva", "probeTablebase")
+
+
+class Profiler:
+    """
+    Replaces functions by timing wrappers (wrap) until restore is called.
+    Time is kept per call path; direct recursion is merged into one frame so the paths stay short
+    (every call is counted, but the time of a recursive call is part of the outermost one).
+    """
+
+    def __init__(self):
+        self.stack = []#các frame đang chạy: [tên, đường gọi, thời gian của các hàm con]
+        self.self_times = {}#đường gọi -> thời gian riêng (ns)
+        self.total_times = {}#tên -> thời gian tính cả hàm con (ns), chỉ tính lần gọi ngoài cùng
+        self.calls = {}
+        self.patches = []
+
+    def wrap(self, owner, name):
+        """
+        Time owner.name (a class or a module attribute holding a function).
+        """
+        function = getattr(owner, name)
+        self.patches.append((owner, name, name in vars(owner), vars(owner).get(name)))
+        stack = self.stack
+        self_times = self.self_times
+        total_times = self.total_times
+        calls = self.calls
+
+        def timed(*args, **kwargs):
+            calls[name] = calls.get(name, 0) + 1
+            if stack and stack[-1][0] == name:#đệ quy trực tiếp: thời gian tính vào frame ngoài
+                return function(*args, **kwargs)
+            frame = [name, stack[-1][1] + ";" + name if stack else name, 0]
+            stack.append(frame)
+            start = time.perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                stack.pop()
+                self_times[frame[1]] = self_times.get(frame[1], 0) + elapsed - frame[2]
+                if all(outer[0] != name for outer in stack):
+                    total_times[name] = total_times.get(name, 0) + elapsed
+                if stack:
+                    stack[-1][2] += elapsed
+        setattr(owner, name, timed)
+
+    def restore(self):
+        for owner, name, was_own, original in reversed(self.patches):
+            if was_own:
+                setattr(owner, name, original)
+            else:#hàm kế thừa từ lớp cha: bỏ bản bọc ở lớp con
+                delattr(owner, name)
+        self.patches = []
+
+    def report(self):
+        """
+        {name: {"calls", "total_ms", "self_ms", "self_percent"}}, sorted by self time.
+        """
+        self_by_name = {}
+        for path, nanoseconds in self.self_times.items():
+            name = path.rsplit(";", 1)[-1]
+            self_by_name[name] = self_by_name.get(name, 0) + nanoseconds
+        all_time = sum(self_by_name.values()) or 1
+        return {name: {"calls": self.calls.get(name, 0), "total_ms": round(self.total_times.get(name, 0) / 1e6, 3),
+                       "self_ms": round(nanoseconds / 1e6, 3), "self_percent": round(100 * nanoseconds / all_time, 2)}
+                for name, nanoseconds in sorted(self_by_name.items(), key=lambda item: -item[1])}
+
+    def collapsedStacks(self):
+        """
+        Lines "caller;callee self_time_in_microseconds" (flamegraph.pl collapsed format).
+        """
+        return ["%s %d" % (path, nanoseconds // 1000) for path, nanoseconds in sorted(self.self_times.items())
+                if nanoseconds >= 1000]
+
+
+def profileSearches(positions, depth, game_state_class, profile):
+    """
+    Search every (name, game_state) with statistics on. Returns ({name: info}, Profiler or None).
+    """
+    profiler = None
+    if profile:
+        profiler = Profiler()
+        for name in PROFILED_METHODS:
+            profiler.wrap(game_state_class, name)
+        for name in PROFILED_FUNCTIONS:
+            profiler.wrap(ChessAI, name)
+    ChessAI.use_opening_book = False
+    ChessAI.collect_stats = True
+    results = {}
+    try:
+        for name, game_state in positions:
+            ChessAI.transposition_table.clear()
+            random.seed(0)
+            return_queue = queue.Queue()
+            ChessAI.findBestMove(game_state, game_state.getValidMoves(), return_queue, max_depth=depth)
+            move, info = return_queue.get()
+            info["move"] = move.getCoordinateNotation() if move is not None else None
+            results[name] = info
+    finally:
+        ChessAI.collect_stats = False
+        if profiler is not None:
+            profiler.restore()
+    return results, profiler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search statistics and profiling of ChessAI.")
+    parser.add_argument("--depth", type=int, default=ChessAI.DEPTH)
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="bitboard")
+    parser.add_argument("--fen", help="search this position instead of the benchmark positions")
+    parser.add_argument("--profile", action="store_true", help="time the hot functions of the search")
+    parser.add_argument("--json", help="write statistics (and profile) as JSON to this file")
+    parser.add_argument("--collapsed", help="write the profile as collapsed stacks to this file")
+    args = parser.parse_args()
+    game_state_class = BACKENDS[args.backend]
+    if args.fen:
+        positions = [("fen", game_state_class(args.fen))]
+    else:
+        positions = []
+        for name, moves in ChessParallel.BENCHMARK_POSITIONS.items():
+            game_state = game_state_class()
+            for move in ChessParallel.positionFromMoves(moves).move_log:#chơi lại trên backend đã chọn
+                game_state.makeMove(game_state.getMoveById(move.moveID))
+            positions.append((name, game_state))
+
+    results, profiler = profileSearches(positions, args.depth, game_state_class, args.profile or args.collapsed)
+    for name, info in results.items():
+        stats = info["stats"]
+        print("%-14s move=%s depth=%d nodes=%d qnodes=%d cutoff=%.1f%% first=%.1f%% tt_hit=%.1f%% ebf=%s time=%.2fs" %
+              (name, info["move"], info["depth"], stats["nodes"], stats["quiescence_nodes"],
+               100 * stats["beta_cutoff_rate"], 100 * stats["first_move_cutoff_rate"], 100 * stats["tt_hit_rate"],
+               "%.2f" % stats["effective_branching_factor"] if stats["effective_branching_factor"] else "-",
+               info["time"]))
+    output = {"depth": args.depth, "backend": args.backend, "searches": results}
+    if profiler is not None:
+        output["profile"] = profiler.report()
+        for function_name, times in list(output["profile"].items())[:12]:
+            print("%-26s calls=%-9d self=%9.1fms (%5.1f%%) total=%9.1fms" %
+                  (function_name, times["calls"], times["self_ms"], times["self_percent"], times["total_ms"]))
+        if args.collapsed:
+            with open(args.collapsed, "w") as collapsed_file:
+                collapsed_file.write("\n".join(profiler.collapsedStacks()) + "\n")
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(output, json_file, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,469 @@
+"""
+Endgame tablebases for pawnless endings with up to 4 pieces (kings included).
+The tables are built offline by retrograde analysis: for every position they store whether the
+side to move wins, draws or loses, and in how many plies the game ends in mate with best play.
+
+    python ChessTablebase.py generate                  the 3 piece tables
+    python ChessTablebase.py generate KQvKR KRvKB      4 piece tables (slow: about 10-30 minutes each)
+    python ChessTablebase.py verify KQvK               check a sample of a table against GameState
+    python ChessTablebase.py probe --fen "8/8/8/8/8/2k5/8/1KQ5 w - - 0 1"
+
+A table file is a header followed by one byte per position, addressed by Table.index,
+so a probe is a single read from the memory-mapped file.
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import time
+
+import ChessBitboard
+from ChessWeights import piece_score
+
+TABLEBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebases")
+TABLE_MAGIC = b"CHESSTB1"
+HEADER = struct.Struct(">8s12sI")#magic, tên bảng (vd "KQvKR"), số thế cờ
+MAX_PIECES = 4
+DEFAULT_TABLES = ("KQvK", "KRvK", "KBvK", "KNvK")
+
+# giá trị 1 byte của mỗi thế cờ: 0 là hòa, 255 là không dùng (thế cờ không hợp lệ hoặc trùng đối xứng),
+# còn lại là số ply tới khi chiếu hết + 1. Số ply chẵn: bên đi bị chiếu hết (thua), lẻ: bên đi thắng
+DRAW = 0
+INVALID = 255
+# kết quả của probe, nhìn từ bên đang đi
+WIN = 1
+LOSS = -1
+
+
+def _transformSquare(sq, transform):
+    row, col = divmod(sq, 8)
+    if transform & 1:
+        col = 7 - col
+    if transform & 2:
+        row = 7 - row
+    if transform & 4:
+        row, col = col, row
+    return row * 8 + col
+
+
+# Không có tốt (và không còn quyền nhập thành) thì bàn cờ có 8 phép đối xứng (lật, xoay).
+# Mỗi thế cờ được đưa về dạng có vua trắng nằm trong tam giác a1-d1-d4 (10 ô).
+TRANSFORMS = [[_transformSquare(sq, transform) for sq in range(64)] for transform in range(8)]
+TRIANGLE = [sq for sq in range(64) if sq % 8 <= 3 and sq // 8 >= 4 and 7 - sq // 8 <= sq % 8]
+TRIANGLE_INDEX = {sq: i for i, sq in enumerate(TRIANGLE)}
+# các phép đối xứng đưa vua trắng ở ô sq vào tam giác (2 phép khi vua nằm trên đường chéo a1-h8)
+KING_TRANSFORMS = [[TRANSFORMS[transform] for transform in range(8) if TRANSFORMS[transform][sq] in TRIANGLE_INDEX]
+                   for sq in range(64)]
+
+
+def _attacks(piece_type, sq, occupied):
+    if piece_type == "N":
+        return ChessBitboard.KNIGHT_ATTACKS[sq]
+    if piece_type == "K":
+        return ChessBitboard.KING_ATTACKS[sq]
+    if piece_type == "R":
+        return ChessBitboard.rookAttacks(sq, occupied)
+    if piece_type == "B":
+        return ChessBitboard.bishopAttacks(sq, occupied)
+    return ChessBitboard.rookAttacks(sq, occupied) | ChessBitboard.bishopAttacks(sq, occupied)
+
+
+def _sortSide(pieces):
+    #vua đứng đầu, sau đó quân mạnh trước
+    others = sorted(pieces.replace("K", "", 1), key=lambda piece: (-piece_score[piece], piece))
+    return "K" + "".join(others)
+
+
+def _sideStrength(pieces):
+    return sum(piece_score[piece] for piece in pieces), pieces
+
+
+def materialName(white, black):
+    """
+    Table name for the given pieces of each side, e.g. ("KR", "KQ") -> ("KQvKR", True).
+    The stronger side is always white in a table; the flag tells whether colors were swapped.
+    """
+    white = _sortSide(white)
+    black = _sortSide(black)
+    if _sideStrength(black) > _sideStrength(white):
+        return black + "v" + white, True
+    return white + "v" + black, False
+
+
+class Table:
+    """
+    Index layout of one material combination, e.g. "KQvKR".
+    Pieces are ordered white king, other white pieces, black king, other black pieces;
+    index = ((side * 10 + triangle square of the white king) * 64 + sq_1) * 64 + ... + sq_n.
+    """
+
+    def __init__(self, name):
+        white, black = name.split("v")
+        if not white.startswith("K") or not black.startswith("K") or set(white + black) - set("KQRBN"):
+            raise ValueError("bad table name %r, expected e.g. KQvK (no pawns)" % name)
+        self.name = name
+        self.pieces = tuple("w" + piece for piece in white) + tuple("b" + piece for piece in black)
+        self.count = len(self.pieces)
+        self.size = 2 * len(TRIANGLE) * 64 ** (self.count - 1)
+        self.kings = {"w": 0, "b": len(white)}
+        #các nhóm quân giống nhau (vd 2 tượng): ô của chúng được sắp xếp để mỗi thế cờ chỉ có 1 chỉ số
+        self.groups = []
+        start = 0
+        for end in range(1, self.count + 1):
+            if end == self.count or self.pieces[end] != self.pieces[start]:
+                if end - start > 1:
+                    self.groups.append((start, end))
+                start = end
+
+    def index(self, squares, side):
+        """
+        Index of the position (side 0: white to move). Symmetric positions share one index.
+        """
+        best = None
+        for transform in KING_TRANSFORMS[squares[0]]:
+            mapped = [transform[sq] for sq in squares]
+            for start, end in self.groups:
+                mapped[start:end] = sorted(mapped[start:end])
+            index = side * len(TRIANGLE) + TRIANGLE_INDEX[mapped[0]]
+            for sq in mapped[1:]:
+                index = index * 64 + sq
+            if best is None or index < best:
+                best = index
+        return best
+
+    def decode(self, index):
+        squares = [0] * self.count
+        for i in range(self.count - 1, 0, -1):
+            index, squares[i] = divmod(index, 64)
+        side, triangle_index = divmod(index, len(TRIANGLE))
+        squares[0] = TRIANGLE[triangle_index]
+        return squares, side
+
+    def _attacked(self, target, color, squares, occupied, skip=None):
+        """
+        True if a piece of this color (other than number skip) attacks square target.
+        """
+        for i in range(self.count):
+            if i != skip and self.pieces[i][0] == color and \
+                    _attacks(self.pieces[i][1], squares[i], occupied) >> target & 1:
+                return True
+        return False
+
+    def isValid(self, squares, side):
+        """
+        Distinct squares and the side that is not to move is not in check.
+        """
+        if len(set(squares)) != self.count:
+            return False
+        waiting = "b" if side == 0 else "w"
+        occupied = sum(1 << sq for sq in squares)
+        return not self._attacked(squares[self.kings[waiting]], "w" if side == 0 else "b", squares, occupied)
+
+    def moves(self, squares, side):
+        """
+        Yield (new squares, captured piece number or None) for every legal move.
+        """
+        color = "w" if side == 0 else "b"
+        enemy = "b" if side == 0 else "w"
+        occupied = 0
+        own = 0
+        for i, sq in enumerate(squares):
+            occupied |= 1 << sq
+            if self.pieces[i][0] == color:
+                own |= 1 << sq
+        king = self.kings[color]
+        for i in range(self.count):
+            if self.pieces[i][0] != color:
+                continue
+            start = squares[i]
+            for target in ChessBitboard.iterBits(_attacks(self.pieces[i][1], start, occupied) & ~own):
+                captured = None
+                if occupied >> target & 1:
+                    captured = squares.index(target)
+                new_squares = list(squares)
+                new_squares[i] = target
+                occupied_after = (occupied ^ (1 << start)) | (1 << target)
+                if not self._attacked(new_squares[king], enemy, new_squares, occupied_after, captured):
+                    yield new_squares, captured
+
+    def predecessors(self, squares, side):
+        """
+        Indexes of the positions from which the other side reaches this one with a non-capture move.
+        """
+        mover = "b" if side == 0 else "w"
+        waiting_king = squares[self.kings["w" if side == 0 else "b"]]
+        occupied = sum(1 << sq for sq in squares)
+        result = set()
+        for i in range(self.count):
+            if self.pieces[i][0] != mover:
+                continue
+            sq = squares[i]
+            #quân không ăn quân nên đi ngược lại cũng chính là đi xuôi tới một ô trống
+            for origin in ChessBitboard.iterBits(_attacks(self.pieces[i][1], sq, occupied) & ~occupied):
+                new_squares = list(squares)
+                new_squares[i] = origin
+                occupied_before = occupied ^ (1 << sq) ^ (1 << origin)
+                if not self._attacked(waiting_king, mover, new_squares, occupied_before):
+                    result.add(self.index(new_squares, 1 - side))
+        return result
+
+    def generate(self, lookup):
+        """
+        Retrograde analysis. lookup(placed, white_to_move) gives the value of a position with
+        one piece less, reached by a capture. Returns the table as a bytearray.
+        """
+        values = bytearray(self.size)
+        counts = bytearray(self.size)#số thế cờ con chưa biết là đối phương thắng
+        longest = bytearray(self.size)#số ply dài nhất trong các thế cờ con đối phương thắng
+        buckets = {}#số ply -> chỉ số các thế cờ có thể có kết quả đó
+
+        #bước 1: thế cờ chiếu hết, hòa pat và kết quả của các nước ăn quân (tra bảng nhỏ hơn)
+        for index in range(self.size):
+            squares, side = self.decode(index)
+            if self.index(squares, side) != index or not self.isValid(squares, side):
+                values[index] = INVALID
+                continue
+            successors = set()
+            legal = False
+            draw = False
+            win = False
+            for new_squares, captured in self.moves(squares, side):
+                legal = True
+                if captured is None:
+                    successors.add(self.index(new_squares, 1 - side))
+                    continue
+                placed = [(self.pieces[i], new_squares[i]) for i in range(self.count) if i != captured]
+                value = lookup(placed, side == 1)
+                if value == DRAW:
+                    draw = True
+                elif (value - 1) % 2 == 0:#đối phương thua: thắng sau value ply
+                    buckets.setdefault(value, []).append(index)
+                    win = True
+                else:
+                    longest[index] = max(longest[index], value - 1)
+            if not legal:
+                color = "w" if side == 0 else "b"
+                occupied = sum(1 << sq for sq in squares)
+                if self._attacked(squares[self.kings[color]], "b" if side == 0 else "w", squares, occupied):
+                    buckets.setdefault(0, []).append(index)#bị chiếu hết
+                continue#hòa pat giữ giá trị DRAW
+            #thế cờ có nước ăn quân để thắng hoặc hòa thì không bao giờ thua
+            counts[index] = len(successors) + draw + win
+            if counts[index] == 0:#mọi nước đi đều là ăn quân vào thế đối phương thắng
+                buckets.setdefault(longest[index] + 1, []).append(index)
+
+        #bước 2: lan kết quả ngược từ thế cờ đã biết, theo thứ tự số ply tăng dần
+        plies = 0
+        while buckets:
+            for index in buckets.pop(plies, ()):
+                if values[index]:#đã có kết quả với số ply nhỏ hơn
+                    continue
+                values[index] = plies + 1
+                squares, side = self.decode(index)
+                for previous in self.predecessors(squares, side):
+                    if values[previous]:
+                        continue
+                    if plies % 2 == 0:#thế cờ này thua nên thế cờ trước thắng bằng nước đi tới đây
+                        buckets.setdefault(plies + 1, []).append(previous)
+                    else:
+                        counts[previous] -= 1
+                        longest[previous] = max(longest[previous], plies)
+                        if counts[previous] == 0:#mọi nước đi đều dẫn tới thế đối phương thắng
+                            buckets.setdefault(longest[previous] + 1, []).append(previous)
+            plies += 1
+        return values
+
+
+class Tablebase:
+    """
+    The tables found in a directory, memory-mapped on first use.
+    """
+
+    def __init__(self, directory=TABLEBASE_DIR):
+        self.directory = directory
+        self.tables = {}#tên bảng -> (Table, dữ liệu) hoặc None nếu không có file
+
+    def path(self, name):
+        return os.path.join(self.directory, name + ".tb")
+
+    def _load(self, name):
+        if name not in self.tables:
+            self.tables[name] = None
+            if os.path.exists(self.path(name)):
+                with open(self.path(name), "rb") as table_file:
+                    data = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+                table = Table(name)
+                magic, stored_name, size = HEADER.unpack_from(data, 0)
+                if magic != TABLE_MAGIC or stored_name.rstrip(b"\0").decode() != name or size != table.size:
+                    raise ValueError("%s is not a valid table file" % self.path(name))
+                self.tables[name] = (table, data)
+        return self.tables[name]
+
+    def value(self, placed, white_to_move):
+        """
+        Stored byte for the pieces placed = [(piece, sq), ...], or None if the table is missing.
+        """
+        white = "".join(piece[1] for piece, sq in placed if piece[0] == "w")
+        black = "".join(piece[1] for piece, sq in placed if piece[0] == "b")
+        if len(white) == 1 and len(black) == 1:#chỉ còn 2 vua
+            return DRAW
+        name, swapped = materialName(white, black)
+        loaded = self._load(name)
+        if loaded is None:
+            return None
+        table, data = loaded
+        if swapped:#đổi màu quân và lật bàn cờ để bên mạnh hơn là bên trắng
+            placed = [(("b" if piece[0] == "w" else "w") + piece[1], sq ^ 56) for piece, sq in placed]
+            white_to_move = not white_to_move
+        remaining = list(placed)
+        squares = []
+        for piece in table.pieces:
+            for entry in remaining:
+                if entry[0] == piece:
+                    squares.append(entry[1])
+                    remaining.remove(entry)
+                    break
+        return data[HEADER.size + table.index(squares, 0 if white_to_move else 1)]
+
+    def probe(self, game_state):
+        """
+        (WIN/DRAW/LOSS for the side to move, plies to mate), or None if no table covers the position.
+        """
+        if game_state.piece_count > MAX_PIECES:
+            return None
+        rights = game_state.current_castling_rights
+        if rights.wks or rights.bks or rights.wqs or rights.bqs:
+            return None
+        placed = []
+        for row in range(8):
+            for col in range(8):
+                piece = game_state.board[row][col]
+                if piece != "--":
+                    if piece[1] == "p":
+                        return None
+                    placed.append((piece, row * 8 + col))
+        value = self.value(placed, game_state.white_to_move)
+        if value is None or value == INVALID:
+            return None
+        if value == DRAW:
+            return DRAW, 0
+        return (LOSS if (value - 1) % 2 == 0 else WIN), value - 1
+
+    def generate(self, name):
+        """
+        Build a table and the smaller tables it depends on, write them to the directory.
+        """
+        table = Table(name)
+        if self._load(name) is not None:
+            return
+        #tạo trước các bảng còn thiếu mà nước ăn quân có thể dẫn tới
+        white, black = name.split("v")
+        for side, pieces in ((0, white), (1, black)):
+            for i in range(1, len(pieces)):
+                smaller = (white[:i] + white[i + 1:], black) if side == 0 else (white, black[:i] + black[i + 1:])
+                if len(smaller[0]) > 1 or len(smaller[1]) > 1:
+                    self.generate(materialName(*smaller)[0])
+        start_time = time.time()
+        values = table.generate(self.value)
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(name), "wb") as table_file:
+            table_file.write(HEADER.pack(TABLE_MAGIC, name.encode(), table.size))
+            table_file.write(values)
+        self.tables.pop(name, None)
+        longest = max((value - 1 for value in values if value != INVALID and value != DRAW), default=0)
+        print("%s: %d positions, longest mate %d plies, %.1fs" % (name, table.size, longest, time.time() - start_time))
+
+
+def _gameStateFromPlaced(placed, white_to_move):
+    board = [["--"] * 8 for _ in range(8)]
+    for piece, sq in placed:
+        board[sq // 8][sq % 8] = piece
+    ranks = []
+    for row in board:
+        rank = ""
+        empty = 0
+        for piece in row:
+            if piece == "--":
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += piece[1] if piece[0] == "w" else piece[1].lower()
+        ranks.append(rank + (str(empty) if empty else ""))
+    return ChessBitboard.BitboardGameState("/".join(ranks) + (" w" if white_to_move else " b") + " - - 0 1")
+
+
+def verify(tablebase, name, samples=2000):
+    """
+    Check random positions of a table against GameState move generation:
+    a win in n plies has a move to a loss in n - 1, a loss in n has only moves to wins in at most n - 1
+    (one of them exactly), a draw has no move to a loss and a move to a draw (or is stalemate).
+    """
+    table, data = tablebase._load(name)
+    errors = 0
+    checked = 0
+    while checked < samples:
+        index = random.randrange(table.size)
+        if data[HEADER.size + index] == INVALID:
+            continue
+        checked += 1
+        squares, side = table.decode(index)
+        game_state = _gameStateFromPlaced(list(zip(table.pieces, squares)), side == 0)
+        result = tablebase.probe(game_state)
+        children = []
+        for move in game_state.getValidMoves():
+            game_state.makeMove(move)
+            children.append(tablebase.probe(game_state))
+            game_state.undoMove()
+        kind, plies = result
+        if kind == WIN:
+            ok = (LOSS, plies - 1) in children
+        elif kind == LOSS:
+            ok = (plies == 0 and game_state.checkmate) or \
+                 (all(child[0] == WIN and child[1] <= plies - 1 for child in children) and
+                  any(child[1] == plies - 1 for child in children))
+        else:
+            ok = game_state.stalemate or (all(child[0] != LOSS for child in children) and
+                                          any(child[0] == DRAW for child in children))
+        if not ok:
+            errors += 1
+            print("mismatch", name, squares, side, result, children)
+    print("%s: checked %d positions, %d errors" % (name, checked, errors))
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate, verify or probe endgame tablebases.")
+    parser.add_argument("--dir", default=TABLEBASE_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate")
+    generate.add_argument("tables", nargs="*", default=list(DEFAULT_TABLES))
+    check = commands.add_parser("verify")
+    check.add_argument("tables", nargs="+")
+    check.add_argument("--samples", type=int, default=2000)
+    probe = commands.add_parser("probe")
+    probe.add_argument("--fen", required=True)
+    args = parser.parse_args()
+
+    tablebase = Tablebase(args.dir)
+    if args.command == "generate":
+        for name in args.tables:
+            table_count = len(name) - 1
+            if table_count > MAX_PIECES:
+                raise SystemExit("%s: at most %d pieces are supported" % (name, MAX_PIECES))
+            tablebase.generate(materialName(*name.split("v"))[0])
+    elif args.command == "verify":
+        errors = sum(verify(tablebase, name, args.samples) for name in args.tables)
+        raise SystemExit(1 if errors else 0)
+    else:
+        result = tablebase.probe(ChessBitboard.BitboardGameState(args.fen))
+        if result is None:
+            print("not in tablebase")
+        else:
+            print({WIN: "win", DRAW: "draw", LOSS: "loss"}[result[0]], "in %d plies" % result[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+"""
+Headless self-play tournament between two AI settings.
+Games run in a pool of worker processes, every opening is played twice with colors swapped,
+each finished game is written as one JSON line, and the result is reported as an Elo difference
+with a 95% confidence interval and an optional SPRT stop.
+A game that gives no result within --game-timeout seconds (hung or crashed worker) is recorded as an error.
+
+    python ChessTournament.py --engine depth=3 --engine depth=2 --games 200
+    python ChessTournament.py --engine depth=3 --engine depth=3,ordering=mvv_lva --sprt 0 10 --output games.jsonl
+    python ChessTournament.py --engine module=ChessAI --engine module=ChessAI_old,time=0.2
+
+An engine setting is a comma separated list of key=value:
+    module    module with findBestMove to play with (default ChessAI), e.g. a saved copy of an older version
+    depth     search depth per move, time  seconds per move (time wins if both are given)
+    ordering  name in ChessAI.MOVE_ORDERINGS, book / tablebase  0 to turn the opening book / tablebase off
+"""
+import argparse
+import importlib
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import time
+import traceback
+
+import ChessBitboard
+import ChessParallel
+
+MAX_PLIES = 400#quá số ply này thì xử hòa
+RESIGN_SCORE = 10#cả 2 bên cùng đánh giá chênh lệch ít nhất chừng này (tốt) ...
+RESIGN_MOVES = 4#... trong chừng này nước liên tiếp thì xử thắng
+FIFTY_MOVE_PLIES = 100
+GAME_TIMEOUT = 1800#số giây tối đa cho 1 ván, quá thì coi worker bị treo/chết
+POLL_INTERVAL = 0.1
+
+
+def parseEngine(text):
+    """
+    "depth=3,ordering=mvv_lva" -> {"name": text, "depth": 3, "ordering": "mvv_lva"}.
+    """
+    engine = {"name": text, "module": "ChessAI", "depth": None, "time": None, "ordering": "full",
+              "book": True, "tablebase": True}
+    for item in text.split(","):
+        key, _, value = item.partition("=")
+        if key not in engine or key == "name":
+            raise ValueError("unknown engine option %r in %r" % (key, text))
+        if key == "depth":
+            engine[key] = int(value)
+        elif key == "time":
+            engine[key] = float(value)
+        elif key in ("book", "tablebase"):
+            engine[key] = value not in ("0", "false", "no")
+        else:
+            engine[key] = value
+    return engine
+
+
+_engine_states = {}#trong tiến trình worker: tên engine -> (module, bảng chuyển vị riêng)
+
+
+def _searchMove(engine, game_state):
+    """
+    Ask an engine for a move with its own settings and its own transposition table.
+    """
+    if engine["name"] not in _engine_states:
+        module = importlib.import_module(engine["module"])
+        _engine_states[engine["name"]] = (module, module.TranspositionTable())
+    module, transposition_table = _engine_states[engine["name"]]
+    #các engine có thể dùng chung module nên đặt lại cấu hình trước mỗi nước đi
+    module.transposition_table = transposition_table
+    module.use_opening_book = engine["book"]
+    module.use_tablebase = engine["tablebase"]
+    module.move_ordering = module.MOVE_ORDERINGS[engine["ordering"]]
+    return_queue = queue.Queue()
+    module.findBestMove(game_state, game_state.getValidMoves(), return_queue, engine["time"], engine["depth"])
+    return return_queue.get()
+
+
+def _insufficientMaterial(game_state):
+    pieces = [piece for rank in game_state.board for piece in rank if piece != "--" and piece[1] != "K"]
+    return len(pieces) == 0 or (len(pieces) == 1 and pieces[0][1] in "BN")
+
+
+def playGame(task):
+    """
+    Play one game in a worker process. Returns a result dict; an exception inside the engines
+    is reported as result "error" instead of stopping the tournament.
+    """
+    game_number, opening, white, black, seed = task
+    random.seed(seed)
+    start_time = time.time()
+    moves = []
+    result = {"game": game_number, "opening": opening, "white": white["name"], "black": black["name"]}
+    try:
+        game_state = ChessParallel.positionFromMoves(opening)
+        repetitions = {game_state.zobrist_key: 1}
+        quiet_plies = 0#số ply từ lần ăn quân hoặc đi tốt gần nhất
+        scores = []#điểm mỗi nước, nhìn từ bên trắng
+        outcome = reason = None
+        while outcome is None:
+            valid_moves = game_state.getValidMoves()
+            if game_state.checkmate:
+                outcome, reason = ("0-1" if game_state.white_to_move else "1-0"), "checkmate"
+                break
+            if game_state.stalemate:
+                outcome, reason = "1/2-1/2", "stalemate"
+                break
+            engine = white if game_state.white_to_move else black
+            move, info = _searchMove(engine, game_state)
+            if move is None or move not in valid_moves:
+                raise RuntimeError("%s returned illegal move %s" % (engine["name"], move))
+            scores.append(info["score"] if game_state.white_to_move else -info["score"])
+            moves.append(move.getCoordinateNotation())
+            quiet_plies = 0 if move.is_capture or move.piece_moved[1] == "p" else quiet_plies + 1
+            game_state.makeMove(move)
+            repetitions[game_state.zobrist_key] = repetitions.get(game_state.zobrist_key, 0) + 1
+            #xử ván
+            if repetitions[game_state.zobrist_key] >= 3:
+                outcome, reason = "1/2-1/2", "repetition"
+            elif quiet_plies >= FIFTY_MOVE_PLIES:
+                outcome, reason = "1/2-1/2", "fifty moves"
+            elif _insufficientMaterial(game_state):
+                outcome, reason = "1/2-1/2", "insufficient material"
+            elif len(moves) >= MAX_PLIES:
+                outcome, reason = "1/2-1/2", "move limit"
+            elif len(scores) >= 2 * RESIGN_MOVES:
+                recent = scores[-2 * RESIGN_MOVES:]
+                if all(score >= RESIGN_SCORE for score in recent):
+                    outcome, reason = "1-0", "adjudicated"
+                elif all(score <= -RESIGN_SCORE for score in recent):
+                    outcome, reason = "0-1", "adjudicated"
+        result.update(result=outcome, reason=reason)
+    except Exception:
+        result.update(result="error", reason=traceback.format_exc(limit=3))
+    result.update(plies=len(moves), moves=" ".join(moves), time=round(time.time() - start_time, 2))
+    return result
+
+
+def randomOpenings(count, plies, seed):
+    """
+    Openings made of random legal moves from the start position (for more variety than the fixed set).
+    """
+    rng = random.Random(seed)
+    openings = []
+    while len(openings) < count:
+        game_state = ChessBitboard.BitboardGameState()
+        moves = []
+        for _ in range(plies):
+            valid_moves = game_state.getValidMoves()
+            if not valid_moves:
+                break
+            move = rng.choice(valid_moves)
+            moves.append(move.getCoordinateNotation())
+            game_state.makeMove(move)
+        if game_state.getValidMoves():
+            openings.append(" ".join(moves))
+    return openings
+
+
+def eloFromScore(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return 400 * math.log10(score / (1 - score))#không ra -0.0 khi score = 0.5
+
+
+def eloStats(wins, draws, losses):
+    """
+    (elo, lower, upper) of the first engine: the Elo difference and its 95% confidence interval.
+    The interval is unbounded while the sample variance is 0 (no games, only draws, only wins...).
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, -math.inf, math.inf
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:#mọi ván cùng kết quả: chưa ước lượng được độ chính xác
+        return eloFromScore(score), -math.inf, math.inf
+    margin = 1.96 * math.sqrt(variance / games)
+    return eloFromScore(score), eloFromScore(score - margin), eloFromScore(score + margin)
+
+
+def sprtLLR(wins, draws, losses, elo0, elo1):
+    """
+    Log-likelihood ratio of H1 (elo = elo1) against H0 (elo = elo0), normal approximation.
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance == 0:
+        return 0.0
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return (score1 - score0) * (2 * score - score0 - score1) * games / (2 * variance)
+
+
+def runTournament(engines, openings, games, workers, output, sprt=None, alpha=0.05, beta=0.05, seed=0,
+                  game_timeout=GAME_TIMEOUT):
+    """
+    Play up to games games of engines[0] against engines[1] and print the running score.
+    sprt=(elo0, elo1) stops as soon as the test accepts one of the hypotheses.
+    Only one game per worker is queued, so each game's time is counted from when it starts. A game without
+    a result after game_timeout seconds is an error; the pool is then replaced (a hung worker cannot be
+    stopped alone) and the other running games are started again.
+    """
+    tasks = []
+    for game_number in range(games):
+        opening = openings[game_number // 2 % len(openings)]
+        if game_number % 2 == 0:#mỗi khai cuộc đánh 2 ván, đổi màu quân
+            white, black = engines
+        else:
+            black, white = engines
+        tasks.append((game_number, opening, white, black, seed * 1000003 + game_number))
+    wins = draws = losses = errors = 0
+    lower_bound = math.log(beta / (1 - alpha))
+    upper_bound = math.log((1 - beta) / alpha)
+    start_time = time.time()
+    pool = multiprocessing.Pool(workers, maxtasksperchild=50)
+    pending = {}#game_number -> (AsyncResult, thời điểm bắt đầu, task)
+    next_task = 0
+    try:
+        while next_task < len(tasks) or pending:
+            while next_task < len(tasks) and len(pending) < workers:
+                task = tasks[next_task]
+                pending[task[0]] = (pool.apply_async(playGame, (task,)), time.time(), task)
+                next_task += 1
+            finished = []
+            hung = False
+            for game_number, (async_result, game_start, task) in list(pending.items()):
+                if async_result.ready():
+                    try:
+                        result = async_result.get()
+                    except Exception:#lỗi ngoài playGame (vd. không pickle được)
+                        result = {"game": game_number, "result": "error", "reason": traceback.format_exc(limit=3)}
+                elif time.time() - game_start > game_timeout:
+                    result = {"game": game_number, "result": "error",
+                              "reason": "no result after %.0fs: worker hung or died" % game_timeout}
+                    hung = True
+                else:
+                    continue
+                result.setdefault("opening", task[1])
+                result.setdefault("white", task[2]["name"])
+                result.setdefault("black", task[3]["name"])
+                del pending[game_number]
+                finished.append(result)
+            if hung:#không dừng riêng được 1 worker: thay cả pool, chơi lại các ván đang dở
+                pool.terminate()
+                pool.join()
+                pool = multiprocessing.Pool(workers, maxtasksperchild=50)
+                for game_number, (_, _, task) in list(pending.items()):
+                    pending[game_number] = (pool.apply_async(playGame, (task,)), time.time(), task)
+            if not finished:
+                time.sleep(POLL_INTERVAL)
+            for result in finished:
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+                first_is_white = result["white"] == engines[0]["name"]
+                if result["result"] == "error":
+                    errors += 1
+                    print("game %d error:\n%s" % (result["game"], result["reason"]), file=sys.stderr)
+                elif result["result"] == "1/2-1/2":
+                    draws += 1
+                elif (result["result"] == "1-0") == first_is_white:
+                    wins += 1
+                else:
+                    losses += 1
+                elo, low, high = eloStats(wins, draws, losses)
+                line = "games=%d +%d =%d -%d errors=%d elo=%.1f [%.1f, %.1f] time=%.0fs" % (
+                    wins + draws + losses, wins, draws, losses, errors, elo, low, high, time.time() - start_time)
+                if sprt is not None:
+                    llr = sprtLLR(wins, draws, losses, *sprt)
+                    line += " llr=%.2f [%.2f, %.2f]" % (llr, lower_bound, upper_bound)
+                    if llr >= upper_bound or llr <= lower_bound:
+                        print(line)
+                        print("SPRT: %s accepted" % ("H1" if llr >= upper_bound else "H0"))
+                        return wins, draws, losses
+                print(line)
+    finally:
+        pool.terminate()
+        pool.join()
+    return wins, draws, losses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Self-play tournament between two AI settings.")
+    parser.add_argument("--engine", action="append", required=True, help="engine setting, give it twice")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--random-openings", type=int, default=0,
+                        help="use this many random openings instead of the fixed benchmark openings")
+    parser.add_argument("--opening-plies", type=int, default=6, help="length of the random openings")
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"))
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--game-timeout", type=float, default=GAME_TIMEOUT,
+                        help="seconds after which a game without result is recorded as an error")
+    parser.add_argument("--output", help="JSON lines file for the finished games (default: not saved)")
+    args = parser.parse_args()
+    if len(args.engine) != 2:
+        parser.error("give exactly two --engine settings")
+    engines = [parseEngine(text) for text in args.engine]
+    if engines[0]["name"] == engines[1]["name"]:
+        parser.error("the two engine settings are identical")
+    if args.random_openings:
+        openings = randomOpenings(args.random_openings, args.opening_plies, args.seed)
+    else:
+        openings = list(ChessParallel.BENCHMARK_POSITIONS.values())
+    output = open(args.output, "a") if args.output else open(os.devnull, "w")
+    with output:
+        runTournament(engines, openings, args.games, args.workers, output, args.sprt, args.alpha, args.beta,
+                      args.seed, args.game_timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+"""
+Texel tuning of the evaluation weights in ChessWeights.
+The evaluation is linear in the weights (piece values + piece-square tables), so for a set of positions
+labeled with the game result it minimizes the mean squared error between the result and
+sigmoid(scale * eval) by gradient descent (Adam), with the batch evaluation of ChessBatchEval.
+The positions are put in shared memory once and every worker process computes the loss and gradient
+of its slices.
+
+    python ChessTune.py extract games.pgn [more.pgn ...] -o positions.txt
+    python ChessTune.py tune positions.txt -o ChessWeightsTuned.py --epochs 300
+    (check the new weights with ChessTournament.py, then copy the file over ChessWeights.py)
+
+A position file has one position per line: a FEN or EPD followed by the result from white's view,
+"1-0", "0-1", "1/2-1/2" or a number between 0 and 1 (quotes, brackets and ';' around it are ignored).
+"""
+import argparse
+import math
+import multiprocessing
+import sys
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import ChessBatchEval
+import ChessPGN
+import ChessWeights
+
+PIECE_TYPES = ("Q", "R", "B", "N", "p")#vua không có giá trị và bảng vị trí
+TABLE_NAMES = {"Q": "queen_scores", "R": "rook_scores", "B": "bishop_scores", "N": "knight_scores",
+               "p": "pawn_scores"}
+PARAMETER_COUNT = len(PIECE_TYPES) * 65#mỗi loại quân: 1 giá trị vật chất + 64 ô
+RESULT_VALUES = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+SQUARES = np.arange(64)
+CHUNK_SIZE = 1 << 18#số thế cờ mỗi task
+
+
+def buildParameterMatrix():
+    """
+    (13 * 64) x PARAMETER_COUNT matrix M with ChessBatchEval value table = M @ weights (in pawns).
+    Black pieces use the table mirrored vertically and count negative, like ChessWeights.piece_position_scores.
+    """
+    matrix = np.zeros((len(ChessBatchEval.PIECES) + 1, 64, PARAMETER_COUNT))
+    for piece, code in ChessBatchEval.PIECE_CODES.items():
+        if piece == "--" or piece[1] == "K":
+            continue
+        index = PIECE_TYPES.index(piece[1]) * 65
+        sign = 1 if piece[0] == "w" else -1
+        for row in range(8):
+            table_row = row if piece[0] == "w" else 7 - row
+            for col in range(8):
+                matrix[code, row * 8 + col, index] = sign
+                matrix[code, row * 8 + col, index + 1 + table_row * 8 + col] = sign
+    return matrix.reshape(-1, PARAMETER_COUNT)
+
+
+def weightsToVector(weights):
+    vector = np.zeros(PARAMETER_COUNT)
+    for index, piece_type in enumerate(PIECE_TYPES):
+        vector[index * 65] = weights.piece_score[piece_type]
+        vector[index * 65 + 1:index * 65 + 65] = np.array(getattr(weights, TABLE_NAMES[piece_type])).ravel()
+    return vector
+
+
+def writeWeightsModule(path, vector):
+    """
+    Write the weights as a module in the format of ChessWeights.py.
+    """
+    piece_score = {"K": 0}
+    piece_score.update((piece_type, round(float(vector[index * 65]), 2)) for index, piece_type in
+                       enumerate(PIECE_TYPES))
+    lines = ['"""', "Evaluation weights.",
+             "Material value of every piece type and piece-square tables used by the AI and by GameState.",
+             "Tuned by ChessTune.py.", '"""', "",
+             "piece_score = {%s}" % ", ".join('"%s": %r' % item for item in piece_score.items()), "", ""]
+    for piece_type in ("N", "B", "R", "Q", "p"):#cùng thứ tự với ChessWeights.py
+        table = vector[PIECE_TYPES.index(piece_type) * 65 + 1:PIECE_TYPES.index(piece_type) * 65 + 65]
+        name = TABLE_NAMES[piece_type]
+        for row in range(8):
+            values = ", ".join(repr(round(float(value), 2)) for value in table[row * 8:row * 8 + 8])
+            prefix = name + " = [" if row == 0 else " " * (len(name) + 4)
+            lines.append(prefix + "[" + values + "]" + ("]" if row == 7 else ","))
+        lines.append("")
+    lines.append('piece_position_scores = {"wN": knight_scores,')
+    for piece, name in (("bN", "knight_scores[::-1]"), ("wB", "bishop_scores"), ("bB", "bishop_scores[::-1]"),
+                        ("wQ", "queen_scores"), ("bQ", "queen_scores[::-1]"), ("wR", "rook_scores"),
+                        ("bR", "rook_scores[::-1]"), ("wp", "pawn_scores")):
+        lines.append('                         "%s": %s,' % (piece, name))
+    lines.append('                         "bp": pawn_scores[::-1]}')
+    with open(path, "w", newline="\r\n") as weights_file:#các file .py của dự án dùng CRLF
+        weights_file.write("\n".join(lines) + "\n")
+
+
+def parseResult(text):
+    token = text.strip().strip(";[]\"'()")
+    if token in RESULT_VALUES:
+        return RESULT_VALUES[token]
+    value = float(token)
+    if not 0 <= value <= 1:
+        raise ValueError("result out of range: " + text)
+    return value
+
+
+def loadPositions(path):
+    """
+    (codes, results): N x 64 piece codes and the N results of a position file.
+    """
+    code_batches = []
+    results = []
+    fens = []
+    with open(path) as positions_file:
+        for line in positions_file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fen, _, result = line.rpartition(" ")
+            results.append(parseResult(result))
+            fens.append(fen)
+            if len(fens) == ChessBatchEval.BATCH_SIZE:
+                code_batches.append(ChessBatchEval.encodeFENs(fens))
+                fens = []
+    if fens:
+        code_batches.append(ChessBatchEval.encodeFENs(fens))
+    if not results:
+        raise ValueError("no positions in " + path)
+    return np.concatenate(code_batches), np.array(results)
+
+
+def extractPositions(pgn_paths, output, skip_plies=8, every=1):
+    """
+    Write FEN + result of positions from finished PGN games, for tuning.
+    The first skip_plies plies (opening book) are skipped, and positions in check or right after a capture
+    are left out because the static evaluation of such positions does not mean much.
+    """
+    positions = 0
+    for path in pgn_paths:
+        for headers, sans in ChessPGN.readGames(path):
+            result = headers.get("Result")
+            if result not in RESULT_VALUES:
+                continue
+            try:
+                previous_capture = False
+                for ply, (game_state, move) in enumerate(ChessPGN.iterPositions(headers, sans)):
+                    if ply >= skip_plies and ply % every == 0 and not previous_capture and not game_state.inCheck():
+                        output.write("%s %s\n" % (game_state.getFEN(), result))
+                        positions += 1
+                    previous_capture = move.is_capture
+            except ValueError:#nước đi không hợp lệ: bỏ phần còn lại của ván
+                continue
+    return positions
+
+
+_codes = None#trong tiến trình worker: view tới dữ liệu trong shared memory
+_results = None
+_shared_memory = []
+
+
+def _initWorker(codes_name, results_name, count):
+    global _codes, _results
+    codes_memory = shared_memory.SharedMemory(name=codes_name)
+    results_memory = shared_memory.SharedMemory(name=results_name)
+    _shared_memory[:] = [codes_memory, results_memory]#giữ tham chiếu, không thì buffer bị đóng
+    _codes = np.ndarray((count, 64), dtype=np.uint8, buffer=codes_memory.buf)
+    _results = np.ndarray((count,), dtype=np.float64, buffer=results_memory.buf)
+
+
+def _sliceLossAndGradient(task):
+    """
+    Sum of squared errors and its gradient with respect to the value table, for positions start:end.
+    """
+    start, end, value_table, scale, with_gradient = task
+    codes = _codes[start:end]
+    scores = value_table[codes, SQUARES].sum(axis=1)
+    predictions = 1 / (1 + np.exp(-scale * scores))
+    errors = predictions - _results[start:end]
+    loss = float(np.dot(errors, errors))
+    if not with_gradient:
+        return loss, None
+    #d(loss)/d(score) của từng thế cờ, cộng dồn vào ô (mã quân, ô) của các quân trên bàn cờ
+    score_gradient = 2 * errors * predictions * (1 - predictions) * scale
+    flat_indices = codes.astype(np.intp) * 64 + SQUARES
+    gradient = np.bincount(flat_indices.ravel(), weights=np.repeat(score_gradient, 64),
+                           minlength=value_table.size)
+    return loss, gradient
+
+
+class Tuner:
+    """
+    Holds the positions in shared memory and the worker pool; lossAndGradient works on the whole set.
+    """
+
+    def __init__(self, codes, results, workers):
+        self.count = len(results)
+        self.memory = [shared_memory.SharedMemory(create=True, size=max(codes.nbytes, 1)),
+                       shared_memory.SharedMemory(create=True, size=max(results.nbytes, 1))]
+        np.ndarray(codes.shape, dtype=np.uint8, buffer=self.memory[0].buf)[:] = codes
+        np.ndarray(results.shape, dtype=np.float64, buffer=self.memory[1].buf)[:] = results
+        init_args = (self.memory[0].name, self.memory[1].name, self.count)
+        if workers > 1:
+            self.pool = multiprocessing.Pool(workers, _initWorker, init_args)
+        else:
+            self.pool = None
+            _initWorker(*init_args)
+        self.slices = [(start, min(start + CHUNK_SIZE, self.count)) for start in range(0, self.count, CHUNK_SIZE)]
+        self.matrix = buildParameterMatrix()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+        for memory in self.memory:
+            memory.close()
+            memory.unlink()
+
+    def lossAndGradient(self, vector, scale, with_gradient=True):
+        """
+        Mean squared error of the weights vector and its gradient (None if not with_gradient).
+        """
+        value_table = (self.matrix @ vector).reshape(-1, 64)
+        tasks = [(start, end, value_table, scale, with_gradient) for start, end in self.slices]
+        parts = self.pool.map(_sliceLossAndGradient, tasks) if self.pool is not None else \
+            [_sliceLossAndGradient(task) for task in tasks]
+        loss = sum(part[0] for part in parts) / self.count
+        if not with_gradient:
+            return loss, None
+        return loss, self.matrix.T @ (sum(part[1] for part in parts) / self.count)
+
+    def fitScale(self, vector):
+        """
+        The sigmoid scale with the lowest loss for these weights (ternary search, the loss is unimodal in it).
+        """
+        low, high = 0.01, 5.0
+        for _ in range(40):
+            left = low + (high - low) / 3
+            right = high - (high - low) / 3
+            if self.lossAndGradient(vector, left, False)[0] < self.lossAndGradient(vector, right, False)[0]:
+                high = right
+            else:
+                low = left
+        return (low + high) / 2
+
+    def tune(self, vector, scale, epochs, learning_rate):
+        """
+        Adam on the full data set. Returns the weights with the lowest loss seen.
+        """
+        moment = np.zeros_like(vector)
+        velocity = np.zeros_like(vector)
+        best_vector, best_loss = vector.copy(), math.inf
+        for epoch in range(1, epochs + 1):
+            start_time = time.time()
+            loss, gradient = self.lossAndGradient(vector, scale)
+            if loss < best_loss:
+                best_vector, best_loss = vector.copy(), loss
+            moment = 0.9 * moment + 0.1 * gradient
+            velocity = 0.999 * velocity + 0.001 * gradient * gradient
+            step = moment / (1 - 0.9 ** epoch) / (np.sqrt(velocity / (1 - 0.999 ** epoch)) + 1e-8)
+            vector = vector - learning_rate * step
+            print("epoch=%d loss=%.6f time=%.2fs" % (epoch, loss, time.time() - start_time))
+        loss = self.lossAndGradient(vector, scale, False)[0]
+        if loss < best_loss:
+            best_vector, best_loss = vector, loss
+        return best_vector, best_loss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the evaluation weights on labeled positions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    extract = commands.add_parser("extract", help="write labeled positions from PGN games")
+    extract.add_argument("pgn", nargs="+")
+    extract.add_argument("-o", "--output", required=True)
+    extract.add_argument("--skip-plies", type=int, default=8)
+    extract.add_argument("--every", type=int, default=1, help="keep only every n-th ply")
+    tune = commands.add_parser("tune", help="tune the weights and write a new weights module")
+    tune.add_argument("positions")
+    tune.add_argument("-o", "--output", default="ChessWeightsTuned.py")
+    tune.add_argument("--epochs", type=int, default=200)
+    tune.add_argument("--learning-rate", type=float, default=0.01)
+    tune.add_argument("--scale", type=float, help="sigmoid scale (default: fitted to the current weights)")
+    tune.add_argument("--workers", type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    if args.command == "extract":
+        with open(args.output, "w") as output:
+            positions = extractPositions(args.pgn, output, args.skip_plies, args.every)
+        print("positions=%d" % positions)
+        return
+    codes, results = loadPositions(args.positions)
+    print("positions=%d" % len(results))
+    tuner = Tuner(codes, results, args.workers)
+    try:
+        vector = weightsToVector(ChessWeights)
+        scale = args.scale if args.scale is not None else tuner.fitScale(vector)
+        start_loss = tuner.lossAndGradient(vector, scale, False)[0]
+        print("scale=%.4f loss=%.6f" % (scale, start_loss))
+        vector, loss = tuner.tune(vector, scale, args.epochs, args.learning_rate)
+    finally:
+        tuner.close()
+    writeWeightsModule(args.output, vector)
+    print("loss %.6f -> %.6f, weights written to %s" % (start_loss, loss, args.output), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+UCI front end: lets match managers and test tools (cutechess-cli, Arena, python-chess...) run ChessAI
+without the pygame window.
+The search runs in a background thread so "stop", "isready" and "quit" are answered while it searches.
+The Threads option only applies to fixed depth searches ("go depth N"); searches with a time limit
+or "go infinite" use one thread.
+
+    python ChessUCI.py
+"""
+import queue
+import sys
+import threading
+
+import ChessAI
+import ChessBitboard
+import ChessEngine
+import ChessParallel
+
+ENGINE_NAME = "Chess5"
+ENGINE_AUTHOR = "Chess5 developers"
+MAX_HASH_MB = 4096
+MAX_THREADS = 64
+MOVES_TO_GO = 30#số nước ước lượng còn lại khi GUI không gửi movestogo
+MOVE_OVERHEAD = 0.05#giây dự phòng cho độ trễ giao tiếp với GUI
+
+
+class UciEngine:
+    """
+    State of one UCI session: the position set by "position" and the search thread started by "go".
+    """
+
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.fen = ChessEngine.START_FEN
+        self.moves = []#nước đi dạng tọa độ sau self.fen
+        self.threads = 1
+        self.search_thread = None
+        self.stop_event = threading.Event()
+
+    def send(self, line):
+        with self.output_lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def newGameState(self, fen=None, moves=None):
+        """
+        A fresh GameState of the current position (or of fen and moves), owned by the search thread.
+        """
+        game_state = ChessBitboard.BitboardGameState(self.fen if fen is None else fen)
+        for text in self.moves if moves is None else moves:
+            move = next((move for move in game_state.getValidMoves() if move.getCoordinateNotation() == text), None)
+            if move is None:
+                raise ValueError("illegal move " + text)
+            game_state.makeMove(move)
+        return game_state
+
+    def formatScore(self, score, pv_length):
+        if abs(score) >= ChessAI.CHECKMATE:#điểm chiếu hết không có số nước: ước lượng theo độ dài pv
+            return "mate %d" % ((pv_length + 1) // 2 if score > 0 else -(pv_length // 2))
+        return "cp %d" % round(score * 100)
+
+    def sendInfo(self, game_state, iteration):
+        move = iteration["move"]
+        pv = []
+        if move is not None:
+            game_state.makeMove(move)
+            pv = [move] + ChessAI.getPrincipalVariation(game_state, iteration["depth"] - 1)
+            game_state.undoMove()
+        nodes = iteration["nodes"] + iteration["quiescence_nodes"]
+        elapsed = max(iteration["time"], 1e-6)
+        self.send("info depth %d score %s nodes %d nps %d time %d pv %s" %
+                  (iteration["depth"], self.formatScore(iteration["score"], len(pv)), nodes, nodes / elapsed,
+                   elapsed * 1000, " ".join(move.getCoordinateNotation() for move in pv)))
+
+    def timeLimit(self, options, white_to_move):
+        """
+        Seconds for this move from the "go" options, or None for no time limit.
+        """
+        if "movetime" in options:
+            return max(options["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+        remaining = options.get("wtime" if white_to_move else "btime")
+        if remaining is None:
+            return None
+        increment = options.get("winc" if white_to_move else "binc", 0)
+        moves_to_go = options.get("movestogo", MOVES_TO_GO)
+        budget = remaining / moves_to_go + increment * 0.8
+        return max(min(budget, remaining / 2) / 1000 - MOVE_OVERHEAD, 0.01)
+
+    def findMove(self, game_state, options):
+        """
+        Search the position with the "go" options. Returns the move, or None without legal moves.
+        """
+        valid_moves = game_state.getValidMoves()
+        if not valid_moves:
+            self.send("info string no legal moves")
+            return None
+        infinite = "infinite" in options
+        time_limit = None if infinite else self.timeLimit(options, game_state.white_to_move)
+        max_depth = options.get("depth")
+        if max_depth is None and (time_limit is not None or infinite):
+            max_depth = ChessAI.MAX_DEPTH
+        if max_depth is not None:
+            max_depth = min(max(max_depth, 1), ChessAI.MAX_DEPTH)
+        return_queue = queue.Queue()
+        if self.threads > 1 and time_limit is None and not infinite:
+            #tìm song song chỉ hỗ trợ độ sâu cố định
+            ChessParallel.findBestMoveParallel(game_state, valid_moves, return_queue, self.threads, max_depth,
+                                               self.stop_event)
+            move, info = return_queue.get()
+            self.sendInfo(game_state, dict(info, move=move))
+        else:
+            ChessAI.findBestMove(game_state, valid_moves, return_queue, time_limit, max_depth, self.stop_event,
+                                 lambda iteration: self.sendInfo(game_state, iteration))
+            move, info = return_queue.get()
+        return move if move is not None else valid_moves[0]
+
+    def search(self, game_state, options):
+        """
+        Body of the search thread: search and send "bestmove", also when the search fails.
+        """
+        root_ply = len(game_state.move_log)
+        try:
+            move = self.findMove(game_state, options)
+        except Exception as error:#GUI luôn chờ bestmove: lỗi trong lúc tìm không được làm mất nó
+            self.send("info string error: %r" % error)
+            move = None
+            try:#trả thế cờ về gốc rồi đi nước hợp lệ đầu tiên
+                while len(game_state.move_log) > root_ply:
+                    game_state.undoMove()
+                valid_moves = game_state.getValidMoves()
+                move = valid_moves[0] if valid_moves else None
+            except Exception:
+                pass
+        if "infinite" in options:#"go infinite": bestmove chỉ được gửi sau "stop"
+            self.stop_event.wait()
+        self.send("bestmove " + (move.getCoordinateNotation() if move is not None else "0000"))
+
+    def go(self, tokens):
+        self.stopSearch()
+        options = {}
+        index = 0
+        while index < len(tokens):
+            token = tokens[index]
+            if token in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes", "mate"):
+                if index + 1 < len(tokens):
+                    options[token] = int(tokens[index + 1])
+                index += 2
+            else:
+                options[token] = True#infinite, ponder
+                index += 1
+        try:
+            game_state = self.newGameState()
+        except Exception as error:#không dựng được thế cờ: vẫn phải trả lời bestmove
+            self.send("info string error: %s" % error)
+            self.send("bestmove 0000")
+            return
+        self.stop_event = threading.Event()
+        self.search_thread = threading.Thread(target=self.search, args=(game_state, options), daemon=True)
+        self.search_thread.start()
+
+    def stopSearch(self):
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    def position(self, tokens):
+        if tokens[:1] == ["startpos"]:
+            fen = ChessEngine.START_FEN
+            rest = tokens[1:]
+        elif tokens[:1] == ["fen"]:
+            end = tokens.index("moves") if "moves" in tokens else len(tokens)
+            fen = " ".join(tokens[1:end])
+            rest = tokens[end:]
+        else:
+            raise ValueError("position needs startpos or fen")
+        moves = rest[1:] if rest[:1] == ["moves"] else []
+        self.newGameState(fen, moves)#báo lỗi ngay nếu FEN hoặc nước đi sai, giữ lại thế cờ hợp lệ trước đó
+        self.fen = fen
+        self.moves = moves
+
+    def setOption(self, tokens):
+        #setoption name <tên có thể nhiều từ> value <giá trị>
+        if "value" in tokens:
+            name = " ".join(tokens[1:tokens.index("value")]).lower()
+            value = " ".join(tokens[tokens.index("value") + 1:])
+        else:
+            name, value = " ".join(tokens[1:]).lower(), ""
+        if name == "hash":
+            ChessAI.transposition_table = ChessAI.TranspositionTable(min(max(int(value), 1), MAX_HASH_MB))
+        elif name == "threads":
+            self.threads = min(max(int(value), 1), MAX_THREADS)
+            if self.threads > 1:
+                #tạo pool ở luồng chính: fork từ luồng tìm kiếm trong lúc luồng chính đang đọc stdin
+                #làm tiến trình con bị treo khi đóng stdin
+                ChessParallel.getPool(self.threads)
+                self.send("info string Threads is only used by fixed depth searches (go depth)")
+        elif name == "ownbook":
+            ChessAI.use_opening_book = value.lower() == "true"
+        elif name == "clear hash":
+            ChessAI.transposition_table.clear()
+        else:
+            self.send("info string unknown option " + name)
+
+    def handle(self, line):
+        """
+        Run one command line. Returns False on "quit".
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name Hash type spin default %d min 1 max %d" % (ChessAI.HASH_SIZE_MB, MAX_HASH_MB))
+            self.send("option name Threads type spin default 1 min 1 max %d" % MAX_THREADS)
+            self.send("option name OwnBook type check default true")
+            self.send("option name Clear Hash type button")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            ChessAI.transposition_table.clear()
+        elif command == "position":
+            self.stopSearch()
+            self.position(tokens[1:])
+        elif command == "go":
+            self.go(tokens[1:])
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "ponderhit":
+            self.stopSearch()
+        elif command == "setoption":
+            self.stopSearch()
+            self.setOption(tokens[1:])
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        else:
+            self.send("info string unknown command " + command)
+        return True
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        try:
+            if not engine.handle(line):
+                break
+        except (ValueError, IndexError) as error:#lệnh sai không được làm dừng engine
+            engine.send("info string error: %s" % error)
+    engine.stopSearch()
+    ChessParallel.shutdownPools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Long-lived AI search workers.
+Each worker process keeps its own copy of every game it serves, so the UI only sends
+move ids instead of pickling the whole GameState, and the transposition table stays warm between moves.
+Search results also carry the expected reply of the opponent ("ponder_move"), so the caller can
+search that reply with startPonder while the opponent is still thinking.
+A command that fails (e.g. an illegal move id) does not stop the worker: the search requests of that game
+answer with info["error"] and no move until the game is resynchronized with setPosition.
+"""
+import itertools
+import queue
+from multiprocessing import Array, Process, Queue
+
+import ChessAI
+import ChessBitboard
+
+
+CANCEL_SLOTS = 64#số request bị hủy gần nhất mà mỗi worker nhớ được
+
+
+class _CancelToken:
+    """
+    is_set() is true once the parent wrote this request id into its slot of the shared cancel array.
+    A plain Event would need resetting between searches, which races with a late cancel.
+    """
+
+    def __init__(self, cancelled, request_id):
+        self.cancelled = cancelled
+        self.request_id = request_id
+
+    def is_set(self):
+        return self.cancelled[self.request_id % CANCEL_SLOTS] == self.request_id
+
+
+def _findMoveById(game_state, move_id):
+    for move in game_state.getValidMoves():
+        if move.moveID == move_id:
+            return move
+    raise ValueError("move id %s is not legal in this position" % move_id)
+
+
+def _workerLoop(command_queue, result_queue, cancelled, hash_size_mb):
+    """
+    Main loop of a worker process: apply position updates and run searches until "quit".
+    """
+    ChessAI.transposition_table = ChessAI.TranspositionTable(hash_size_mb)
+    games = {}#game_id -> GameState của ván đó trong tiến trình này
+    errors = {}#game_id -> lỗi làm bản sao ván cờ không còn đúng, xóa khi "sync" thành công
+    while True:
+        command = command_queue.get()
+        name = command[0]
+        if name == "quit":
+            break
+        try:
+            _runCommand(command, games, errors, result_queue, cancelled)
+        except Exception as error:#một lệnh lỗi không được làm chết worker
+            message = "%s %s: %r" % (name, command[1:3], error)
+            if name in ("search", "ponder"):
+                result_queue.put((command[2], None, {"error": message}))
+            elif len(command) > 1:
+                errors[command[1]] = message
+
+
+def _runCommand(command, games, errors, result_queue, cancelled):
+    """
+    Run one command of _workerLoop. Exceptions are handled by the caller.
+    """
+    name = command[0]
+    if name == "new":
+        games[command[1]] = ChessBitboard.BitboardGameState()
+        errors.pop(command[1], None)
+    elif name == "close":
+        games.pop(command[1], None)
+        errors.pop(command[1], None)
+    elif name == "push":
+        game_state = games[command[1]]
+        game_state.makeMove(_findMoveById(game_state, command[2]))
+    elif name == "pop":
+        games[command[1]].undoMove()
+    elif name == "sync":#đặt lại ván từ đầu theo danh sách move id
+        game_state = ChessBitboard.BitboardGameState()
+        for move_id in command[2]:
+            game_state.makeMove(_findMoveById(game_state, move_id))
+        games[command[1]] = game_state
+        errors.pop(command[1], None)
+    elif name in ("search", "ponder"):
+        _, game_id, request_id, time_limit, max_depth, ponder_move_id = command
+        if game_id in errors:#bản sao ván cờ đã sai từ một lệnh trước
+            result_queue.put((request_id, None, {"error": errors[game_id]}))
+            return
+        game_state = games[game_id]
+        return_queue = queue.Queue()
+        cancel_token = _CancelToken(cancelled, request_id)
+        if cancel_token.is_set():#đã bị hủy khi còn trong hàng đợi
+            return
+        root_ply = len(game_state.move_log)
+        try:
+            if ponder_move_id is not None:#tìm trước cho thế cờ sau nước đi dự đoán của đối thủ
+                game_state.makeMove(_findMoveById(game_state, ponder_move_id))
+            ChessAI.findBestMove(game_state, game_state.getValidMoves(), return_queue, time_limit, max_depth,
+                                 stop=cancel_token)
+            move, info = return_queue.get()
+            info["cancelled"] = cancel_token.is_set()
+            info["ponder_move"] = None#nước trả lời mà thế cờ trong bảng băm dự đoán cho đối thủ
+            if move is not None:
+                game_state.makeMove(move)
+                reply = ChessAI.getPrincipalVariation(game_state, 1)
+                game_state.undoMove()
+                if reply:
+                    info["ponder_move"] = reply[0].moveID
+        finally:#kể cả khi lỗi, trả ván cờ về thế cờ trước lệnh
+            while len(game_state.move_log) > root_ply:
+                game_state.undoMove()
+        result_queue.put((request_id, move.moveID if move is not None else None, info))
+
+
+class SearchWorkerPool:
+    """
+    A pool of persistent search processes shared by several games.
+    Every game is pinned to one worker, which keeps that game's position in sync with
+    pushMove/popMove/setPosition and answers startSearch requests with a move id.
+    """
+
+    def __init__(self, workers=1, hash_size_mb=ChessAI.HASH_SIZE_MB):
+        self.workers = []
+        self.result_queue = Queue()
+        for _ in range(workers):
+            command_queue = Queue()
+            cancelled = Array("q", CANCEL_SLOTS, lock=False)
+            process = Process(target=_workerLoop, args=(command_queue, self.result_queue, cancelled, hash_size_mb),
+                              daemon=True)
+            process.start()
+            self.workers.append((process, command_queue, cancelled))
+        self.game_workers = {}#game_id -> chỉ số worker
+        self.request_workers = {}#request_id -> chỉ số worker, cho các lần tìm chưa có kết quả
+        self.results = {}#request_id -> (move_id, info) đã nhận nhưng chưa được lấy
+        self.game_ids = itertools.count(1)
+        self.request_ids = itertools.count(1)
+        self.next_worker = 0
+
+    def _send(self, game_id, command):
+        self.workers[self.game_workers[game_id]][1].put(command)
+
+    def newGame(self, moves=()):
+        """
+        Register a game, optionally starting from a list of moves already played. Returns its id.
+        """
+        game_id = next(self.game_ids)
+        self.game_workers[game_id] = self.next_worker
+        self.next_worker = (self.next_worker + 1) % len(self.workers)
+        self._send(game_id, ("new", game_id))
+        if moves:
+            self.setPosition(game_id, moves)
+        return game_id
+
+    def closeGame(self, game_id):
+        self._send(game_id, ("close", game_id))
+        del self.game_workers[game_id]
+
+    def pushMove(self, game_id, move):
+        self._send(game_id, ("push", game_id, move.moveID))
+
+    def popMove(self, game_id):
+        self._send(game_id, ("pop", game_id))
+
+    def setPosition(self, game_id, moves):
+        """
+        Resynchronize the worker's copy with the given move list (e.g. game_state.move_log).
+        """
+        self._send(game_id, ("sync", game_id, [move.moveID for move in moves]))
+
+    def startSearch(self, game_id, time_limit=None, max_depth=None):
+        """
+        Start searching the game's current position. Returns a request id for poll/cancel.
+        """
+        request_id = next(self.request_ids)
+        self.request_workers[request_id] = self.game_workers[game_id]
+        self._send(game_id, ("search", game_id, request_id, time_limit, max_depth, None))
+        return request_id
+
+    def startPonder(self, game_id, move_id, time_limit=None, max_depth=None):
+        """
+        Search the position after the opponent's expected reply move_id (usually the "ponder_move"
+        of the last result) without changing the game. Returns a request id for poll/cancel.
+        If the opponent plays move_id, pushMove it and poll this request instead of starting a new search;
+        otherwise cancel it. Either way the worker's transposition table keeps what was found.
+        """
+        request_id = next(self.request_ids)
+        self.request_workers[request_id] = self.game_workers[game_id]
+        self._send(game_id, ("ponder", game_id, request_id, time_limit, max_depth, move_id))
+        return request_id
+
+    def cancel(self, request_id):
+        """
+        Stop a running or queued search. The worker stays alive; its result is discarded.
+        """
+        worker = self.request_workers.pop(request_id, None)
+        if worker is not None:
+            self.workers[worker][2][request_id % CANCEL_SLOTS] = request_id
+        self.results.pop(request_id, None)
+
+    def poll(self, request_id, timeout=0):
+        """
+        Return (move_id, info) when the search has finished, else None.
+        If the worker could not search, move_id is None and info only has "error".
+        """
+        self._drainResults(timeout if request_id not in self.results else 0)
+        return self.results.pop(request_id, None)
+
+    def _drainResults(self, timeout):
+        block = timeout > 0#chỉ chờ kết quả đầu tiên, các kết quả sau lấy nếu đã có sẵn
+        while True:
+            try:
+                request_id, move_id, info = self.result_queue.get(block, timeout if block else None)
+            except queue.Empty:
+                return
+            block = False
+            if self.request_workers.pop(request_id, None) is not None:#bỏ qua kết quả của lần tìm đã hủy
+                self.results[request_id] = (move_id, info)
+
+    def shutdown(self):
+        for process, command_queue, cancelled in self.workers:
+            command_queue.put(("quit",))
+        for process, command_queue, cancelled in self.workers:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+        self.workers = []
+
+
+def findMoveById(valid_moves, move_id):
+    """
+    Map a move id returned by the pool back to one of the caller's Move objects.
+    """
+    for move in valid_moves:
+        if move.moveID == move_id:
+            return move
+    return None